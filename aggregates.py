@@ -0,0 +1,269 @@
+import sys
+from database import Database, DatabaseExecutor
+from constants import logging
+
+# 彙總表：以日、月為鍵的收入／支出／來客數，以及每月各療程、各客戶的小計
+SUMMARY_TABLES = {
+    'Daily_Summary': '''CREATE TABLE IF NOT EXISTS Daily_Summary (
+        day TEXT PRIMARY KEY,
+        income REAL NOT NULL DEFAULT 0,
+        visit_count INTEGER NOT NULL DEFAULT 0,
+        expense REAL NOT NULL DEFAULT 0,
+        expense_count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID''',
+    'Monthly_Summary': '''CREATE TABLE IF NOT EXISTS Monthly_Summary (
+        month TEXT PRIMARY KEY,
+        income REAL NOT NULL DEFAULT 0,
+        visit_count INTEGER NOT NULL DEFAULT 0,
+        expense REAL NOT NULL DEFAULT 0,
+        expense_count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID''',
+    'Monthly_Treatment_Summary': '''CREATE TABLE IF NOT EXISTS Monthly_Treatment_Summary (
+        month TEXT NOT NULL,
+        treatment_id INTEGER NOT NULL,
+        visit_count INTEGER NOT NULL DEFAULT 0,
+        income REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, treatment_id)
+    ) WITHOUT ROWID''',
+    'Monthly_Customer_Summary': '''CREATE TABLE IF NOT EXISTS Monthly_Customer_Summary (
+        month TEXT NOT NULL,
+        customer_id INTEGER NOT NULL,
+        visit_count INTEGER NOT NULL DEFAULT 0,
+        income REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (month, customer_id)
+    ) WITHOUT ROWID''',
+}
+
+
+def _add_treatment(row):
+    """將一筆療程記錄 (NEW/OLD) 累加到各彙總表的 SQL"""
+    return f'''
+        INSERT INTO Daily_Summary (day, income, visit_count) VALUES (substr({row}.treatment_date, 1, 10), COALESCE({row}.price, 0), 1)
+            ON CONFLICT(day) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + 1;
+        INSERT INTO Monthly_Summary (month, income, visit_count) VALUES (substr({row}.treatment_date, 1, 7), COALESCE({row}.price, 0), 1)
+            ON CONFLICT(month) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + 1;
+        INSERT INTO Monthly_Treatment_Summary (month, treatment_id, visit_count, income)
+            VALUES (substr({row}.treatment_date, 1, 7), COALESCE({row}.treatment_id, 0), 1, COALESCE({row}.price, 0))
+            ON CONFLICT(month, treatment_id) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + 1;
+        INSERT INTO Monthly_Customer_Summary (month, customer_id, visit_count, income)
+            VALUES (substr({row}.treatment_date, 1, 7), COALESCE({row}.customer_id, 0), 1, COALESCE({row}.price, 0))
+            ON CONFLICT(month, customer_id) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + 1;
+    '''
+
+
+def _remove_treatment(row):
+    """將一筆療程記錄從各彙總表扣除，並清掉已無資料的列"""
+    day, month = f'substr({row}.treatment_date, 1, 10)', f'substr({row}.treatment_date, 1, 7)'
+    return f'''
+        UPDATE Daily_Summary SET income = income - COALESCE({row}.price, 0), visit_count = visit_count - 1 WHERE day = {day};
+        DELETE FROM Daily_Summary WHERE day = {day} AND visit_count <= 0 AND expense_count <= 0;
+        UPDATE Monthly_Summary SET income = income - COALESCE({row}.price, 0), visit_count = visit_count - 1 WHERE month = {month};
+        DELETE FROM Monthly_Summary WHERE month = {month} AND visit_count <= 0 AND expense_count <= 0;
+        UPDATE Monthly_Treatment_Summary SET income = income - COALESCE({row}.price, 0), visit_count = visit_count - 1
+            WHERE month = {month} AND treatment_id = COALESCE({row}.treatment_id, 0);
+        DELETE FROM Monthly_Treatment_Summary WHERE month = {month} AND treatment_id = COALESCE({row}.treatment_id, 0) AND visit_count <= 0;
+        UPDATE Monthly_Customer_Summary SET income = income - COALESCE({row}.price, 0), visit_count = visit_count - 1
+            WHERE month = {month} AND customer_id = COALESCE({row}.customer_id, 0);
+        DELETE FROM Monthly_Customer_Summary WHERE month = {month} AND customer_id = COALESCE({row}.customer_id, 0) AND visit_count <= 0;
+    '''
+
+
+def _add_expense(row):
+    return f'''
+        INSERT INTO Daily_Summary (day, expense, expense_count) VALUES (substr({row}.expense_date, 1, 10), {row}.amount, 1)
+            ON CONFLICT(day) DO UPDATE SET expense = expense + excluded.expense, expense_count = expense_count + 1;
+        INSERT INTO Monthly_Summary (month, expense, expense_count) VALUES (substr({row}.expense_date, 1, 7), {row}.amount, 1)
+            ON CONFLICT(month) DO UPDATE SET expense = expense + excluded.expense, expense_count = expense_count + 1;
+    '''
+
+
+def _remove_expense(row):
+    day, month = f'substr({row}.expense_date, 1, 10)', f'substr({row}.expense_date, 1, 7)'
+    return f'''
+        UPDATE Daily_Summary SET expense = expense - {row}.amount, expense_count = expense_count - 1 WHERE day = {day};
+        DELETE FROM Daily_Summary WHERE day = {day} AND visit_count <= 0 AND expense_count <= 0;
+        UPDATE Monthly_Summary SET expense = expense - {row}.amount, expense_count = expense_count - 1 WHERE month = {month};
+        DELETE FROM Monthly_Summary WHERE month = {month} AND visit_count <= 0 AND expense_count <= 0;
+    '''
+
+
+# 批次寫入時可暫停觸發器，改由 Aggregates.apply_treatments 一次套用整批差額
+_ACTIVE = 'WHEN (SELECT suspended FROM Aggregate_Control WHERE id = 1) = 0'
+
+TRIGGERS = {
+    'trg_summary_treatment_insert': f'''CREATE TRIGGER trg_summary_treatment_insert
+        AFTER INSERT ON Customer_Treatments {_ACTIVE} BEGIN {_add_treatment('NEW')} END''',
+    'trg_summary_treatment_delete': f'''CREATE TRIGGER trg_summary_treatment_delete
+        AFTER DELETE ON Customer_Treatments {_ACTIVE} BEGIN {_remove_treatment('OLD')} END''',
+    'trg_summary_treatment_update': f'''CREATE TRIGGER trg_summary_treatment_update
+        AFTER UPDATE OF treatment_date, price, customer_id, treatment_id ON Customer_Treatments {_ACTIVE}
+        BEGIN {_remove_treatment('OLD')} {_add_treatment('NEW')} END''',
+    'trg_summary_expense_insert': f'''CREATE TRIGGER trg_summary_expense_insert
+        AFTER INSERT ON Expenses {_ACTIVE} BEGIN {_add_expense('NEW')} END''',
+    'trg_summary_expense_delete': f'''CREATE TRIGGER trg_summary_expense_delete
+        AFTER DELETE ON Expenses {_ACTIVE} BEGIN {_remove_expense('OLD')} END''',
+    'trg_summary_expense_update': f'''CREATE TRIGGER trg_summary_expense_update
+        AFTER UPDATE OF expense_date, amount ON Expenses {_ACTIVE}
+        BEGIN {_remove_expense('OLD')} {_add_expense('NEW')} END''',
+}
+
+# 將符合條件的療程記錄整批加入（sign=1）或扣除（sign=-1）彙總表
+_APPLY_TREATMENTS = {
+    'Daily_Summary': '''
+        INSERT INTO Daily_Summary (day, income, visit_count)
+        SELECT substr(treatment_date, 1, 10), {sign} * SUM(COALESCE(price, 0)), {sign} * COUNT(*)
+        FROM Customer_Treatments WHERE {condition} GROUP BY 1
+        ON CONFLICT(day) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + excluded.visit_count''',
+    'Monthly_Summary': '''
+        INSERT INTO Monthly_Summary (month, income, visit_count)
+        SELECT substr(treatment_date, 1, 7), {sign} * SUM(COALESCE(price, 0)), {sign} * COUNT(*)
+        FROM Customer_Treatments WHERE {condition} GROUP BY 1
+        ON CONFLICT(month) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + excluded.visit_count''',
+    'Monthly_Treatment_Summary': '''
+        INSERT INTO Monthly_Treatment_Summary (month, treatment_id, visit_count, income)
+        SELECT substr(treatment_date, 1, 7), COALESCE(treatment_id, 0), {sign} * COUNT(*), {sign} * SUM(COALESCE(price, 0))
+        FROM Customer_Treatments WHERE {condition} GROUP BY 1, 2
+        ON CONFLICT(month, treatment_id) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + excluded.visit_count''',
+    'Monthly_Customer_Summary': '''
+        INSERT INTO Monthly_Customer_Summary (month, customer_id, visit_count, income)
+        SELECT substr(treatment_date, 1, 7), COALESCE(customer_id, 0), {sign} * COUNT(*), {sign} * SUM(COALESCE(price, 0))
+        FROM Customer_Treatments WHERE {condition} GROUP BY 1, 2
+        ON CONFLICT(month, customer_id) DO UPDATE SET income = income + excluded.income, visit_count = visit_count + excluded.visit_count''',
+}
+
+# 由原始資料完整重算各彙總表內容的查詢，供重建及驗證使用
+REBUILD_QUERIES = {
+    'Daily_Summary': '''
+        SELECT day, SUM(income) AS income, SUM(visit_count) AS visit_count,
+               SUM(expense) AS expense, SUM(expense_count) AS expense_count
+        FROM (
+            SELECT substr(treatment_date, 1, 10) AS day, COALESCE(price, 0) AS income, 1 AS visit_count, 0 AS expense, 0 AS expense_count
+            FROM Customer_Treatments
+            UNION ALL
+            SELECT substr(expense_date, 1, 10), 0, 0, amount, 1 FROM Expenses
+        ) GROUP BY day''',
+    'Monthly_Summary': '''
+        SELECT month, SUM(income) AS income, SUM(visit_count) AS visit_count,
+               SUM(expense) AS expense, SUM(expense_count) AS expense_count
+        FROM (
+            SELECT substr(treatment_date, 1, 7) AS month, COALESCE(price, 0) AS income, 1 AS visit_count, 0 AS expense, 0 AS expense_count
+            FROM Customer_Treatments
+            UNION ALL
+            SELECT substr(expense_date, 1, 7), 0, 0, amount, 1 FROM Expenses
+        ) GROUP BY month''',
+    'Monthly_Treatment_Summary': '''
+        SELECT substr(treatment_date, 1, 7) AS month, COALESCE(treatment_id, 0) AS treatment_id,
+               COUNT(*) AS visit_count, SUM(COALESCE(price, 0)) AS income
+        FROM Customer_Treatments GROUP BY 1, 2''',
+    'Monthly_Customer_Summary': '''
+        SELECT substr(treatment_date, 1, 7) AS month, COALESCE(customer_id, 0) AS customer_id,
+               COUNT(*) AS visit_count, SUM(COALESCE(price, 0)) AS income
+        FROM Customer_Treatments GROUP BY 1, 2''',
+}
+
+SUMMARY_KEYS = {
+    'Daily_Summary': ('day',),
+    'Monthly_Summary': ('month',),
+    'Monthly_Treatment_Summary': ('month', 'treatment_id'),
+    'Monthly_Customer_Summary': ('month', 'customer_id'),
+}
+
+
+class Aggregates:
+    @staticmethod
+    def install(cursor):
+        """建立彙總表及維護觸發器；彙總表為新建立時，由現有資料回填"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ({})".format(
+            ','.join('?' * len(SUMMARY_TABLES))), tuple(SUMMARY_TABLES))
+        existing = {row[0] for row in cursor.fetchall()}
+        for script in SUMMARY_TABLES.values():
+            cursor.execute(script)
+        cursor.execute('''CREATE TABLE IF NOT EXISTS Aggregate_Control (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            suspended INTEGER NOT NULL DEFAULT 0
+        )''')
+        cursor.execute('INSERT OR IGNORE INTO Aggregate_Control (id, suspended) VALUES (1, 0)')
+        for name, script in TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(script)
+        if existing != set(SUMMARY_TABLES):
+            Aggregates._rebuild_with(cursor)
+            logging.info("彙總表已由歷史資料建立")
+
+    @staticmethod
+    def _rebuild_with(cursor):
+        for table, query in REBUILD_QUERIES.items():
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'INSERT INTO {table} {query}')
+
+    @staticmethod
+    def suspend(conn):
+        """暫停彙總觸發器；只可在寫入執行緒的交易內使用，且須以 resume 恢復"""
+        conn.execute('UPDATE Aggregate_Control SET suspended = 1 WHERE id = 1')
+
+    @staticmethod
+    def resume(conn):
+        conn.execute('UPDATE Aggregate_Control SET suspended = 0 WHERE id = 1')
+
+    @staticmethod
+    def apply_treatments(conn, condition, params=(), sign=1):
+        """
+        將 Customer_Treatments 中符合 condition 的記錄以分組方式整批加入（sign=1）或扣除（sign=-1）彙總表。
+        扣除須在刪除記錄之前呼叫；供觸發器暫停期間的批次寫入使用。
+        """
+        for query in _APPLY_TREATMENTS.values():
+            conn.execute(query.format(sign=int(sign), condition=condition), params)
+        if sign < 0:
+            conn.execute('DELETE FROM Daily_Summary WHERE visit_count <= 0 AND expense_count <= 0')
+            conn.execute('DELETE FROM Monthly_Summary WHERE visit_count <= 0 AND expense_count <= 0')
+            conn.execute('DELETE FROM Monthly_Treatment_Summary WHERE visit_count <= 0')
+            conn.execute('DELETE FROM Monthly_Customer_Summary WHERE visit_count <= 0')
+
+    @staticmethod
+    def rebuild():
+        """在單一交易中由原始資料重建所有彙總表"""
+        DatabaseExecutor.submit_transaction(Aggregates._rebuild_with, tuple(SUMMARY_TABLES)).result()
+        logging.info("彙總表重建完成")
+
+    @staticmethod
+    def verify(tolerance=0.005):
+        """比對彙總表與原始資料，返回不一致項目的描述列表（空列表表示一致）"""
+        problems = []
+        for table, query in REBUILD_QUERIES.items():
+            keys = SUMMARY_KEYS[table]
+            expected = {tuple(row[k] for k in keys): row for row in Database.execute(query, fetch=True)}
+            actual = {tuple(row[k] for k in keys): row for row in Database.execute(f'SELECT * FROM {table}', fetch=True)}
+            for key in expected.keys() | actual.keys():
+                want, got = expected.get(key), actual.get(key)
+                if want is None or got is None:
+                    problems.append(f"{table} {key}: {'多出' if want is None else '缺少'}彙總列")
+                    continue
+                for column, value in want.items():
+                    if column not in keys and abs((got[column] or 0) - (value or 0)) > tolerance:
+                        problems.append(f"{table} {key}: {column} 應為 {value}，實際為 {got[column]}")
+        return problems
+
+
+def main(argv):
+    """命令列：python aggregates.py rebuild|verify"""
+    command = argv[1] if len(argv) > 1 else 'verify'
+    Database.initialize_database()
+    try:
+        if command == 'rebuild':
+            Aggregates.rebuild()
+            print("彙總表重建完成")
+            return 0
+        if command == 'verify':
+            problems = Aggregates.verify()
+            for problem in problems:
+                print(problem)
+            print("彙總表一致" if not problems else f"發現 {len(problems)} 項不一致")
+            return 1 if problems else 0
+        print(main.__doc__)
+        return 2
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
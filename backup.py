@@ -0,0 +1,247 @@
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+from database import Database, ConnectionManager, DatabaseExecutor
+from sync import Sync
+from constants import logging
+
+STAMP_FORMAT = '%Y%m%d_%H%M%S'
+RESTORED_TABLES = ('Customers', 'Customer_Treatments', 'Expenses', 'Treatments')
+
+
+class BackupError(Exception):
+    """備份或還原失敗（例如快照未通過完整性檢查）"""
+
+
+class BackupCancelled(BackupError):
+    """備份已取消"""
+
+
+class Backup:
+    """
+    以 SQLite 線上備份 API 建立資料庫快照，存放於資料庫旁的 backups 目錄，檔名為 <資料庫名稱>_<時間>.db。
+    備份時來源連線持有一個讀取交易，WAL 模式下其他連線照常寫入，快照內容固定為開始時的時間點
+    （未持有讀取交易時，其他連線的每次寫入都會使備份從頭開始）；每步只複製 pages_per_step 頁，
+    步與步之間短暫暫停讓出 I/O。快照先寫入 .partial 檔，通過 integrity_check 後才改為正式檔名。
+    """
+    pages_per_step = 256  # 每步複製的頁數（4KB 頁約 1MB）
+    step_pause = 0.005  # 每步之間暫停的秒數
+    interval = timedelta(hours=24)  # 自動備份間隔
+    keep_recent = 7  # 保留最近的快照數
+    keep_daily = 14  # 另保留最近幾天每天最後一份
+    keep_monthly = 12  # 另保留最近幾個月每月最後一份
+
+    @staticmethod
+    def directory(db_path=None):
+        db_path = os.path.abspath(db_path or ConnectionManager.db_path)
+        return os.path.join(os.path.dirname(db_path), 'backups')
+
+    @staticmethod
+    def _stem(db_path=None):
+        return os.path.splitext(os.path.basename(db_path or ConnectionManager.db_path))[0]
+
+    @classmethod
+    def snapshots(cls, db_path=None):
+        """返回 [(時間, 路徑), ...]，由新到舊"""
+        directory = cls.directory(db_path)
+        pattern = re.compile(rf'^{re.escape(cls._stem(db_path))}_(\d{{8}}_\d{{6}})\.db$')
+        if not os.path.isdir(directory):
+            return []
+        found = []
+        for filename in os.listdir(directory):
+            match = pattern.match(filename)
+            if match:
+                found.append((datetime.strptime(match.group(1), STAMP_FORMAT), os.path.join(directory, filename)))
+        return sorted(found, reverse=True)
+
+    @classmethod
+    def create(cls, db_path=None, progress=None, cancel_event=None, now=None, prune=True):
+        """
+        建立並驗證一份快照，返回快照路徑；progress(已複製頁數, 總頁數) 於每步後呼叫。
+        prune=False 時不套用保留規則（還原前的備份不可刪除正要還原的快照）。
+        可在任何執行緒呼叫（使用專用連線，不經過寫入佇列）。
+        """
+        db_path = db_path or ConnectionManager.db_path
+        now = now or datetime.now()
+        directory = cls.directory(db_path)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{cls._stem(db_path)}_{now.strftime(STAMP_FORMAT)}.db')
+        partial = f'{path}.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        started = time.perf_counter()
+
+        def on_step(status, remaining, total):
+            if cancel_event is not None and cancel_event.is_set():
+                raise BackupCancelled("備份已取消")
+            if progress is not None:
+                progress(total - remaining, total)
+            time.sleep(cls.step_pause)
+
+        source = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        target = sqlite3.connect(partial)
+        try:
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()  # 開始讀取交易，固定快照時間點
+            source.backup(target, pages=cls.pages_per_step, progress=on_step)
+            source.execute('COMMIT')
+            target.execute('PRAGMA journal_mode = DELETE')  # 快照為單一檔案，不留 -wal／-shm
+        except BaseException:
+            target.close()
+            source.close()
+            for leftover in (partial, f'{partial}-wal', f'{partial}-shm'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            raise
+        target.close()
+        source.close()
+
+        problems = cls.verify(partial)
+        if problems:
+            os.remove(partial)
+            raise BackupError(f"快照未通過完整性檢查：{'; '.join(problems[:5])}")
+        os.replace(partial, path)
+        logging.info(f"已建立備份 {path}（{os.path.getsize(path) // 1024}KB，耗時 {time.perf_counter() - started:.2f} 秒）")
+        if prune:
+            cls.prune(db_path, now)
+        return path
+
+    @staticmethod
+    def verify(path, quick=False):
+        """以 PRAGMA integrity_check（quick=True 時為 quick_check）檢查快照，返回問題列表，空列表表示正常"""
+        conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+        try:
+            rows = conn.execute('PRAGMA quick_check' if quick else 'PRAGMA integrity_check').fetchall()
+        except sqlite3.DatabaseError as e:
+            return [str(e)]
+        finally:
+            conn.close()
+        return [] if rows == [('ok',)] else [row[0] for row in rows]
+
+    @classmethod
+    def retained(cls, stamps):
+        """依保留規則（最近幾份、每日、每月）返回應保留的時間集合"""
+        stamps = sorted(stamps, reverse=True)
+        keep = set(stamps[:cls.keep_recent])
+        days, months = [], []
+        for stamp in stamps:
+            day, month = stamp.date(), (stamp.year, stamp.month)
+            if day not in days and len(days) < cls.keep_daily:
+                days.append(day)
+                keep.add(stamp)
+            if month not in months and len(months) < cls.keep_monthly:
+                months.append(month)
+                keep.add(stamp)
+        return keep
+
+    @classmethod
+    def prune(cls, db_path=None, now=None):
+        """刪除不在保留規則內的快照，返回刪除的路徑列表"""
+        snapshots = cls.snapshots(db_path)
+        keep = cls.retained(stamp for stamp, _ in snapshots)
+        removed = []
+        for stamp, path in snapshots:
+            if stamp not in keep:
+                try:
+                    os.remove(path)
+                    removed.append(path)
+                except OSError as e:
+                    logging.warning(f"無法刪除舊備份 {path}：{str(e)}")
+        if removed:
+            logging.info(f"已刪除 {len(removed)} 份過期備份")
+        return removed
+
+    @classmethod
+    def create_if_due(cls, db_path=None, cancel_event=None):
+        """距上次備份已超過 interval 時建立快照，返回快照路徑；尚未到期時返回 None"""
+        snapshots = cls.snapshots(db_path)
+        if snapshots and datetime.now() - snapshots[0][0] < cls.interval:
+            return None
+        return cls.create(db_path, cancel_event=cancel_event)
+
+    @classmethod
+    def restore(cls, snapshot, db_path=None):
+        """
+        以快照取代目前資料庫，返回還原前自動建立的快照路徑（可用來復原這次還原）。
+        先以 quick_check 檢查快照，再以備份 API 一次複製全部頁面（單一交易，開啟中的其他連線不會讀到一半的資料）；
+        還原後換用新的分店識別碼（Change_Log 已倒退，其他分店的同步水位不再適用），
+        套用遷移（快照可能是舊版本結構），並通知各快取資料已改變。
+        """
+        db_path = db_path or ConnectionManager.db_path
+        problems = cls.verify(snapshot, quick=True)
+        if problems:
+            raise BackupError(f"快照已損壞，無法還原：{'; '.join(problems[:5])}")
+        source = sqlite3.connect(f'file:{os.path.abspath(snapshot)}?mode=ro', uri=True)
+        try:
+            safety = cls.create(db_path, prune=False)
+            DatabaseExecutor.shutdown()
+            ConnectionManager.close_all()
+
+            started = time.perf_counter()
+            target = sqlite3.connect(db_path, timeout=30)
+            try:
+                source.backup(target)
+                if target.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Sync_State'").fetchone():
+                    origin = Sync.reset_origin(target)
+                    target.commit()
+                    logging.info(f"還原後的分店識別碼：{origin}")
+            finally:
+                target.close()
+        finally:
+            source.close()
+        logging.info(f"已由 {snapshot} 還原資料庫（耗時 {time.perf_counter() - started:.2f} 秒），還原前備份：{safety}")
+
+        if os.path.abspath(db_path) == os.path.abspath(ConnectionManager.db_path):
+            Database.initialize_database()
+            Database.notify_written(RESTORED_TABLES)
+        try:
+            from snapshot import TreatmentSnapshot  # 需要 numpy，只在還原時才匯入
+            TreatmentSnapshot.invalidate(db_path)
+        except ImportError:
+            pass
+        return safety
+
+
+def main(argv):
+    """命令列：python backup.py [create|list|verify [快照]|prune|restore 快照] [--db 資料庫]"""
+    args = list(argv[1:])
+    if '--db' in args:
+        index = args.index('--db')
+        ConnectionManager.configure(args[index + 1])
+        del args[index:index + 2]
+    command = args[0] if args else 'create'
+    try:
+        if command == 'create':
+            print(f"已建立備份 {Backup.create()}")
+        elif command == 'list':
+            for stamp, path in Backup.snapshots():
+                print(f"{stamp:%Y-%m-%d %H:%M:%S}\t{os.path.getsize(path) // 1024}KB\t{path}")
+        elif command == 'verify':
+            targets = [args[1]] if len(args) > 1 else [path for _, path in Backup.snapshots()]
+            failed = 0
+            for path in targets:
+                problems = Backup.verify(path)
+                failed += bool(problems)
+                print(f"{path}：{'正常' if not problems else '; '.join(problems[:5])}")
+            return 1 if failed else 0
+        elif command == 'prune':
+            print(f"已刪除 {len(Backup.prune())} 份過期備份")
+        elif command == 'restore' and len(args) > 1:
+            safety = Backup.restore(args[1])
+            print(f"已還原 {args[1]}；還原前的資料已備份至 {safety}")
+        else:
+            print(main.__doc__)
+            return 2
+        return 0
+    except BackupError as e:
+        print(str(e))
+        return 1
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
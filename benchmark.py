@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from database import Database, ConnectionManager, DatabaseExecutor
+from business_logic import BusinessLogic
+from treatment_catalog import TreatmentCatalog
+from customer_names import CustomerNameIndex
+from report_queries import ReportQueries
+from ledger import Ledger
+from exporter import Exporter
+from synthetic_data import SyntheticData
+from constants import logging
+
+DEFAULT_SCALES = (10000, 100000)  # 療程記錄筆數；可加上 1000000
+REGRESSION_THRESHOLD = 0.25  # 中位數比基準慢超過 25% 視為退步
+REGRESSION_MIN_MS = 1.0  # 差距小於此毫秒數時忽略（避免微小數值的雜訊）
+
+
+def _sample(column, query):
+    rows = Database.execute(query, fetch=True)
+    return rows[0][column] if rows else None
+
+
+def benchmark_cases(workdir):
+    """
+    返回 {名稱: 無參數函式}，涵蓋 BusinessLogic 各方法、統計頁 update_stats 的四個查詢、
+    財務頁第一頁支出（load_finance_data）及匯出。參數取自資料庫中的實際資料。
+    """
+    month = BusinessLogic.get_available_months()[0]
+    customer = Database.execute('''
+        SELECT customer_id, name, contact_method FROM Customers
+        WHERE customer_id = (SELECT customer_id FROM Customer_Treatments GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1)
+    ''', fetch=True)[0]
+    last_date = _sample('day', 'SELECT MAX(treatment_date) as day FROM Customer_Treatments')
+    prefix = customer['name'][:1]
+    export_path = os.path.join(workdir, 'export.csv')
+    return {
+        'BusinessLogic.match_treatment': lambda: BusinessLogic.match_treatment(1880),
+        'BusinessLogic.check_duplicate': lambda: BusinessLogic.check_duplicate(customer['name'], customer['contact_method']),
+        'BusinessLogic.get_customer_names_matching': lambda: BusinessLogic.get_customer_names_matching(prefix),
+        'BusinessLogic.get_available_months': BusinessLogic.get_available_months,
+        'BusinessLogic.get_remaining_sessions': lambda: BusinessLogic.get_remaining_sessions(
+            customer['customer_id'], "組合療程：Einxel Plus膠原修復針 6次包套"),
+        'BusinessLogic.check_retouch_eligibility': lambda: BusinessLogic.check_retouch_eligibility(customer['customer_id'], last_date),
+        'TreatmentCatalog.load': TreatmentCatalog.load,
+        'CustomerNameIndex.load': CustomerNameIndex.load,
+        'StatsUI.monthly_income': lambda: Database.execute(ReportQueries.MONTHLY_INCOME, fetch=True),
+        'StatsUI.monthly_expense': lambda: Database.execute(ReportQueries.MONTHLY_EXPENSE, fetch=True),
+        'StatsUI.top_customers': lambda: Database.execute(ReportQueries.TOP_CUSTOMERS, (month,), fetch=True),
+        'StatsUI.treatment_mix': lambda: Database.execute(ReportQueries.TREATMENT_MIX, (month,), fetch=True),
+        'FinanceUI.load_finance_data': lambda: Ledger.expense_page(),
+        'Exporter.expenses': lambda: Exporter(export_path, 'expenses').run(),
+        'Exporter.treatments': lambda: Exporter(export_path, 'treatments').run(),
+    }
+
+
+def time_case(func, repeat):
+    """執行一次暖身後計時 repeat 次，返回毫秒統計"""
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 3), 'min_ms': round(min(samples), 3),
+            'max_ms': round(max(samples), 3)}
+
+
+def run(scales=DEFAULT_SCALES, repeat=5, seed=42, only=None):
+    """在每個規模產生測試資料庫並執行所有基準測試，返回可序列化為 JSON 的結果"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            db_path = os.path.join(workdir, f'bench_{scale}.db')
+            started = time.perf_counter()
+            counts = SyntheticData(seed).generate(db_path, scale)
+            CustomerNameIndex.invalidate()
+            timings = {'generate_s': round(time.perf_counter() - started, 2), 'rows': counts}
+            for name, func in benchmark_cases(workdir).items():
+                if only and not any(part in name for part in only):
+                    continue
+                timings[name] = time_case(func, repeat)
+                logging.info(f"基準測試 {scale} {name}：{timings[name]['median_ms']}ms")
+            results[str(scale)] = timings
+            DatabaseExecutor.shutdown()
+            ConnectionManager.close_all()
+    return {
+        'meta': {'time': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(), 'seed': seed, 'repeat': repeat},
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """比對兩次結果的中位數，返回退步項目 [(規模, 名稱, 基準毫秒, 目前毫秒)]"""
+    regressions = []
+    for scale, timings in current['results'].items():
+        base = baseline.get('results', {}).get(scale, {})
+        for name, timing in timings.items():
+            if not isinstance(timing, dict) or 'median_ms' not in timing or name not in base:
+                continue
+            before, after = base[name]['median_ms'], timing['median_ms']
+            if after > before * (1 + threshold) and after - before > REGRESSION_MIN_MS:
+                regressions.append((scale, name, before, after))
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='以合成資料對各查詢路徑做基準測試')
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)), help='療程記錄筆數，以逗號分隔')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', default='', help='只執行名稱包含這些字串的項目，以逗號分隔')
+    parser.add_argument('--output', help='結果 JSON 輸出檔（預設輸出至標準輸出）')
+    parser.add_argument('--baseline', help='基準結果 JSON；有退步時以狀態碼 1 結束')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv[1:])
+
+    result = run([int(s) for s in args.scales.split(',') if s], args.repeat, args.seed,
+                 [s for s in args.only.split(',') if s])
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for scale, name, before, after in regressions:
+            print(f"退步：{scale} 筆 {name} {before}ms → {after}ms", file=sys.stderr)
+        if regressions:
+            return 1
+        print("與基準相比沒有退步", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
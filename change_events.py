@@ -0,0 +1,59 @@
+import threading
+from collections import namedtuple
+from task_scheduler import TaskScheduler
+from constants import logging
+
+INSERT, UPDATE, DELETE = 'insert', 'update', 'delete'
+
+ChangeEvent = namedtuple('ChangeEvent', 'table action pk')
+
+
+class ChangeEvents:
+    """
+    列層級變更通知：寫入工作在寫入執行緒中以 record() 記錄 (資料表, insert/update/delete, 主鍵)，
+    所屬批次提交後才一次發布給訂閱者；工作回滾時其事件一併捨棄。
+    """
+    _lock = threading.Lock()
+    _listeners = {}  # table -> [listener(events)]
+    _pending = []  # 目前批次尚未提交的事件，只在寫入執行緒中存取
+
+    @classmethod
+    def subscribe(cls, table, listener):
+        """訂閱 table 的變更；listener(events) 在寫入執行緒中呼叫，events 為該批次此資料表的事件列表"""
+        with cls._lock:
+            cls._listeners.setdefault(table, []).append(listener)
+
+    @classmethod
+    def subscribe_tk(cls, master, table, listener):
+        """同 subscribe，但改在 Tk 主執行緒呼叫 listener(events)"""
+        TaskScheduler.install(master)
+        cls.subscribe(table, lambda events: TaskScheduler.post(listener, events))
+
+    @classmethod
+    def record(cls, table, action, pk):
+        cls._pending.append(ChangeEvent(table, action, pk))
+
+    @classmethod
+    def mark(cls):
+        return len(cls._pending)
+
+    @classmethod
+    def discard(cls, mark=0):
+        """捨棄 mark 之後記錄的事件（工作或整批回滾時使用）"""
+        del cls._pending[mark:]
+
+    @classmethod
+    def publish(cls):
+        """發布並清除目前批次的事件（批次提交後由寫入執行緒呼叫）"""
+        events, cls._pending = cls._pending, []
+        by_table = {}
+        for event in events:
+            by_table.setdefault(event.table, []).append(event)
+        for table, table_events in by_table.items():
+            with cls._lock:
+                listeners = list(cls._listeners.get(table, ()))
+            for listener in listeners:
+                try:
+                    listener(table_events)
+                except Exception as e:
+                    logging.error(f"變更通知處理失敗（{table}）：{str(e)}")
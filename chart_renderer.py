@@ -0,0 +1,121 @@
+from collections import OrderedDict
+
+OTHER_LABEL = '其他'
+
+
+def collapse_long_tail(items, max_slices=8, min_share=0.03):
+    """
+    將 [(標籤, 數值), ...] 依數值遞減排序，只保留前 max_slices - 1 項及佔比不低於 min_share 者，
+    其餘合併為「其他」，避免餅圖出現大量細小扇形。
+    """
+    items = sorted(((label, value or 0) for label, value in items), key=lambda item: item[1], reverse=True)
+    total = sum(value for _, value in items)
+    if len(items) <= max_slices or total <= 0:
+        return items
+    kept = [item for item in items[:max_slices - 1] if item[1] / total >= min_share]
+    rest = sum(value for _, value in items[len(kept):])
+    return kept + [(OTHER_LABEL, rest)] if rest else kept
+
+
+class TrendChart:
+    """收入與支出趨勢圖：座標軸與折線只建立一次，之後只更新資料並以 draw_idle 重繪；資料未變時不重繪"""
+    max_tick_labels = 24
+
+    def __init__(self, figure, canvas):
+        self.figure = figure
+        self.canvas = canvas
+        self.ax = figure.add_subplot(111)
+        self.income_line, = self.ax.plot([], [], label='收入', marker='o')
+        self.expense_line, = self.ax.plot([], [], label='支出', marker='o')
+        self.ax.set_title("收入與支出趨勢")
+        self.ax.set_xlabel("月份")
+        self.ax.set_ylabel("金額 ($)")
+        self.ax.legend()
+        self.ax.tick_params(axis='x', rotation=45)
+        self.data = None
+        self.months = None
+
+    def update(self, income_rows, expense_rows):
+        """income_rows／expense_rows 為含 month 及 total_income／total_expense 的記錄；返回是否有重繪"""
+        income = tuple((row['month'], row['total_income'] or 0) for row in income_rows)
+        expense = tuple((row['month'], row['total_expense'] or 0) for row in expense_rows)
+        if (income, expense) == self.data:
+            return False
+        self.data = (income, expense)
+        months = sorted({month for month, _ in income} | {month for month, _ in expense})
+        position = {month: i for i, month in enumerate(months)}
+        self.income_line.set_data([position[m] for m, _ in income], [v for _, v in income])
+        self.expense_line.set_data([position[m] for m, _ in expense], [v for _, v in expense])
+        self.ax.relim()
+        self.ax.autoscale_view()
+        if months != self.months:
+            # 月份很多時只標示部分刻度，避免標籤重疊；只有月份改變時才重新排版
+            step = max(1, -(-len(months) // self.max_tick_labels))
+            self.ax.set_xticks(range(0, len(months), step))
+            self.ax.set_xticklabels(months[::step])
+            self.months = months
+            self.figure.tight_layout()
+        self.canvas.draw_idle()
+        return True
+
+
+class PieChart:
+    """
+    療程分布餅圖：長尾療程合併為「其他」；每個月份繪製一次後以 copy_from_bbox 保存影像，
+    再次切換到同一月份（且資料與畫布大小未變）時以 restore_region + blit 直接還原。
+    """
+    cache_size = 24
+
+    def __init__(self, figure, canvas, max_slices=8, min_share=0.03):
+        self.figure = figure
+        self.canvas = canvas
+        self.ax = figure.add_subplot(111)
+        self.max_slices = max_slices
+        self.min_share = min_share
+        self.cache = OrderedDict()  # (月份, 扇形, 畫布大小) -> 已繪製的影像
+        self.current = None  # 目前顯示的 (月份, 扇形)
+        self.drawn = None  # 目前 figure 中的圖形所代表的 (月份, 扇形)
+        canvas.mpl_connect('resize_event', self._on_resize)
+
+    def _size(self):
+        return tuple(int(v) for v in self.figure.bbox.size)
+
+    def show(self, title, rows):
+        """rows 為含 name 及 count 的記錄；返回是否由快取還原"""
+        slices = tuple(collapse_long_tail(((row['name'], row['count']) for row in rows), self.max_slices, self.min_share))
+        self.current = (title, slices)
+        key = (title, slices, self._size())
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.move_to_end(key)
+            self.canvas.restore_region(cached)
+            self.canvas.blit(self.figure.bbox)
+            return True
+        self._render(title, slices)
+        self.canvas.draw()  # 需同步繪製才能擷取影像
+        self.cache[key] = self.canvas.copy_from_bbox(self.figure.bbox)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return False
+
+    def _render(self, title, slices):
+        self.ax.clear()
+        if slices:
+            self.ax.pie([value for _, value in slices], labels=[label for label, _ in slices],
+                        autopct='%1.1f%%', startangle=90)
+            self.ax.axis('equal')
+            self.ax.set_title(title)
+        else:
+            self.ax.text(0.5, 0.5, '無數據', horizontalalignment='center', verticalalignment='center')
+            self.ax.set_axis_off()
+        self.figure.tight_layout()
+        self.drawn = (title, slices)
+
+    def _on_resize(self, event):
+        """畫布大小改變後舊影像不再適用；還原過影像時 figure 中的圖形可能不是目前月份，需重建"""
+        self.cache.clear()
+        if self.current is not None and self.drawn != self.current:
+            self._render(*self.current)
+
+    def invalidate(self):
+        self.cache.clear()
@@ -23,4 +23,16 @@ DEFAULT_TREATMENTS = {
     "熱能氣化 - 40粒": {"peak_price": 2800, "non_peak_price": 2800, "is_combo": 0},
     "熱能氣化 - 任脫 3800": {"peak_price": 3800, "non_peak_price": 3800, "is_combo": 0},
     "熱能氣化 - 任脫 4800": {"peak_price": 4800, "non_peak_price": 4800, "is_combo": 0}
-}
\ No newline at end of file
+}
+
+NECK_SURCHARGE = 300  # 可加頸部療程的加價金額
+AUTOCOMPLETE_LIMIT = 20  # 客戶名稱自動完成最多顯示筆數
+AUTOCOMPLETE_DEBOUNCE_MS = 150  # 自動完成輸入防抖延遲（毫秒）
+RETOUCH_WINDOW_DAYS = 180  # 首次療程後可免費補脫的天數
+RETOUCH_ELIGIBLE_TREATMENTS = [  # 可享免費補脫的療程
+    '熱能氣化 - 10粒',
+    '熱能氣化 - 20粒',
+    '熱能氣化 - 40粒',
+    '熱能氣化 - 任脫 3800',
+    '熱能氣化 - 任脫 4800'
+]
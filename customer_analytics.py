@@ -0,0 +1,176 @@
+import sys
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+from database import ConnectionManager, DatabaseExecutor
+from result_cache import ResultCache
+from snapshot import TreatmentSnapshot, INVALID_DAY
+from constants import logging
+
+CUSTOMERS_QUERY = 'SELECT customer_id, name, contact_method FROM Customers'
+
+# 依 (R, F) 分數決定客戶分群，由上而下第一個符合者為準
+SEGMENTS = (
+    ('核心客戶', lambda r, f: (r >= 4) & (f >= 4)),
+    ('忠誠客戶', lambda r, f: (r >= 3) & (f >= 3)),
+    ('新客戶', lambda r, f: (r >= 4) & (f <= 2)),
+    ('流失風險', lambda r, f: (r <= 2) & (f >= 3)),
+    ('已流失', lambda r, f: r <= 1),
+)
+DEFAULT_SEGMENT = '需要關注'
+
+
+def _quintile_scores(values):
+    """依排名分為 1–5 分（值越大分數越高）；先排名再分組，避免大量相同值造成分組邊界重複"""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int8)
+    ranks = values.argsort(kind='stable').argsort(kind='stable')
+    return (ranks * 5 // len(values) + 1).astype(np.int8)
+
+
+class VisitSnapshot:
+    """
+    到訪記錄的欄式快照：customer_id、到訪日（自 1970-01-01 起的天數）及金額各為一個 NumPy 陣列，
+    依 (customer_id, 日期) 排序。整個快照只讀取一次，之後的計算都在陣列上進行。
+    """
+    __slots__ = ('customer_ids', 'days', 'prices', 'customers', 'version')
+
+    def __init__(self, customer_ids, days, prices, customers, version=None):
+        order = np.lexsort((days, customer_ids))
+        self.customer_ids = customer_ids[order]
+        self.days = days[order]
+        self.prices = prices[order]
+        self.customers = customers  # DataFrame，以 customer_id 為索引：name、contact_method
+        self.version = version
+
+    @classmethod
+    def load(cls):
+        """由療程快照（只追加新記錄）取得到訪欄位，客戶名稱另以一次查詢讀取（在讀取執行緒中呼叫）"""
+        version = ResultCache.data_version()
+        history = TreatmentSnapshot.load()
+        # 補脫記錄不算一次到訪（只是同一療程的後續處理）；日期無法解析的記錄略過
+        visits = (history['is_retouch'] == 0) & (history['customer_id'] >= 0) & (history['day'] != INVALID_DAY)
+        cursor = ConnectionManager.get_connection().cursor()
+        cursor.row_factory = None  # 直接取得 tuple，省去 sqlite3.Row 的轉換
+        customers = pd.DataFrame(cursor.execute(CUSTOMERS_QUERY).fetchall(),
+                                 columns=['customer_id', 'name', 'contact_method']).set_index('customer_id')
+        return cls(history['customer_id'][visits].astype(np.int64), history['day'][visits].astype(np.int64),
+                   history['price_cents'][visits] / 100, customers, version)
+
+    def __len__(self):
+        return len(self.customer_ids)
+
+
+class CustomerAnalytics:
+    """
+    全體客戶的 RFM 分群、終身價值、平均回訪間隔及逾期未回訪標記，在欄式快照上向量化計算。
+    結果依資料版本快取；資料未變時重複呼叫直接返回上次結果。
+    """
+    overdue_factor = 1.5  # 距上次到訪超過平均間隔的此倍數視為逾期
+    min_overdue_days = 30
+    lifespan_floor_years = 1.0
+
+    _lock = threading.Lock()
+    _result = None  # (資料版本, as_of, DataFrame)
+
+    @staticmethod
+    def compute(snapshot, as_of=None):
+        """返回以 customer_id 為索引的 DataFrame，每位有到訪記錄的客戶一列"""
+        as_of_day = np.datetime64(as_of or date.today(), 'D').astype(np.int64)
+        ids, days, prices = snapshot.customer_ids, snapshot.days, snapshot.prices
+        columns = ['name', 'contact_method', 'first_visit', 'last_visit', 'recency_days', 'frequency', 'monetary',
+                   'avg_interval_days', 'lifetime_value', 'r_score', 'f_score', 'm_score', 'segment', 'overdue']
+        if len(ids) == 0:
+            return pd.DataFrame(columns=columns).rename_axis('customer_id')
+
+        # 快照已依 (customer_id, 日期) 排序：每位客戶為連續的一段
+        starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+        ends = np.r_[starts[1:], len(ids)] - 1
+        customer_ids = ids[starts]
+        frequency = np.diff(np.r_[starts, len(ids)])
+        monetary = np.add.reduceat(prices, starts)
+        first, last = days[starts], days[ends]
+        tenure = (last - first).astype(float)
+        recency = as_of_day - last
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_interval = np.where(frequency > 1, tenure / (frequency - 1), np.nan)
+        # 終身價值 = 平均客單價 × 每年到訪次數 × 預期留存年數（以回訪客戶的平均往來年數估計）
+        tenure_years = np.maximum(tenure, 30) / 365.25
+        annual_visits = frequency / np.maximum(tenure_years, 1.0)
+        repeat = frequency > 1
+        lifespan = max(float(tenure_years[repeat].mean()) if repeat.any() else 0.0, CustomerAnalytics.lifespan_floor_years)
+        lifetime_value = monetary / frequency * annual_visits * lifespan
+
+        r_score = _quintile_scores(-recency)
+        f_score = _quintile_scores(frequency)
+        m_score = _quintile_scores(monetary)
+        segment = np.select([rule(r_score, f_score) for _, rule in SEGMENTS],
+                            [label for label, _ in SEGMENTS], DEFAULT_SEGMENT)
+        overdue = repeat & (recency > np.maximum(avg_interval * CustomerAnalytics.overdue_factor,
+                                                 CustomerAnalytics.min_overdue_days))
+
+        result = pd.DataFrame({
+            'first_visit': first.astype('datetime64[D]'),
+            'last_visit': last.astype('datetime64[D]'),
+            'recency_days': recency,
+            'frequency': frequency,
+            'monetary': monetary,
+            'avg_interval_days': avg_interval,
+            'lifetime_value': lifetime_value,
+            'r_score': r_score,
+            'f_score': f_score,
+            'm_score': m_score,
+            'segment': segment,
+            'overdue': overdue,
+        }, index=pd.Index(customer_ids, name='customer_id'))
+        return snapshot.customers.reindex(result.index).join(result)[columns]
+
+    @classmethod
+    def current(cls, as_of=None):
+        """載入快照並計算（在讀取執行緒中呼叫）；資料版本未變時返回快取結果"""
+        version = ResultCache.data_version()
+        with cls._lock:
+            cached = cls._result
+        if cached is not None and cached[0] == version and cached[1] == as_of:
+            return cached[2]
+        snapshot = VisitSnapshot.load()
+        result = cls.compute(snapshot, as_of)
+        with cls._lock:
+            cls._result = (snapshot.version, as_of, result)
+        logging.info(f"客戶分析完成：{len(result)} 位客戶，{len(snapshot)} 筆到訪")
+        return result
+
+    @staticmethod
+    def segment_summary(result):
+        """各分群的客戶數、總消費及平均終身價值（依總消費遞減）"""
+        return (result.groupby('segment')
+                .agg(customers=('frequency', 'size'), monetary=('monetary', 'sum'),
+                     lifetime_value=('lifetime_value', 'mean'), overdue=('overdue', 'sum'))
+                .sort_values('monetary', ascending=False))
+
+    @staticmethod
+    def overdue_customers(result, limit=None):
+        """逾期未回訪的客戶，依終身價值遞減"""
+        overdue = result[result['overdue']].sort_values('lifetime_value', ascending=False)
+        return overdue if limit is None else overdue.head(limit)
+
+
+def main(argv):
+    """命令列：python customer_analytics.py [輸出 CSV]，列出分群摘要，可另存全部客戶指標"""
+    try:
+        result = CustomerAnalytics.current()
+        print(CustomerAnalytics.segment_summary(result).round(1).to_string())
+        print(f"逾期未回訪：{int(result['overdue'].sum())} 位")
+        if len(argv) > 1:
+            result.to_csv(argv[1], encoding='utf-8-sig')
+            print(f"已輸出 {argv[1]}")
+        return 0
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
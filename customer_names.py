@@ -0,0 +1,75 @@
+import threading
+from bisect import bisect_left
+from database import Database
+from constants import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_DEBOUNCE_MS
+
+
+class CustomerNameIndex:
+    """
+    客戶名稱自動完成用的排序索引（不分大小寫），首次查詢時才載入。
+    Customers 資料表有寫入（新增、改名、刪除）時失效，下次查詢重新載入。
+    """
+    _lock = threading.Lock()
+    _loaded = False
+    _version = 0
+    _keys = []   # 排序後的 casefold 名稱
+    _names = []  # 與 _keys 對應的原始名稱
+
+    @classmethod
+    def load(cls):
+        version = cls._version
+        rows = Database.execute('SELECT DISTINCT name FROM Customers', fetch=True)
+        entries = sorted((row['name'].casefold(), row['name']) for row in rows if row['name'])
+        with cls._lock:
+            cls._keys = [key for key, _ in entries]
+            cls._names = [name for _, name in entries]
+            cls._loaded = version == cls._version
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._loaded = False
+            cls._version += 1
+
+    @classmethod
+    def matching(cls, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """返回以 prefix 開頭的名稱（最多 limit 筆；limit 為 None 時不限）"""
+        if not cls._loaded:
+            cls.load()
+        with cls._lock:
+            keys, names = cls._keys, cls._names
+        key = prefix.casefold()
+        start = bisect_left(keys, key)
+        end = len(keys) if limit is None else min(len(keys), start + limit)
+        result = []
+        for i in range(start, end):
+            if not keys[i].startswith(key):
+                break
+            result.append(names[i])
+        return result
+
+
+class Debouncer:
+    """輸入框防抖：連續呼叫時只在停止輸入 delay_ms 後執行最後一次"""
+
+    def __init__(self, widget, callback, delay_ms=AUTOCOMPLETE_DEBOUNCE_MS):
+        self.widget = widget
+        self.callback = callback
+        self.delay_ms = delay_ms
+        self._pending = None
+
+    def __call__(self, *args):
+        self.cancel()
+        self._pending = self.widget.after(self.delay_ms, lambda: self._fire(args))
+
+    def cancel(self):
+        if self._pending is not None:
+            self.widget.after_cancel(self._pending)
+            self._pending = None
+
+    def _fire(self, args):
+        self._pending = None
+        self.callback(*args)
+
+
+Database.add_write_listener(lambda tables: CustomerNameIndex.invalidate() if 'Customers' in tables else None)
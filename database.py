@@ -1,128 +1,353 @@
 import sqlite3
-from constants import DB_NAME, DEFAULT_TREATMENTS, logging
-import os
+import queue
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from query_stats import QueryStats
+from change_events import ChangeEvents, INSERT
+from task_scheduler import TaskScheduler
+from constants import DB_NAME, logging
+import threading
+import time
+
+class ConnectionManager:
+    """每個執行緒維持一條長連線，並統計連線及查詢次數（sqlite3 不提供預編譯語句快取的命中數）"""
+    db_path = DB_NAME
+    statement_cache_size = 128
+    pragmas = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('cache_size', -8000),  # 約 8MB 頁面快取
+        ('mmap_size', 67108864),
+        ('busy_timeout', 5000),
+    )
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _connections = {}  # thread -> connection
+    _generation = 0  # close_all 後遞增，使各執行緒舊連線失效
+    _stats = {'opened': 0, 'closed': 0, 'queries': 0}
+
+    @classmethod
+    def configure(cls, db_path=None, statement_cache_size=None):
+        """切換資料庫檔案（例如測試或基準測試），會先關閉所有既有連線"""
+        cls.close_all()
+        if db_path is not None:
+            cls.db_path = db_path
+        if statement_cache_size is not None:
+            cls.statement_cache_size = statement_cache_size
+
+    @classmethod
+    def get_connection(cls):
+        """取得目前執行緒的連線，不存在時才建立"""
+        conn = getattr(cls._local, 'conn', None)
+        if conn is not None and cls._local.generation == cls._generation:
+            return conn
+        # 每條連線只由建立它的執行緒使用；關閉其他執行緒的連線（close_all、已結束的執行緒）須關閉同執行緒檢查
+        conn = sqlite3.connect(cls.db_path, timeout=5, cached_statements=cls.statement_cache_size, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in cls.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        cls._local.conn = conn
+        cls._local.generation = cls._generation
+        with cls._lock:
+            cls._prune_dead_threads()
+            cls._connections[threading.current_thread()] = conn
+            cls._stats['opened'] += 1
+        return conn
+
+    @classmethod
+    def note_query(cls):
+        """統計經由 Database.execute 執行的查詢次數"""
+        with cls._lock:
+            cls._stats['queries'] += 1
+
+    @classmethod
+    def _prune_dead_threads(cls):
+        """關閉已結束執行緒遺留的連線（呼叫端須持有 _lock）"""
+        for thread in [t for t in cls._connections if not t.is_alive()]:
+            cls._close(cls._connections.pop(thread))
+
+    @classmethod
+    def _close(cls, conn):
+        """關閉連線並計數（呼叫端須持有 _lock）；關閉失敗時記錄警告，不計入 closed"""
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logging.warning(f"關閉資料庫連線失敗：{str(e)}")
+            return
+        cls._stats['closed'] += 1
+
+    @classmethod
+    def close_current(cls):
+        """關閉目前執行緒的連線"""
+        conn = getattr(cls._local, 'conn', None)
+        if conn is None:
+            return
+        cls._local.conn = None
+        with cls._lock:
+            cls._connections.pop(threading.current_thread(), None)
+            cls._stats['closed'] += 1
+        conn.close()
+
+    @classmethod
+    def close_all(cls):
+        """關閉所有執行緒的連線（程式結束或切換資料庫時使用）"""
+        with cls._lock:
+            for conn in cls._connections.values():
+                cls._close(conn)
+            cls._connections.clear()
+            cls._generation += 1
+        cls._local.conn = None
+
+    @classmethod
+    def stats(cls):
+        """返回連線及語句快取統計"""
+        with cls._lock:
+            cls._prune_dead_threads()
+            return dict(cls._stats, open_connections=len(cls._connections))
+
 
 class Database:
+    _write_listeners = []
+    write_count = 0  # 本程序已提交的寫入批次數，供快取判斷資料是否改變
+    _WRITE_TARGET = re.compile(r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(\w+)', re.IGNORECASE)
+
+    @staticmethod
+    def add_write_listener(listener):
+        """註冊寫入通知：每批寫入提交後以被寫入的資料表名稱集合呼叫 listener(tables)"""
+        Database._write_listeners.append(listener)
+
+    @staticmethod
+    def tables_written(query):
+        """由 INSERT/UPDATE/DELETE 語句解析被寫入的資料表名稱"""
+        match = Database._WRITE_TARGET.match(query)
+        return (match.group(1),) if match else ()
+
+    @staticmethod
+    def notify_written(tables):
+        Database.write_count += 1
+        for listener in list(Database._write_listeners):
+            try:
+                listener(tables)
+            except Exception as e:
+                logging.error(f"寫入通知處理失敗：{str(e)}")
+
     @staticmethod
     def initialize_database():
+        """將資料庫遷移至最新版本；資料庫已是最新時只做一次 PRAGMA user_version 查詢"""
+        from migrations import Migrations  # 避免循環匯入
         try:
-            db_exists = os.path.exists(DB_NAME)
-            with sqlite3.connect(DB_NAME) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                for script in [
-                    '''CREATE TABLE IF NOT EXISTS Customers (
-                        customer_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        name TEXT NOT NULL, 
-                        contact_method TEXT, 
-                        unique_mark TEXT DEFAULT ''
-                    )''',
-                    '''CREATE TABLE IF NOT EXISTS Treatments (
-                        treatment_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        name TEXT NOT NULL UNIQUE, 
-                        peak_price REAL NOT NULL, 
-                        non_peak_price REAL NOT NULL, 
-                        is_combo INTEGER NOT NULL DEFAULT 0 CHECK(is_combo IN (0, 1)),
-                        can_add_neck BOOLEAN DEFAULT 0,
-                        has_remaining_sessions BOOLEAN DEFAULT 0
-                    )''',
-                    '''CREATE TABLE IF NOT EXISTS Customer_Treatments (
-                        customer_treatment_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        customer_id INTEGER, 
-                        treatment_id INTEGER, 
-                        treatment_date TEXT NOT NULL, 
-                        is_peak INTEGER CHECK(is_peak IN (0, 1)), 
-                        neck_treatment INTEGER DEFAULT 0 CHECK(neck_treatment IN (0, 1)), 
-                        package_id INTEGER, 
-                        remaining_sessions INTEGER DEFAULT 0, 
-                        price REAL DEFAULT 0, 
-                        retouch_parent_id INTEGER, 
-                        remaining_retouch_count INTEGER DEFAULT 1,
-                        import_id INTEGER DEFAULT NULL,
-                        FOREIGN KEY(customer_id) REFERENCES Customers(customer_id), 
-                        FOREIGN KEY(treatment_id) REFERENCES Treatments(treatment_id), 
-                        FOREIGN KEY(retouch_parent_id) REFERENCES Customer_Treatments(customer_treatment_id)
-                    )''',
-                    '''CREATE TABLE IF NOT EXISTS Expenses (
-                        expense_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        expense_date TEXT NOT NULL, 
-                        category TEXT NOT NULL, 
-                        amount REAL NOT NULL, 
-                        description TEXT
-                    )''',
-                    '''CREATE TABLE IF NOT EXISTS Import_History (
-                        import_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        import_date TEXT,
-                        record_count INTEGER,
-                        status TEXT
-                    )'''
-                ]:
-                    cursor.execute(script)
-
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_name ON Customers(name)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_treatment_date ON Customer_Treatments(treatment_date)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_id ON Customer_Treatments(customer_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_date ON Expenses(expense_date)')
-
-                cursor.execute('PRAGMA table_info(Treatments)')
-                treatment_columns = [col[1] for col in cursor.fetchall()]
-                if 'can_add_neck' not in treatment_columns:
-                    cursor.execute('ALTER TABLE Treatments ADD COLUMN can_add_neck BOOLEAN DEFAULT 0')
-                if 'has_remaining_sessions' not in treatment_columns:
-                    cursor.execute('ALTER TABLE Treatments ADD COLUMN has_remaining_sessions BOOLEAN DEFAULT 0')
-
-                cursor.execute('PRAGMA table_info(Customer_Treatments)')
-                ct_columns = [col[1] for col in cursor.fetchall()]
-                if 'retouch_parent_id' not in ct_columns:
-                    cursor.execute('ALTER TABLE Customer_Treatments ADD COLUMN retouch_parent_id INTEGER')
-                if 'remaining_retouch_count' not in ct_columns:
-                    cursor.execute('ALTER TABLE Customer_Treatments ADD COLUMN remaining_retouch_count INTEGER DEFAULT 1')
-                if 'import_id' not in ct_columns:  # 已修正
-                    cursor.execute('ALTER TABLE Customer_Treatments ADD COLUMN import_id INTEGER DEFAULT NULL')
-
-                treatments_data = [(name, details["peak_price"], details["non_peak_price"], details["is_combo"])
-                                 for name, details in DEFAULT_TREATMENTS.items()]
-                cursor.executemany('INSERT OR IGNORE INTO Treatments (name, peak_price, non_peak_price, is_combo) VALUES (?, ?, ?, ?)', treatments_data)
-
-                cursor.execute('SELECT COUNT(*) FROM Treatments WHERE name = ?', ('補脫療程',))
-                if cursor.fetchone()[0] == 0:
-                    cursor.execute('INSERT INTO Treatments (name, peak_price, non_peak_price, is_combo) VALUES (?, ?, ?, ?)', 
-                                  ('補脫療程', 0, 0, 0))
-
-                cursor.execute('SELECT COUNT(*) FROM Customers WHERE contact_method = "Whatsapp"')
-                if cursor.fetchone()[0] > 0:
-                    cursor.execute('UPDATE Customers SET contact_method = ? WHERE contact_method = ?', ('WhatsApp', 'Whatsapp'))
-
-                cursor.execute('SELECT COUNT(*) FROM Customer_Treatments WHERE treatment_id = (SELECT treatment_id FROM Treatments WHERE name = "補脫療程")')
-                if cursor.fetchone()[0] == 0:
-                    cursor.execute('''
-                        UPDATE Customer_Treatments
-                        SET treatment_id = (SELECT treatment_id FROM Treatments WHERE name = '補脫療程'),
-                            remaining_retouch_count = 0
-                        WHERE price = 0 AND treatment_id = (SELECT treatment_id FROM Treatments WHERE name = '熱能氣化 - 單次脫墨/疣')
-                    ''')
-
-                cursor.execute('UPDATE Treatments SET can_add_neck = 1 WHERE name = "Einxel Plus膠原修復針"')
-                cursor.execute('UPDATE Treatments SET has_remaining_sessions = 1 WHERE name = "組合療程：Einxel Plus膠原修復針 6次包套"')
-
-                conn.commit()
-                logging.info(f"資料庫{'初始化' if not db_exists else '更新'}成功")
+            Migrations.migrate()
         except sqlite3.Error as e:
             logging.error(f"資料庫初始化失敗：{str(e)}")
             raise
 
     @staticmethod
     def execute(query, params=(), fetch=False):
+        if not fetch and not DatabaseExecutor.is_writer_thread():
+            # 所有寫入都交由單一寫入執行緒排隊執行，避免 "database is locked"
+            return DatabaseExecutor.submit_write(query, params).result()
+        conn = ConnectionManager.get_connection()
+        try:
+            ConnectionManager.note_query()
+            start = time.perf_counter()
+            cursor = conn.execute(query, params)
+            if fetch:
+                rows = [dict(row) for row in cursor.fetchall()]
+                QueryStats.record(query, (time.perf_counter() - start) * 1000, len(rows), conn, params)
+                return rows
+            QueryStats.record(query, (time.perf_counter() - start) * 1000, cursor.rowcount, conn, params)
+            return cursor.lastrowid  # 寫入執行緒上由所屬批次統一提交
+        except sqlite3.Error as e:
+            # 參數可能含客戶資料，只記錄查詢指紋及參數個數
+            logging.error(f"資料庫操作失敗，查詢：{QueryStats.fingerprint(query)}，參數 {len(params)} 個，錯誤：{str(e)}")
+            raise
+
+class DatabaseExecutor:
+    """集中式資料庫執行器：單一寫入執行緒（有界佇列、群組提交）加上並行讀取執行緒池"""
+    queue_size = 1000
+    max_batch = 200
+    reader_count = 4
+
+    _lock = threading.Lock()
+    _queue = None
+    _writer = None
+    _readers = None
+
+    @classmethod
+    def start(cls):
+        """啟動寫入執行緒及讀取執行緒池（重複呼叫無副作用）"""
+        with cls._lock:
+            if cls._writer is not None and cls._writer.is_alive():
+                return
+            cls._queue = queue.Queue(maxsize=cls.queue_size)
+            cls._readers = ThreadPoolExecutor(max_workers=cls.reader_count, thread_name_prefix='db-reader')
+            cls._writer = threading.Thread(target=cls._writer_loop, args=(cls._queue,), name='db-writer', daemon=True)
+            cls._writer.start()
+
+    @classmethod
+    def shutdown(cls, wait=True):
+        """停止接收新工作，並等待已排隊的寫入完成"""
+        with cls._lock:
+            writer, work_queue, readers = cls._writer, cls._queue, cls._readers
+            cls._writer = cls._queue = cls._readers = None
+        if writer is not None:
+            work_queue.put(None)
+            if wait:
+                writer.join()
+        if readers is not None:
+            readers.shutdown(wait=wait)
+
+    @classmethod
+    def is_writer_thread(cls):
+        return cls._writer is not None and threading.current_thread() is cls._writer
+
+    @classmethod
+    def submit_read(cls, query, params=()):
+        """在讀取執行緒池中查詢，返回 Future（結果為 list of dict）"""
+        cls.start()
+        return cls._readers.submit(Database.execute, query, params, True)
+
+    @classmethod
+    def submit_write(cls, query, params=(), many=False):
+        """排入寫入佇列，返回 Future（單筆為 lastrowid，many=True 時為影響筆數）"""
+        tables = Database.tables_written(query)
+        if many:
+            return cls.submit_transaction(lambda conn: conn.executemany(query, params).rowcount, tables)
+        return cls.submit_transaction(lambda conn: Database.execute(query, params), tables)
+
+    @classmethod
+    def submit_change(cls, table, action, query, params=(), pk=None):
+        """
+        單筆寫入並發布列層級變更事件（見 ChangeEvents）；action 為 insert 時主鍵取自 lastrowid。
+        返回 Future，結果為該列主鍵。
+        """
+        def work(conn):
+            row_id = Database.execute(query, params)
+            key = row_id if action == INSERT else pk
+            ChangeEvents.record(table, action, key)
+            return key
+        return cls.submit_transaction(work, (table,))
+
+    @classmethod
+    def submit_transaction(cls, work, tables=()):
+        """
+        排入任意寫入工作 work(conn)，與同批其他寫入一起提交；失敗時只回滾該工作。
+        tables 為此工作會寫入的資料表，提交後用於寫入通知。
+        """
+        cls.start()
+        future = Future()
+        cls._queue.put((future, work, tuple(tables)))
+        return future
+
+    @staticmethod
+    def gather(futures):
+        """合併多個 Future，全部完成後以結果列表完成"""
+        combined = Future()
+        futures = list(futures)
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] or combined.done():
+                    return
+            errors = [f.exception() for f in futures if f.exception() is not None]
+            if errors:
+                combined.set_exception(errors[0])
+            else:
+                combined.set_result([f.result() for f in futures])
+
+        if not futures:
+            combined.set_result([])
+        for f in futures:
+            f.add_done_callback(on_done)
+        return combined
+
+    @staticmethod
+    def then(future, transform):
+        """返回新的 Future，結果為 transform(原結果)"""
+        chained = Future()
+
+        def on_done(f):
+            try:
+                chained.set_result(transform(f.result()))
+            except Exception as e:
+                chained.set_exception(e)
+
+        future.add_done_callback(on_done)
+        return chained
+
+    @staticmethod
+    def deliver(master, future, on_success, on_error=None, key=None):
+        """
+        Future 完成後，在 Tk 主執行緒呼叫 on_success(result) 或 on_error(exception)（經由 TaskScheduler 的回呼佇列）。
+        指定 key 時，同 key 較早的請求若尚未交付則捨棄其結果，避免舊資料覆蓋新資料。
+        """
+        TaskScheduler.install(master)
+        return TaskScheduler.deliver(future, on_success, on_error, key)
+
+    @classmethod
+    def _writer_loop(cls, work_queue):
+        conn = ConnectionManager.get_connection()
+        running = True
+        while running:
+            job = work_queue.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < cls.max_batch:
+                try:
+                    job = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    running = False
+                    break
+                batch.append(job)
+            cls._run_batch(conn, batch)
+        ConnectionManager.close_current()
+
+    @staticmethod
+    def _run_batch(conn, batch):
+        """在同一交易中執行整批寫入，每個工作以 SAVEPOINT 隔離"""
+        outcomes = []
+        written = set()
         try:
-            with sqlite3.connect(DB_NAME) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                if fetch:
-                    return [dict(row) for row in cursor.fetchall()]
-                conn.commit()
-                return cursor.lastrowid
+            conn.execute('BEGIN IMMEDIATE')
+            for future, work, tables in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT job')
+                mark = ChangeEvents.mark()
+                try:
+                    result = work(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    ChangeEvents.discard(mark)
+                    conn.execute('RELEASE job')
+                    logging.error(f"資料庫寫入失敗：{str(e)}")
+                    outcomes.append((future, None, e))
+                    continue
+                conn.execute('RELEASE job')
+                written.update(tables)
+                outcomes.append((future, result, None))
+            conn.commit()
         except sqlite3.Error as e:
-            logging.error(f"資料庫操作失敗，查詢：{query}，參數：{params}，錯誤：{str(e)}")
-            raise
\ No newline at end of file
+            if conn.in_transaction:
+                conn.rollback()
+            ChangeEvents.discard()
+            logging.error(f"批次寫入提交失敗（{len(batch)} 筆）：{str(e)}")
+            for future, _, _ in batch:
+                if future.running():
+                    future.set_exception(e)
+            return
+        if written:
+            Database.notify_written(written)
+        ChangeEvents.publish()
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta
+
+
+class DateRange:
+    """
+    將「月份」「期間」等選擇轉換為半開區間 [start, end) 的日期字串，
+    讓查詢寫成 column >= ? AND column < ?，可使用日期欄位上的索引。
+    """
+
+    @staticmethod
+    def month(month):
+        """'2024-05' -> ('2024-05-01', '2024-06-01')"""
+        first = datetime.strptime(month, '%Y-%m').date()
+        return first.isoformat(), DateRange._next_month(first).isoformat()
+
+    @staticmethod
+    def months(first_month, last_month):
+        """兩個月份（皆含）之間的區間，例如 ('2024-01', '2024-12') -> ('2024-01-01', '2025-01-01')"""
+        start, _ = DateRange.month(first_month)
+        _, end = DateRange.month(last_month)
+        return start, end
+
+    @staticmethod
+    def year(year):
+        return f'{int(year):04d}-01-01', f'{int(year) + 1:04d}-01-01'
+
+    @staticmethod
+    def day(day):
+        """'2024-05-03' -> ('2024-05-03', '2024-05-04')"""
+        current = datetime.strptime(day, '%Y-%m-%d').date()
+        return current.isoformat(), (current + timedelta(days=1)).isoformat()
+
+    @staticmethod
+    def month_list(first_month, last_month):
+        """列出兩個月份（皆含）之間的所有月份字串"""
+        current = datetime.strptime(first_month, '%Y-%m').date()
+        last = datetime.strptime(last_month, '%Y-%m').date()
+        months = []
+        while current <= last:
+            months.append(current.strftime('%Y-%m'))
+            current = DateRange._next_month(current)
+        return months
+
+    @staticmethod
+    def condition(column):
+        """返回對應的 SQL 條件，搭配 (start, end) 參數使用"""
+        return f'{column} >= ? AND {column} < ?'
+
+    @staticmethod
+    def _next_month(first):
+        return date(first.year + first.month // 12, first.month % 12 + 1, 1)
@@ -0,0 +1,89 @@
+from tkinter import *
+from tkinter import ttk, messagebox, filedialog
+from database import ConnectionManager
+from query_stats import QueryStats
+from result_cache import ResultCache
+from task_scheduler import TaskScheduler
+
+COLUMNS = [("查詢", 520, 'w'), ("次數", 70, 'center'), ("總耗時(ms)", 100, 'center'), ("p50(ms)", 80, 'center'),
+           ("p95(ms)", 80, 'center'), ("最大(ms)", 80, 'center'), ("筆數", 80, 'center'), ("慢查詢", 70, 'center')]
+
+
+class DiagnosticsWindow:
+    """隱藏的診斷視窗（F12）：查詢統計、連線統計，可重設或匯出為 JSON"""
+    _instance = None
+
+    @classmethod
+    def show(cls, master):
+        if cls._instance is not None and cls._instance.win.winfo_exists():
+            cls._instance.win.lift()
+            cls._instance.refresh()
+            return cls._instance
+        cls._instance = cls(master)
+        return cls._instance
+
+    def __init__(self, master):
+        self.win = Toplevel(master)
+        self.win.title("診斷：查詢統計")
+        self.win.geometry("1150x500")
+
+        button_frame = ttk.Frame(self.win)
+        button_frame.pack(fill=X, padx=10, pady=5)
+        ttk.Button(button_frame, text="重新整理", command=self.refresh).pack(side=LEFT, padx=5)
+        ttk.Button(button_frame, text="重設", command=self.reset).pack(side=LEFT, padx=5)
+        ttk.Button(button_frame, text="匯出 JSON", command=self.export).pack(side=LEFT, padx=5)
+        self.connection_var = StringVar()
+        ttk.Label(button_frame, textvariable=self.connection_var).pack(side=RIGHT, padx=5)
+
+        tree_frame = ttk.Frame(self.win)
+        tree_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
+        self.tree = ttk.Treeview(tree_frame, columns=[c[0] for c in COLUMNS], show="headings")
+        for col, width, anchor in COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor=anchor)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.tree.yview)
+        scrollbar.pack(side=RIGHT, fill=Y)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.bind("<<TreeviewSelect>>", lambda e: self.show_plan())
+
+        self.plan_text = Text(self.win, height=6, font=('Consolas', 10))
+        self.plan_text.pack(fill=X, padx=10, pady=5)
+        self.snapshot = []
+        self.refresh()
+
+    def refresh(self):
+        self.snapshot = QueryStats.snapshot()
+        self.tree.delete(*self.tree.get_children())
+        for i, s in enumerate(self.snapshot):
+            self.tree.insert("", "end", iid=str(i), values=(s['query'], s['count'], s['total_ms'], s['p50_ms'],
+                                                            s['p95_ms'], s['max_ms'], s['rows'], s['slow']))
+        stats = ConnectionManager.stats()
+        cache = ResultCache.stats()
+        cache_rate = f"{cache['hit_rate'] * 100:.1f}%" if cache['hit_rate'] is not None else "-"
+        tasks = TaskScheduler.stats()
+        self.connection_var.set(f"連線 {stats['open_connections']}，查詢 {stats['queries']} 次，"
+                                f"結果快取 {cache['entries']} 筆／{cache['bytes'] // 1024}KB，命中率 {cache_rate}；"
+                                f"背景工作 執行 {tasks['running']}，排隊 {tasks['queued_interactive']}+{tasks['queued_background']}"
+                                f"（最多 {tasks['peak_queued']}），已捨棄 {tasks['dropped']}")
+
+    def show_plan(self):
+        selected = self.tree.selection()
+        self.plan_text.delete('1.0', END)
+        if selected:
+            s = self.snapshot[int(selected[0])]
+            self.plan_text.insert(END, s['query'] + '\n\n' + '\n'.join(s['plan'] or ['（未超過慢查詢門檻，未擷取查詢計畫）']))
+
+    def reset(self):
+        QueryStats.reset()
+        self.refresh()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self.win, title="匯出查詢統計", initialfile="query_stats.json",
+                                            defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            QueryStats.dump(path)
+        except OSError as e:
+            messagebox.showerror("錯誤", f"匯出失敗：{str(e)}", parent=self.win)
@@ -0,0 +1,133 @@
+import csv
+import os
+import sys
+from database import Database, ConnectionManager
+from report_queries import ReportQueries
+from constants import logging
+
+# 可匯出的資料來源：(查詢, 欄位, 標題)；查詢皆以半開日期區間篩選
+EXPORT_SOURCES = {
+    'expenses': (ReportQueries.EXPENSES_IN_RANGE,
+                 ('expense_date', 'category', 'amount', 'description'),
+                 ('日期', '類別', '金額', '備註')),
+    'treatments': (ReportQueries.TREATMENTS_IN_RANGE,
+                   ('treatment_date', 'customer_name', 'treatment_name', 'is_peak', 'neck_treatment', 'price'),
+                   ('日期', '客戶', '療程', 'Peak', '頸部', '金額')),
+    'ledger': (ReportQueries.DAILY_LEDGER,
+               ('day', 'income', 'expense', 'net_income'),
+               ('日期', '收入', '支出', '淨收入')),
+}
+ALL_DATES = ('0000-01-01', '9999-12-31')
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class Exporter:
+    """
+    串流匯出：以游標分批 fetchmany，逐批寫入 CSV 或唯寫模式的 xlsx，
+    記憶體用量與資料量無關；可回報進度並可取消。
+    先寫入同目錄的 .partial 檔，完成後才取代目標檔案，取消或失敗時原有的同名檔案不受影響。
+    """
+    chunk_size = 2000
+
+    def __init__(self, path, source='expenses', start_date=None, end_date=None, progress=None, cancel_event=None):
+        if source not in EXPORT_SOURCES:
+            raise ValueError(f"未知的匯出資料：{source}")
+        self.path = path
+        self.source = source
+        self.period = (start_date or ALL_DATES[0], end_date or ALL_DATES[1])
+        self.progress = progress  # progress(已匯出筆數, 總筆數)
+        self.cancel_event = cancel_event
+
+    def count(self):
+        query, _, _ = EXPORT_SOURCES[self.source]
+        return Database.execute(f'SELECT COUNT(*) as count FROM ({query})', self.period, fetch=True)[0]['count']
+
+    def run(self):
+        """執行匯出，返回匯出筆數；取消時刪除未完成的暫存檔並拋出 ExportCancelled"""
+        query, columns, headers = EXPORT_SOURCES[self.source]
+        total = self.count()
+        partial = f'{self.path}.partial'
+        cursor = ConnectionManager.get_connection().execute(query, self.period)
+        written = 0
+        try:
+            with self._open_writer(partial, headers) as write_rows:
+                while True:
+                    if self.cancel_event is not None and self.cancel_event.is_set():
+                        raise ExportCancelled()
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+                    write_rows([tuple(row[c] for c in columns) for row in rows])
+                    written += len(rows)
+                    if self.progress:
+                        self.progress(written, total)
+        except BaseException:
+            cursor.close()
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, self.path)
+        logging.info(f"匯出 {self.source} 至 {self.path}：{written} 筆")
+        return written
+
+    def _open_writer(self, path, headers):
+        """格式依目標檔案的副檔名決定，寫入 path"""
+        if os.path.splitext(self.path)[1].lower() == '.xlsx':
+            return _XlsxWriter(path, headers)
+        return _CsvWriter(path, headers)
+
+
+class _CsvWriter:
+    def __init__(self, path, headers):
+        self.path, self.headers = path, headers
+
+    def __enter__(self):
+        self.file = open(self.path, 'w', newline='', encoding='utf-8-sig')  # 帶 BOM，Excel 可正確顯示中文
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.headers)
+        return self.writer.writerows
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+class _XlsxWriter:
+    def __init__(self, path, headers):
+        self.path, self.headers = path, headers
+
+    def __enter__(self):
+        from openpyxl import Workbook  # 只有匯出 xlsx 時才需要
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append(self.headers)
+        return lambda rows: [self.sheet.append(row) for row in rows]
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.workbook.save(self.path)
+        else:
+            self.workbook.close()
+
+
+def main(argv):
+    """命令列：python exporter.py <expenses|treatments|ledger> <輸出檔.csv|.xlsx> [起始日 [結束日（不含）]] [--db 資料庫]"""
+    args = list(argv[1:])
+    if '--db' in args:
+        index = args.index('--db')
+        ConnectionManager.configure(args[index + 1])
+        del args[index:index + 2]
+    if len(args) < 2:
+        print(main.__doc__)
+        return 2
+    Database.initialize_database()
+    exporter = Exporter(args[1], args[0], *args[2:4],
+                        progress=lambda done, total: print(f"\r已匯出 {done}/{total} 筆", end=''))
+    print(f"\n完成，共 {exporter.run()} 筆")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
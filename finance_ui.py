@@ -1,10 +1,15 @@
-import sqlite3
 import datetime
 from tkinter import *
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from tkcalendar import DateEntry
-from database import Database
+from database import Database, DatabaseExecutor
+from change_events import ChangeEvents, INSERT, UPDATE, DELETE
+from ledger import Ledger
+from exporter import Exporter, ExportCancelled
+from paged_tree import PagedTreeview
+from task_scheduler import TaskScheduler, BACKGROUND
 from constants import DEFAULT_CATEGORIES, logging
+import threading
 
 class FinanceUI:
     def __init__(self, notebook, app):
@@ -13,8 +18,13 @@ class FinanceUI:
         self.status_var = app.status_var
         self.tab = ttk.Frame(notebook)
         notebook.add(self.tab, text="財務管理")
-        self.db_lock = threading.Lock()
-        self.setup_finance_tab()
+        self.export_cancel = None  # 匯出進行中時為 threading.Event
+        self.built = False  # 第一次切換到此標籤頁時才由 build() 建立內容
+
+    def build(self):
+        if not self.built:
+            self.built = True
+            self.setup_finance_tab()
 
     def setup_finance_tab(self):
         """設置財務管理標籤頁"""
@@ -25,6 +35,11 @@ class FinanceUI:
         button_frame.pack(fill=X, pady=10)
         ttk.Button(button_frame, text="新增支出", command=self.add_expense).pack(side=LEFT, padx=10)
         ttk.Button(button_frame, text="匯出支出", command=self.export_expenses).pack(side=LEFT, padx=10)
+        ttk.Label(button_frame, text="類別篩選：").pack(side=LEFT, padx=10)
+        self.category_filter = ttk.Combobox(button_frame, values=["全部"] + DEFAULT_CATEGORIES, width=12, state="readonly", font=('微軟正黑體', 12))
+        self.category_filter.set("全部")
+        self.category_filter.pack(side=LEFT)
+        self.category_filter.bind("<<ComboboxSelected>>", lambda e: self.load_finance_data())
 
         expense_frame = ttk.LabelFrame(finance_container, text="支出記錄", padding=10)
         expense_frame.pack(fill=BOTH, expand=True)
@@ -32,16 +47,25 @@ class FinanceUI:
         for col, width in [("日期", 150), ("類別", 150), ("金額", 150), ("備註", 300), ("淨收入", 150)]:
             self.expense_tree.heading(col, text=col)
             self.expense_tree.column(col, width=width, anchor='center')
+        for col, sort in [("日期", 'date'), ("類別", 'category'), ("金額", 'amount')]:
+            self.expense_tree.heading(col, command=lambda s=sort: self.sort_expenses(s))
         self.expense_tree.pack(side=LEFT, fill=BOTH, expand=True)
         scrollbar = ttk.Scrollbar(expense_frame, orient=VERTICAL, command=self.expense_tree.yview)
-        self.expense_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side=RIGHT, fill=Y)
+        self.expense_sort, self.expense_descending = 'date', True
+        self.expense_pager = PagedTreeview(self.master, self.expense_tree, scrollbar, self.fetch_expense_page,
+                                           self.expense_item, on_loaded=self.on_expenses_loaded)
         self.expense_tree.bind("<Button-3>", self.popup_expense_menu)
 
         self.expense_menu = Menu(self.master, tearoff=0)
         self.expense_menu.add_command(label="編輯支出", command=self.edit_expense)
         self.expense_menu.add_command(label="刪除支出", command=self.delete_expense)
 
+        # 寫入後只更新受影響的列及當日淨收入，不重新載入整個列表
+        ChangeEvents.subscribe_tk(self.master, 'Expenses', self.on_expense_changes)
+        Database.add_write_listener(lambda tables: 'Customer_Treatments' in tables
+                                    and TaskScheduler.post(self.refresh_net_income, key='finance.net_income'))
+
         self.load_finance_data()
 
     def add_expense(self):
@@ -65,94 +89,18 @@ class FinanceUI:
         def save():
             try:
                 amount = float(amount_entry.get())
-                with self.db_lock:
-                    Database.execute('INSERT INTO Expenses (expense_date, category, amount, description) VALUES (?, ?, ?, ?)', 
-                                    (date_entry.get_date().strftime("%Y-%m-%d"), category_combo.get(), amount, desc_entry.get()))
-                self.load_finance_data()
-                win.destroy()
-                self.status_var.set("支出已新增")
-                logging.info(f"新增支出: 日期 {date_entry.get_date().strftime('%Y-%m-%d')}, 金額 ${round(amount)}")
             except ValueError:
                 messagebox.showerror("錯誤", "金額必須為數字")
+                return
+            expense_date = date_entry.get_date().strftime("%Y-%m-%d")
+            future = DatabaseExecutor.submit_change('Expenses', INSERT, 'INSERT INTO Expenses (expense_date, category, amount, description) VALUES (?, ?, ?, ?)', 
+                                                    (expense_date, category_combo.get(), amount, desc_entry.get()))
 
-        ttk.Button(win, text="保存", command=save).grid(row=4, column=0, columnspan=2, pady=20)
-import sqlite3
-import datetime
-from tkinter import *
-from tkinter import ttk, messagebox
-from tkcalendar import DateEntry
-from database import Database
-from constants import DEFAULT_CATEGORIES, logging
-import threading
-
-class FinanceUI:
-    def __init__(self, notebook, app):
-        self.app = app  # 接收主 Application 實例
-        self.master = app.master
-        self.status_var = app.status_var
-        self.tab = ttk.Frame(notebook)
-        notebook.add(self.tab, text="財務管理")
-        self.db_lock = threading.Lock()
-        self.setup_finance_tab()
-
-    def setup_finance_tab(self):
-        """設置財務管理標籤頁"""
-        finance_container = ttk.Frame(self.tab)
-        finance_container.pack(expand=True, fill=BOTH, padx=10, pady=10)
-
-        button_frame = ttk.Frame(finance_container)
-        button_frame.pack(fill=X, pady=10)
-        ttk.Button(button_frame, text="新增支出", command=self.add_expense).pack(side=LEFT, padx=10)
-        ttk.Button(button_frame, text="匯出支出", command=self.export_expenses).pack(side=LEFT, padx=10)
-
-        expense_frame = ttk.LabelFrame(finance_container, text="支出記錄", padding=10)
-        expense_frame.pack(fill=BOTH, expand=True)
-        self.expense_tree = ttk.Treeview(expense_frame, columns=("日期", "類別", "金額", "備註", "淨收入"), show="headings", height=15)
-        for col, width in [("日期", 150), ("類別", 150), ("金額", 150), ("備註", 300), ("淨收入", 150)]:
-            self.expense_tree.heading(col, text=col)
-            self.expense_tree.column(col, width=width, anchor='center')
-        self.expense_tree.pack(side=LEFT, fill=BOTH, expand=True)
-        scrollbar = ttk.Scrollbar(expense_frame, orient=VERTICAL, command=self.expense_tree.yview)
-        self.expense_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side=RIGHT, fill=Y)
-        self.expense_tree.bind("<Button-3>", self.popup_expense_menu)
-
-        self.expense_menu = Menu(self.master, tearoff=0)
-        self.expense_menu.add_command(label="編輯支出", command=self.edit_expense)
-        self.expense_menu.add_command(label="刪除支出", command=self.delete_expense)
-
-        self.load_finance_data()
-
-    def add_expense(self):
-        """新增支出"""
-        win = Toplevel(self.master)
-        win.title("新增支出")
-        win.geometry("400x300")
-        ttk.Label(win, text="日期：").grid(row=0, column=0, padx=10, pady=10)
-        date_entry = DateEntry(win, width=15, date_pattern="yyyy-mm-dd", font=('微軟正黑體', 12))
-        date_entry.grid(row=0, column=1)
-        ttk.Label(win, text="類別：").grid(row=1, column=0, padx=10, pady=10)
-        category_combo = ttk.Combobox(win, values=DEFAULT_CATEGORIES, width=20, font=('微軟正黑體', 12))
-        category_combo.grid(row=1, column=1)
-        ttk.Label(win, text="金額：").grid(row=2, column=0, padx=10, pady=10)
-        amount_entry = ttk.Entry(win, width=15, font=('微軟正黑體', 12))
-        amount_entry.grid(row=2, column=1)
-        ttk.Label(win, text="備註：").grid(row=3, column=0, padx=10, pady=10)
-        desc_entry = ttk.Entry(win, width=20, font=('微軟正黑體', 12))
-        desc_entry.grid(row=3, column=1)
-
-        def save():
-            try:
-                amount = float(amount_entry.get())
-                with self.db_lock:
-                    Database.execute('INSERT INTO Expenses (expense_date, category, amount, description) VALUES (?, ?, ?, ?)', 
-                                    (date_entry.get_date().strftime("%Y-%m-%d"), category_combo.get(), amount, desc_entry.get()))
-                self.load_finance_data()
+            def on_saved(_):
                 win.destroy()
                 self.status_var.set("支出已新增")
-                logging.info(f"新增支出: 日期 {date_entry.get_date().strftime('%Y-%m-%d')}, 金額 ${round(amount)}")
-            except ValueError:
-                messagebox.showerror("錯誤", "金額必須為數字")
+                logging.info(f"新增支出: 日期 {expense_date}, 金額 ${round(amount)}")
+            DatabaseExecutor.deliver(self.master, future, on_saved, self.show_db_error)
 
         ttk.Button(win, text="保存", command=save).grid(row=4, column=0, columnspan=2, pady=20)
 
@@ -162,11 +110,20 @@ class FinanceUI:
         if len(selected) != 1:
             messagebox.showwarning("警告", "請選擇一筆支出")
             return
-        expense_id = self.expense_tree.item(selected[0], 'values')[0]  # 假設日期作為唯一標識，實際應使用 expense_id
-        with self.db_lock:
-            data = Database.execute('SELECT expense_date, category, amount, description FROM Expenses WHERE expense_date = ?', 
-                                   (expense_id,), fetch=True)[0]
+        expense_id = int(selected[0])  # Treeview 項目的 iid 即為 expense_id
+        future = DatabaseExecutor.submit_read('SELECT expense_date, category, amount, description FROM Expenses WHERE expense_id = ?', 
+                                              (expense_id,))
 
+        def on_loaded(rows):
+            if rows:
+                self.open_edit_dialog(expense_id, rows[0])
+            else:
+                self.expense_pager.remove(str(expense_id))
+                self.status_var.set("此支出已被刪除")
+        DatabaseExecutor.deliver(self.master, future, on_loaded, self.show_db_error)
+
+    def open_edit_dialog(self, expense_id, data):
+        """顯示編輯支出視窗"""
         win = Toplevel(self.master)
         win.title("編輯支出")
         win.geometry("400x300")
@@ -190,15 +147,18 @@ class FinanceUI:
         def save():
             try:
                 amount = float(amount_entry.get())
-                with self.db_lock:
-                    Database.execute('UPDATE Expenses SET expense_date = ?, category = ?, amount = ?, description = ? WHERE expense_date = ?', 
-                                    (date_entry.get_date().strftime("%Y-%m-%d"), category_combo.get(), amount, desc_entry.get(), expense_id))
-                self.load_finance_data()
-                win.destroy()
-                self.status_var.set("支出已更新")
-                logging.info(f"編輯支出: 日期 {date_entry.get_date().strftime('%Y-%m-%d')}, 新金額 ${round(amount)}")
             except ValueError:
                 messagebox.showerror("錯誤", "金額必須為數字")
+                return
+            expense_date = date_entry.get_date().strftime("%Y-%m-%d")
+            future = DatabaseExecutor.submit_change('Expenses', UPDATE, 'UPDATE Expenses SET expense_date = ?, category = ?, amount = ?, description = ? WHERE expense_id = ?', 
+                                                    (expense_date, category_combo.get(), amount, desc_entry.get(), expense_id), pk=expense_id)
+
+            def on_saved(_):
+                win.destroy()
+                self.status_var.set("支出已更新")
+                logging.info(f"編輯支出: 日期 {expense_date}, 新金額 ${round(amount)}")
+            DatabaseExecutor.deliver(self.master, future, on_saved, self.show_db_error)
 
         ttk.Button(win, text="保存", command=save).grid(row=4, column=0, columnspan=2, pady=20)
 
@@ -209,15 +169,20 @@ class FinanceUI:
             messagebox.showwarning("警告", "請選擇支出")
             return
         if messagebox.askyesno("確認", "確定刪除所選支出？"):
-            dates = [self.expense_tree.item(item, 'values')[0] for item in selected]
-            with self.db_lock:
-                with sqlite3.connect('secret_time.db') as conn:
-                    cursor = conn.cursor()
-                    cursor.executemany('DELETE FROM Expenses WHERE expense_date = ?', [(date,) for date in dates])
-                    conn.commit()
-            self.load_finance_data()
-            self.status_var.set(f"已刪除 {len(dates)} 筆支出")
-            logging.info(f"刪除支出: 日期 {', '.join(dates)}")
+            expense_ids = [int(item) for item in selected]
+            dates = [self.expense_tree.set(item, "日期") for item in selected]
+            future = DatabaseExecutor.gather(
+                DatabaseExecutor.submit_change('Expenses', DELETE, 'DELETE FROM Expenses WHERE expense_id = ?', (expense_id,), pk=expense_id)
+                for expense_id in expense_ids)
+
+            def on_deleted(_):
+                self.status_var.set(f"已刪除 {len(expense_ids)} 筆支出")
+                logging.info(f"刪除支出: id {', '.join(map(str, expense_ids))}，日期 {', '.join(dates)}")
+            DatabaseExecutor.deliver(self.master, future, on_deleted, self.show_db_error)
+
+    def show_db_error(self, error):
+        """顯示背景資料庫工作的錯誤"""
+        messagebox.showerror("錯誤", f"資料庫操作失敗：{str(error)}")
 
     def popup_expense_menu(self, event):
         """支出列表右鍵選單"""
@@ -226,46 +191,116 @@ class FinanceUI:
             self.expense_menu.post(event.x_root, event.y_root)
 
     def load_finance_data(self):
-        """載入財務數據，異步實現"""
-        def load_in_background():
-            with self.db_lock:
-                expenses = Database.execute('''
-                    SELECT e.expense_date, e.category, e.amount, e.description,
-                           (SELECT SUM(ct.price) - SUM(e2.amount) 
-                            FROM Customer_Treatments ct 
-                            LEFT JOIN Expenses e2 ON date(ct.treatment_date) = date(e2.expense_date)
-                            WHERE date(ct.treatment_date) = date(e.expense_date)) as net_income
-                    FROM Expenses e
-                    ORDER BY e.expense_date DESC
-                ''', fetch=True)
-            self.master.after(0, lambda: self.update_finance_data(expenses))
-
-        self.expense_tree.delete(*self.expense_tree.get_children())
-        threading.Thread(target=load_in_background, daemon=True).start()
-
-    def update_finance_data(self, expenses):
-        """更新財務數據到 UI"""
-        if not expenses:
-            self.status_var.set("無支出數據")
+        """載入財務數據（分頁載入，捲動時再取得其餘資料）"""
+        self.expense_pager.descending = self.expense_descending
+        self.expense_pager.reset()
+
+    def on_expense_changes(self, events):
+        """套用支出的列層級變更：刪除的列直接移除，新增或修改的列重新查詢後放到排序位置"""
+        final = {}
+        for event in events:
+            final[str(event.pk)] = event.action  # 同一列在一批中多次變更時以最後一次為準
+        days = {self.expense_tree.set(iid, "日期")[:10] for iid in final if self.expense_tree.exists(iid)}
+        for iid, action in final.items():
+            if action == DELETE:
+                self.expense_pager.remove(iid)
+        changed = [int(iid) for iid, action in final.items() if action != DELETE]
+        if not changed:
+            self.refresh_net_income(days)
+            return
+
+        def on_loaded(rows):
+            category = self.category_filter.get()
+            found = set()
+            for row in rows:
+                found.add(str(row['expense_id']))
+                days.add(row['expense_date'][:10])
+                if category != "全部" and row['category'] != category:
+                    self.expense_pager.remove(str(row['expense_id']))
+                else:
+                    self.expense_pager.place(row)
+            for expense_id in changed:
+                if str(expense_id) not in found:
+                    self.expense_pager.remove(str(expense_id))
+            self.refresh_net_income(days)
+        DatabaseExecutor.deliver(self.master, DatabaseExecutor.submit_read(*Ledger.expenses_by_ids_query(changed)),
+                                 on_loaded, self.show_db_error)
+
+    def refresh_net_income(self, days=None):
+        """更新指定日期（省略時為所有已載入日期）各列的淨收入欄"""
+        rows_by_day = {}
+        for iid in self.expense_tree.get_children():
+            rows_by_day.setdefault(self.expense_tree.set(iid, "日期")[:10], []).append(iid)
+        days = [day for day in (rows_by_day if days is None else days) if day in rows_by_day]
+        if not days:
             return
-        for e in expenses:
-            net_income = f"${round(e['net_income'] or 0)}" if e['net_income'] is not None else "N/A"
-            self.expense_tree.insert("", "end", values=(e['expense_date'], e['category'], f"${round(e['amount'])}", 
-                                                        e['description'] or "", net_income))
-        self.status_var.set("財務數據已載入")
+
+        def on_loaded(net_incomes):
+            for day in days:
+                net_income = net_incomes.get(day)
+                text = f"${round(net_income or 0)}" if net_income is not None else "N/A"
+                for iid in rows_by_day[day]:
+                    if self.expense_tree.exists(iid):
+                        self.expense_tree.set(iid, "淨收入", text)
+        future = DatabaseExecutor.submit_read(*Ledger.net_income_for_days_query(days))
+        DatabaseExecutor.deliver(self.master, DatabaseExecutor.then(
+            future, lambda rows: {row['day']: row['net_income'] for row in rows}), on_loaded, self.show_db_error)
+
+    def sort_expenses(self, sort):
+        """點選欄位標題排序；再點一次切換遞增／遞減"""
+        self.expense_descending = not self.expense_descending if sort == self.expense_sort else sort != 'category'
+        self.expense_sort = sort
+        self.load_finance_data()
+
+    def fetch_expense_page(self, after, before, limit):
+        """依目前排序及篩選條件取得一頁支出"""
+        category = self.category_filter.get()
+        query, params = Ledger.expense_page_query(self.expense_sort, self.expense_descending, after, before,
+                                                  None if category == "全部" else category, limit)
+        future = DatabaseExecutor.submit_read(query, params)
+        if before is None:
+            return future
+        return DatabaseExecutor.then(future, lambda rows: rows[::-1])
+
+    def expense_item(self, e):
+        """將支出記錄轉為 Treeview 項目 (iid, values, key)"""
+        net_income = f"${round(e['net_income'] or 0)}" if e['net_income'] is not None else "N/A"
+        values = (e['expense_date'], e['category'], f"${round(e['amount'])}", e['description'] or "", net_income)
+        return str(e['expense_id']), values, Ledger.expense_key(e, self.expense_sort)
+
+    def on_expenses_loaded(self, expenses):
+        self.status_var.set("財務數據已載入" if expenses else "無支出數據")
 
     def export_expenses(self):
-        """匯出支出資料"""
-        def export_task():
-            try:
-                with self.db_lock:
-                    expenses = Database.execute('SELECT expense_date, category, amount, description FROM Expenses ORDER BY expense_date DESC', fetch=True)
-                # 假設 pandas 已導入
-                import pandas as pd
-                df = pd.DataFrame(expenses)
-                df.to_excel('expenses_export.xlsx', index=False)
-                self.status_var.set("支出資料已匯出至 expenses_export.xlsx")
-            except Exception as e:
-                messagebox.showerror("錯誤", f"匯出失敗：{str(e)}")
-                logging.error(f"支出匯出失敗：{str(e)}")
-        threading.Thread(target=export_task, daemon=True).start()
\ No newline at end of file
+        """匯出支出資料（串流寫入，可於匯出中再按一次取消）；同一時間只進行一個匯出"""
+        if self.export_cancel is not None:
+            if self.export_cancel.is_set():
+                self.status_var.set("正在取消匯出，請稍候…")
+            elif messagebox.askyesno("確認", "匯出進行中，是否取消？"):
+                self.export_cancel.set()
+            return
+        path = filedialog.asksaveasfilename(title="匯出支出", initialfile="expenses_export.xlsx", defaultextension=".xlsx",
+                                            filetypes=[("Excel 活頁簿", "*.xlsx"), ("CSV 檔案", "*.csv")])
+        if not path:
+            return
+        self.export_cancel = threading.Event()
+        # 進度更新只保留最新一筆，避免大量回呼堆積在主執行緒
+        exporter = Exporter(path, 'expenses', cancel_event=self.export_cancel,
+                            progress=lambda done, total: TaskScheduler.post(
+                                self.status_var.set, f"匯出中… {done}/{total} 筆", key='finance.export_progress'))
+
+        def on_exported(count):
+            self.export_cancel = None
+            self.status_var.set(f"支出資料已匯出至 {path}（{count} 筆）")
+
+        def on_failed(error):
+            self.export_cancel = None
+            if isinstance(error, ExportCancelled):
+                self.status_var.set("匯出已取消")
+                return
+            logging.error(f"支出匯出失敗：{str(error)}")
+            messagebox.showerror("錯誤", f"匯出失敗：{str(error)}")
+        TaskScheduler.install(self.master)
+        # 不指定 key：匯出不可被新工作取代（被取代的匯出仍會寫檔，且結束時不會通知）
+        TaskScheduler.submit(exporter.run, priority=BACKGROUND,
+                             on_success=on_exported, on_error=on_failed)
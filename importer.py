@@ -0,0 +1,262 @@
+import csv
+import os
+import sys
+from datetime import datetime, date
+from database import Database, DatabaseExecutor
+from treatment_catalog import TreatmentCatalog
+from aggregates import Aggregates, SUMMARY_TABLES
+from sync import Sync, NEW_UID
+from constants import NECK_SURCHARGE, logging
+
+# 匯入檔欄位名稱（中英文皆可）
+COLUMN_ALIASES = {
+    'name': ('name', '姓名', '客戶', '客戶名稱'),
+    'contact_method': ('contact_method', 'contact', '聯絡方式'),
+    'unique_mark': ('unique_mark', '備註標記', '識別'),
+    'treatment_date': ('treatment_date', 'date', '日期', '療程日期'),
+    'treatment': ('treatment', 'treatment_name', '療程', '療程名稱'),
+    'price': ('price', 'amount', '金額', '價格'),
+    'is_peak': ('is_peak', 'peak', '繁忙時段'),
+}
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M', '%d/%m/%Y')
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class Importer:
+    """
+    歷史資料批次匯入：逐列串流讀取 CSV／Excel，客戶以快取去重，療程以名稱或價格匹配，
+    每 chunk_size 列以 executemany 寫入一個交易，進度與狀態記錄於 Import_History。
+    """
+    chunk_size = 5000
+
+    def __init__(self, path, progress=None, cancel_event=None):
+        self.path = path
+        self.progress = progress  # progress(已匯入筆數, 已略過筆數)
+        self.cancel_event = cancel_event
+        self.import_id = None
+        self.imported = 0
+        self.skipped = 0
+        self._customers = None  # (name, contact_method) -> customer_id，只在寫入執行緒中修改
+
+    @staticmethod
+    def read_rows(path):
+        """逐列產生 dict（欄位已依 COLUMN_ALIASES 正規化），不會一次載入整個檔案"""
+        if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+            rows = Importer._read_excel(path)
+        else:
+            rows = Importer._read_csv(path)
+        header = None
+        for values in rows:
+            if header is None:
+                header = Importer._map_header(values)
+                continue
+            yield {field: values[i] if i < len(values) else None for field, i in header.items()}
+
+    @staticmethod
+    def _read_csv(path):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+
+    @staticmethod
+    def _read_excel(path):
+        from openpyxl import load_workbook  # 只有匯入 Excel 時才需要
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _map_header(values):
+        names = [str(v).strip().lower() if v is not None else '' for v in values]
+        header = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias.lower() in names:
+                    header[field] = names.index(alias.lower())
+                    break
+        missing = {'name', 'treatment_date', 'price'} - header.keys()
+        if missing:
+            raise ValueError(f"匯入檔缺少必要欄位：{', '.join(sorted(missing))}")
+        return header
+
+    @staticmethod
+    def _parse_date(value):
+        if isinstance(value, (datetime, date)):
+            return value.strftime('%Y-%m-%d')
+        text = str(value or '').strip()
+        if len(text) == 10 and text[4] == '-':
+            try:
+                return date.fromisoformat(text).isoformat()  # 最常見格式，避免較慢的 strptime
+            except ValueError:
+                pass
+        for fmt in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return None
+
+    def _parse(self, row):
+        """將一列轉為待寫入的值；無法解析或無法匹配療程時返回 None"""
+        name = str(row.get('name') or '').strip()
+        treatment_date = self._parse_date(row.get('treatment_date'))
+        try:
+            price = float(row.get('price'))
+        except (TypeError, ValueError):
+            return None
+        if not name or treatment_date is None:
+            return None
+
+        neck = False
+        treatment = TreatmentCatalog.by_name(str(row.get('treatment') or '').strip())
+        if treatment is None:
+            matches = TreatmentCatalog.match_price(price)
+            if not matches:
+                return None
+            treatment = TreatmentCatalog.get(matches[0]['treatment_id'])
+            neck = matches[0]['neck_price']
+        if row.get('is_peak') not in (None, ''):
+            is_peak = 1 if str(row['is_peak']).strip().lower() in ('1', 'true', 'y', 'yes', '是') else 0
+        else:
+            base = price - NECK_SURCHARGE if neck else price
+            is_peak = 1 if base == treatment.peak_price else 0
+        contact = str(row.get('contact_method') or '').strip()
+        mark = str(row.get('unique_mark') or '').strip()
+        return (name, contact, mark, treatment.treatment_id, treatment_date, is_peak, int(neck), price)
+
+    def _write_chunk(self, conn, chunk):
+        """在寫入執行緒中執行：建立新客戶、寫入療程記錄並更新匯入進度"""
+        if self._customers is None:
+            self._customers = {}
+            for customer_id, name, contact in conn.execute(
+                    'SELECT customer_id, name, contact_method FROM Customers ORDER BY customer_id DESC'):
+                self._customers[(name, contact or '')] = customer_id  # 同名同聯絡方式取最早建立者
+        new_customers = {}
+        records = []
+        # 整批寫入時暫停逐列觸發器，寫完後以分組查詢一次更新彙總表，並以一個查詢記錄同步變更
+        last_id = conn.execute('SELECT COALESCE(MAX(customer_treatment_id), 0) FROM Customer_Treatments').fetchone()[0]
+        last_customer_id = conn.execute('SELECT COALESCE(MAX(customer_id), 0) FROM Customers').fetchone()[0]
+        Sync.suspend(conn)
+        try:
+            for name, contact, mark, treatment_id, treatment_date, is_peak, neck, price in chunk:
+                key = (name, contact)
+                customer_id = self._customers.get(key) or new_customers.get(key)
+                if customer_id is None:
+                    customer_id = conn.execute(
+                        f'INSERT INTO Customers (name, contact_method, unique_mark, import_id, sync_uid) VALUES (?, ?, ?, ?, {NEW_UID})',
+                        (name, contact, mark, self.import_id)).lastrowid
+                    new_customers[key] = customer_id
+                records.append((customer_id, treatment_id, treatment_date, is_peak, neck, price, self.import_id))
+            Aggregates.suspend(conn)
+            try:
+                conn.executemany(f'''
+                    INSERT INTO Customer_Treatments (customer_id, treatment_id, treatment_date, is_peak, neck_treatment, price, import_id, sync_uid)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, {NEW_UID})
+                ''', records)
+            finally:
+                Aggregates.resume(conn)
+            Sync.log_rows(conn, 'Customers', 'import_id = ? AND customer_id > ?', (self.import_id, last_customer_id))
+            Sync.log_rows(conn, 'Customer_Treatments', 'import_id = ? AND customer_treatment_id > ?', (self.import_id, last_id))
+        finally:
+            Sync.resume(conn)
+        Aggregates.apply_treatments(conn, 'customer_treatment_id > ?', (last_id,))
+        conn.execute('UPDATE Import_History SET record_count = record_count + ? WHERE import_id = ?',
+                     (len(records), self.import_id))
+        self._customers.update(new_customers)
+        return len(records)
+
+    def _flush(self, chunk):
+        """
+        以一個交易寫入一個 chunk 並等待完成。
+        不與讀檔並行：並行時兩條執行緒爭奪 GIL，sqlite3 每列都要重新取得 GIL，反而大幅變慢。
+        """
+        if chunk:
+            self.imported += DatabaseExecutor.submit_transaction(
+                lambda conn: self._write_chunk(conn, chunk),
+                ('Customers', 'Customer_Treatments', 'Import_History', *SUMMARY_TABLES)).result()
+        if self.progress:
+            self.progress(self.imported, self.skipped)
+
+    def run(self):
+        """執行匯入，返回結果摘要 dict"""
+        self.import_id = Database.execute(
+            'INSERT INTO Import_History (import_date, record_count, status) VALUES (?, 0, ?)',
+            (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'running'))
+        status = 'completed'
+        try:
+            chunk = []
+            for row in self.read_rows(self.path):
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    raise ImportCancelled()
+                values = self._parse(row)
+                if values is None:
+                    self.skipped += 1
+                    continue
+                chunk.append(values)
+                if len(chunk) >= self.chunk_size:
+                    self._flush(chunk)
+                    chunk = []
+            self._flush(chunk)
+        except ImportCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            status = f'failed: {str(e)}'
+            logging.error(f"匯入失敗（import_id={self.import_id}）：{str(e)}")
+        Database.execute('UPDATE Import_History SET status = ? WHERE import_id = ?', (status, self.import_id))
+        logging.info(f"匯入 {self.path}：{status}，匯入 {self.imported} 筆，略過 {self.skipped} 筆（import_id={self.import_id}）")
+        return {'import_id': self.import_id, 'imported': self.imported, 'skipped': self.skipped, 'status': status}
+
+    @staticmethod
+    def rollback(import_id):
+        """整批撤銷一次匯入：刪除其療程記錄，以及由該次匯入建立且已無其他記錄的客戶"""
+        orphaned = '''import_id = ?
+            AND NOT EXISTS (SELECT 1 FROM Customer_Treatments ct WHERE ct.customer_id = Customers.customer_id)'''
+
+        def work(conn):
+            Aggregates.apply_treatments(conn, 'import_id = ?', (import_id,), sign=-1)
+            Sync.suspend(conn)
+            try:
+                Sync.log_rows(conn, 'Customer_Treatments', 'import_id = ?', (import_id,), deleted=True)
+                Aggregates.suspend(conn)
+                try:
+                    deleted = conn.execute('DELETE FROM Customer_Treatments WHERE import_id = ?', (import_id,)).rowcount
+                finally:
+                    Aggregates.resume(conn)
+                Sync.log_rows(conn, 'Customers', orphaned, (import_id,), deleted=True)
+                conn.execute(f'DELETE FROM Customers WHERE {orphaned}', (import_id,))
+            finally:
+                Sync.resume(conn)
+            conn.execute("UPDATE Import_History SET status = 'rolled_back' WHERE import_id = ?", (import_id,))
+            return deleted
+        deleted = DatabaseExecutor.submit_transaction(work, ('Customers', 'Customer_Treatments', 'Import_History', *SUMMARY_TABLES)).result()
+        logging.info(f"已撤銷匯入 import_id={import_id}，刪除 {deleted} 筆療程記錄")
+        return deleted
+
+    @staticmethod
+    def history():
+        return Database.execute('SELECT * FROM Import_History ORDER BY import_id DESC', fetch=True)
+
+
+def main(argv):
+    """命令列：python importer.py <檔案.csv|檔案.xlsx> 或 python importer.py --rollback <import_id>"""
+    if len(argv) < 2:
+        print(main.__doc__)
+        return 2
+    Database.initialize_database()
+    try:
+        if argv[1] == '--rollback' and len(argv) > 2:
+            print(f"已刪除 {Importer.rollback(int(argv[2]))} 筆療程記錄")
+            return 0
+        result = Importer(argv[1], progress=lambda done, skipped: print(f"\r已匯入 {done} 筆", end='')).run()
+        print(f"\n{result}")
+        return 0 if result['status'] == 'completed' else 1
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,129 @@
+from database import Database
+
+# 支出列表可用的排序方式：排序欄位（再以 expense_id 作為最後的唯一鍵）
+EXPENSE_SORTS = {
+    'date': ('expense_date',),
+    'category': ('category', 'expense_date'),
+    'amount': ('amount',),
+}
+
+
+class Ledger:
+    """每日收支帳：由 Daily_Summary 彙總表直接讀取，每日一列，不必再掃描原始記錄"""
+
+    @staticmethod
+    def daily(start_date=None, end_date=None):
+        """
+        返回每日收入、支出與淨收入（依日期遞增）。
+        start_date 含、end_date 不含，格式為 YYYY-MM-DD；省略則不限。
+        """
+        conditions, params = [], []
+        if start_date:
+            conditions.append('day >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('day < ?')
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return Database.execute(f'''
+            SELECT day, income, expense, income - expense as net_income, visit_count, expense_count
+            FROM Daily_Summary
+            {where}
+            ORDER BY day
+        ''', tuple(params), fetch=True)
+
+    @staticmethod
+    def net_income_for_day(day):
+        """返回指定日期的淨收入；當日無任何記錄時返回 None"""
+        rows = Database.execute('SELECT income - expense as net_income FROM Daily_Summary WHERE day = ?', (day,), fetch=True)
+        return rows[0]['net_income'] if rows else None
+
+    # 支出列表與當日淨收入：每筆支出以主鍵查一次 Daily_Summary，整體為線性
+    EXPENSES_WITH_NET_INCOME = '''
+        SELECT e.expense_id, e.expense_date, e.category, e.amount, e.description,
+               d.income - d.expense as net_income
+        FROM Expenses e
+        LEFT JOIN Daily_Summary d ON d.day = substr(e.expense_date, 1, 10)
+        ORDER BY e.expense_date DESC, e.expense_id DESC
+    '''
+
+    @staticmethod
+    def expenses_with_net_income():
+        """返回所有支出及其所屬日期的淨收入（依日期遞減）"""
+        return Database.execute(Ledger.EXPENSES_WITH_NET_INCOME, fetch=True)
+
+    @staticmethod
+    def expenses_by_ids_query(expense_ids):
+        """依 expense_id 取得支出及其所屬日期淨收入的查詢，返回 (query, params)"""
+        expense_ids = tuple(expense_ids)
+        return f'''
+            SELECT e.expense_id, e.expense_date, e.category, e.amount, e.description,
+                   d.income - d.expense as net_income
+            FROM Expenses e
+            LEFT JOIN Daily_Summary d ON d.day = substr(e.expense_date, 1, 10)
+            WHERE e.expense_id IN ({','.join('?' * len(expense_ids))})
+        ''', expense_ids
+
+    @staticmethod
+    def expenses_by_ids(expense_ids):
+        """依 expense_id 取得支出（不存在的 id 不會出現在結果中）"""
+        expense_ids = list(expense_ids)
+        return Database.execute(*Ledger.expenses_by_ids_query(expense_ids), fetch=True) if expense_ids else []
+
+    @staticmethod
+    def net_income_for_days_query(days):
+        days = tuple(days)
+        return f'''
+            SELECT day, income - expense as net_income FROM Daily_Summary WHERE day IN ({','.join('?' * len(days))})
+        ''', days
+
+    @staticmethod
+    def net_income_for_days(days):
+        """返回 {日期: 淨收入}；沒有任何記錄的日期不會出現在結果中"""
+        days = list(days)
+        if not days:
+            return {}
+        return {row['day']: row['net_income'] for row in Database.execute(*Ledger.net_income_for_days_query(days), fetch=True)}
+
+    @staticmethod
+    def expense_page_query(sort='date', descending=True, after=None, before=None, category=None, limit=200):
+        """
+        產生支出列表的 keyset 分頁查詢，返回 (query, params)。
+        after／before 為上一頁最後一列或下一頁第一列的排序鍵（見 expense_key），皆省略時為第一頁。
+        before 時查詢方向相反，呼叫端須將結果反轉。
+        """
+        columns = [f'e.{c}' for c in EXPENSE_SORTS[sort]] + ['e.expense_id']
+        backward = before is not None
+        ascending = descending == backward
+        conditions, params = [], []
+        if category:
+            conditions.append('e.category = ?')
+            params.append(category)
+        key = before if backward else after
+        if key is not None:
+            conditions.append(f"({', '.join(columns)}) {'>' if ascending else '<'} ({', '.join('?' * len(columns))})")
+            params.extend(key)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        order = ', '.join(f"{c} {'ASC' if ascending else 'DESC'}" for c in columns)
+        query = f'''
+            SELECT e.expense_id, e.expense_date, e.category, e.amount, e.description,
+                   d.income - d.expense as net_income
+            FROM Expenses e
+            LEFT JOIN Daily_Summary d ON d.day = substr(e.expense_date, 1, 10)
+            {where}
+            ORDER BY {order}
+            LIMIT ?
+        '''
+        return query, (*params, limit)
+
+    @staticmethod
+    def expense_key(row, sort='date'):
+        """返回支出列在指定排序下的 keyset 鍵"""
+        return tuple(row[c] for c in EXPENSE_SORTS[sort]) + (row['expense_id'],)
+
+    @staticmethod
+    def expense_page(sort='date', descending=True, after=None, before=None, category=None, limit=200):
+        """返回一頁支出（依顯示順序）"""
+        query, params = Ledger.expense_page_query(sort, descending, after, before, category, limit)
+        rows = Database.execute(query, params, fetch=True)
+        return rows[::-1] if before is not None else rows
@@ -1,17 +1,21 @@
+from startup_timing import StartupTimer  # 最先匯入，啟動計時由此開始
 from tkinter import Tk, messagebox
 from ui import Application
-from database import Database
+from database import ConnectionManager, DatabaseExecutor
+from task_scheduler import TaskScheduler
 from constants import logging
 
 def main():
+    StartupTimer.mark('imports')
     try:
-        # 初始化資料庫
-        Database.initialize_database()  # 修正方法名稱
-        
-        # 啟動應用程式
+        # 啟動應用程式（資料庫遷移由 Application 執行）
         root = Tk()
+        StartupTimer.watch_first_window(root)
         app = Application(root)
         root.mainloop()
+        TaskScheduler.shutdown()
+        DatabaseExecutor.shutdown()
+        ConnectionManager.close_all()
     except Exception as e:
         logging.error(f"應用程式啟動失敗: {str(e)}")
         messagebox.showerror("錯誤", f"應用程式啟動失敗：{str(e)}")
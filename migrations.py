@@ -0,0 +1,207 @@
+import sys
+from database import ConnectionManager
+from aggregates import Aggregates
+from package_balances import PackageBalances
+from constants import DEFAULT_TREATMENTS, logging
+
+# 資料庫結構版本記錄於 PRAGMA user_version。
+# 每個遷移只執行一次，並與版本號更新在同一個交易中提交；已是最新版本時啟動只需一次版本查詢。
+# 新增資料表、欄位、索引、預設資料或資料修正時，請在 MIGRATIONS 末端加入新的遷移，不要修改已發佈的遷移。
+
+
+def _add_missing_columns(cursor, table, columns):
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {col[1] for col in cursor.fetchall()}
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+
+def _baseline(cursor):
+    """基礎資料表、索引及預設療程；舊版資料庫（user_version = 0）可能已有部分結構，因此全部可重複執行"""
+    for script in [
+        '''CREATE TABLE IF NOT EXISTS Customers (
+            customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            contact_method TEXT,
+            unique_mark TEXT DEFAULT ''
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Treatments (
+            treatment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            peak_price REAL NOT NULL,
+            non_peak_price REAL NOT NULL,
+            is_combo INTEGER NOT NULL DEFAULT 0 CHECK(is_combo IN (0, 1)),
+            can_add_neck BOOLEAN DEFAULT 0,
+            has_remaining_sessions BOOLEAN DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Customer_Treatments (
+            customer_treatment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER,
+            treatment_id INTEGER,
+            treatment_date TEXT NOT NULL,
+            is_peak INTEGER CHECK(is_peak IN (0, 1)),
+            neck_treatment INTEGER DEFAULT 0 CHECK(neck_treatment IN (0, 1)),
+            package_id INTEGER,
+            remaining_sessions INTEGER DEFAULT 0,
+            price REAL DEFAULT 0,
+            retouch_parent_id INTEGER,
+            remaining_retouch_count INTEGER DEFAULT 1,
+            import_id INTEGER DEFAULT NULL,
+            FOREIGN KEY(customer_id) REFERENCES Customers(customer_id),
+            FOREIGN KEY(treatment_id) REFERENCES Treatments(treatment_id),
+            FOREIGN KEY(retouch_parent_id) REFERENCES Customer_Treatments(customer_treatment_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Expenses (
+            expense_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            expense_date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS Import_History (
+            import_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            import_date TEXT,
+            record_count INTEGER,
+            status TEXT
+        )'''
+    ]:
+        cursor.execute(script)
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_name ON Customers(name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_treatment_date ON Customer_Treatments(treatment_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_id ON Customer_Treatments(customer_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_date ON Expenses(expense_date)')
+
+    _add_missing_columns(cursor, 'Treatments', [
+        ('can_add_neck', 'BOOLEAN DEFAULT 0'),
+        ('has_remaining_sessions', 'BOOLEAN DEFAULT 0'),
+    ])
+    _add_missing_columns(cursor, 'Customer_Treatments', [
+        ('retouch_parent_id', 'INTEGER'),
+        ('remaining_retouch_count', 'INTEGER DEFAULT 1'),
+        ('import_id', 'INTEGER DEFAULT NULL'),
+    ])
+
+    treatments_data = [(name, details["peak_price"], details["non_peak_price"], details["is_combo"])
+                       for name, details in DEFAULT_TREATMENTS.items()]
+    treatments_data.append(('補脫療程', 0, 0, 0))
+    cursor.executemany('INSERT OR IGNORE INTO Treatments (name, peak_price, non_peak_price, is_combo) VALUES (?, ?, ?, ?)', treatments_data)
+
+
+def _rename_whatsapp(cursor):
+    cursor.execute('UPDATE Customers SET contact_method = ? WHERE contact_method = ?', ('WhatsApp', 'Whatsapp'))
+
+
+def _backfill_retouch(cursor):
+    """舊資料中金額為 0 的單次脫墨/疣即為補脫，改用補脫療程；已有補脫記錄的資料庫表示已轉換過，略過"""
+    cursor.execute('''
+        UPDATE Customer_Treatments
+        SET treatment_id = (SELECT treatment_id FROM Treatments WHERE name = '補脫療程'),
+            remaining_retouch_count = 0
+        WHERE price = 0 AND treatment_id = (SELECT treatment_id FROM Treatments WHERE name = '熱能氣化 - 單次脫墨/疣')
+        AND NOT EXISTS (
+            SELECT 1 FROM Customer_Treatments r
+            WHERE r.treatment_id = (SELECT treatment_id FROM Treatments WHERE name = '補脫療程')
+        )
+    ''')
+
+
+def _treatment_flags(cursor):
+    cursor.execute('UPDATE Treatments SET can_add_neck = 1 WHERE name = ?', ('Einxel Plus膠原修復針',))
+    cursor.execute('UPDATE Treatments SET has_remaining_sessions = 1 WHERE name = ?', ('組合療程：Einxel Plus膠原修復針 6次包套',))
+
+
+def _query_indexes(cursor):
+    """補脫查詢、支出分頁排序及匯入撤銷所需的索引，以及客戶的匯入來源欄位"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_retouch_parent ON Customer_Treatments(retouch_parent_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_amount ON Expenses(amount)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_expense_category_date ON Expenses(category, expense_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ct_import ON Customer_Treatments(import_id)')
+    _add_missing_columns(cursor, 'Customers', [('import_id', 'INTEGER DEFAULT NULL')])
+
+
+def _package_balances(cursor):
+    """套裝餘額表；(customer_id, treatment_id, treatment_date) 複合索引取代只有 customer_id 的索引"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ct_customer_treatment_date ON Customer_Treatments(customer_id, treatment_id, treatment_date)')
+    cursor.execute('DROP INDEX IF EXISTS idx_customer_id')
+    PackageBalances.install(cursor)
+
+
+def _snapshot_control(cursor):
+    from snapshot import TreatmentSnapshot  # snapshot 需要 numpy，只在執行此遷移時才匯入
+    TreatmentSnapshot.install(cursor)
+
+
+def _change_log(cursor):
+    """分店同步的變更記錄；快照觸發器改為只在快照欄位更新時計數（補上 sync_uid 不必重建快照）"""
+    from snapshot import TreatmentSnapshot
+    from sync import Sync
+    TreatmentSnapshot.install(cursor)
+    Sync.install(cursor)
+
+
+# (版本, 說明, 遷移函式)；版本號須連續遞增
+MIGRATIONS = (
+    (1, '基礎資料表及預設療程', _baseline),
+    (2, '聯絡方式 Whatsapp 統一為 WhatsApp', _rename_whatsapp),
+    (3, '金額為 0 的單次脫墨/疣轉為補脫療程', _backfill_retouch),
+    (4, '設定可加頸部及剩餘次數療程', _treatment_flags),
+    (5, '查詢索引及客戶匯入欄位', _query_indexes),
+    (6, '彙總表及維護觸發器', Aggregates.install),
+    (7, '套裝療程餘額表及客戶療程複合索引', _package_balances),
+    (8, '療程快照修改計數及觸發器', _snapshot_control),
+    (9, '分店同步變更記錄及觸發器', _change_log),
+)
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+class Migrations:
+    @staticmethod
+    def version(conn=None):
+        conn = conn or ConnectionManager.get_connection()
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    @staticmethod
+    def pending(conn=None):
+        current = Migrations.version(conn)
+        return [m for m in MIGRATIONS if m[0] > current]
+
+    @staticmethod
+    def migrate(conn=None):
+        """執行尚未套用的遷移，每個遷移各自一個交易；返回遷移後的版本"""
+        conn = conn or ConnectionManager.get_connection()
+        current = Migrations.version(conn)
+        if current > LATEST_VERSION:
+            logging.warning(f"資料庫版本 {current} 比程式支援的版本 {LATEST_VERSION} 新")
+            return current
+        for version, description, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                apply(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+            except BaseException as e:
+                conn.rollback()
+                logging.error(f"資料庫遷移至版本 {version} 失敗（{description}）：{str(e)}")
+                raise
+            logging.info(f"資料庫已遷移至版本 {version}：{description}")
+            current = version
+        return current
+
+
+def main(argv):
+    """命令列：python migrations.py [status]，不帶參數時執行所有待套用的遷移"""
+    if len(argv) > 1 and argv[1] == 'status':
+        print(f"目前版本 {Migrations.version()}，最新版本 {LATEST_VERSION}")
+        for version, description, _ in Migrations.pending():
+            print(f"待套用 {version}：{description}")
+        return 0
+    print(f"資料庫版本：{Migrations.migrate()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
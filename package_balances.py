@@ -0,0 +1,201 @@
+import sys
+from database import Database, DatabaseExecutor
+from constants import logging
+
+# 套裝療程餘額：每位客戶每個套裝一列，由觸發器在療程記錄寫入時於同一交易中維護。
+# 只追蹤 Treatments.has_remaining_sessions = 1 的療程；未指定 package_id 的記錄視為 package_id 0。
+PACKAGE_BALANCES_TABLE = '''CREATE TABLE IF NOT EXISTS Package_Balances (
+    customer_id INTEGER NOT NULL,
+    treatment_id INTEGER NOT NULL,
+    package_id INTEGER NOT NULL,
+    remaining_sessions INTEGER NOT NULL DEFAULT 0,
+    session_count INTEGER NOT NULL DEFAULT 0,
+    last_date TEXT NOT NULL,
+    last_treatment_id INTEGER NOT NULL,
+    PRIMARY KEY (customer_id, treatment_id, package_id)
+) WITHOUT ROWID'''
+
+# 未用完套裝報表只走訪此部分索引
+OPEN_PACKAGES_INDEX = '''CREATE INDEX IF NOT EXISTS idx_open_packages
+    ON Package_Balances(last_date) WHERE remaining_sessions > 0'''
+
+_IS_PACKAGE = 'EXISTS (SELECT 1 FROM Treatments WHERE treatment_id = {row}.treatment_id AND has_remaining_sessions = 1)'
+
+
+def _recompute(row):
+    """以 idx_ct_customer_treatment_date 重新計算 {row} 所屬套裝的餘額（最新一筆記錄的剩餘次數）"""
+    return f'''
+        DELETE FROM Package_Balances
+        WHERE customer_id = {row}.customer_id AND treatment_id = {row}.treatment_id AND package_id = IFNULL({row}.package_id, 0);
+        INSERT INTO Package_Balances (customer_id, treatment_id, package_id, remaining_sessions, session_count, last_date, last_treatment_id)
+        SELECT customer_id, treatment_id, IFNULL(package_id, 0), IFNULL(remaining_sessions, 0),
+               (SELECT COUNT(*) FROM Customer_Treatments c
+                WHERE c.customer_id = {row}.customer_id AND c.treatment_id = {row}.treatment_id
+                AND IFNULL(c.package_id, 0) = IFNULL({row}.package_id, 0)),
+               treatment_date, customer_treatment_id
+        FROM Customer_Treatments
+        WHERE customer_id = {row}.customer_id AND treatment_id = {row}.treatment_id
+        AND IFNULL(package_id, 0) = IFNULL({row}.package_id, 0)
+        AND {_IS_PACKAGE.format(row=row)}
+        ORDER BY treatment_date DESC, customer_treatment_id DESC
+        LIMIT 1;
+    '''
+
+
+PACKAGE_TRIGGERS = {
+    'trg_package_balance_insert': f'''
+        CREATE TRIGGER trg_package_balance_insert AFTER INSERT ON Customer_Treatments
+        WHEN {_IS_PACKAGE.format(row='NEW')}
+        BEGIN
+            INSERT INTO Package_Balances (customer_id, treatment_id, package_id, remaining_sessions, session_count, last_date, last_treatment_id)
+            VALUES (NEW.customer_id, NEW.treatment_id, IFNULL(NEW.package_id, 0), IFNULL(NEW.remaining_sessions, 0), 1,
+                    NEW.treatment_date, NEW.customer_treatment_id)
+            ON CONFLICT (customer_id, treatment_id, package_id) DO UPDATE SET
+                session_count = session_count + 1,
+                remaining_sessions = CASE WHEN (excluded.last_date, excluded.last_treatment_id) > (last_date, last_treatment_id)
+                                          THEN excluded.remaining_sessions ELSE remaining_sessions END,
+                last_treatment_id = CASE WHEN (excluded.last_date, excluded.last_treatment_id) > (last_date, last_treatment_id)
+                                         THEN excluded.last_treatment_id ELSE last_treatment_id END,
+                last_date = MAX(last_date, excluded.last_date);
+        END''',
+    'trg_package_balance_delete': f'''
+        CREATE TRIGGER trg_package_balance_delete AFTER DELETE ON Customer_Treatments
+        WHEN {_IS_PACKAGE.format(row='OLD')}
+        BEGIN
+            {_recompute('OLD')}
+        END''',
+    'trg_package_balance_update': f'''
+        CREATE TRIGGER trg_package_balance_update
+        AFTER UPDATE OF customer_id, treatment_id, package_id, remaining_sessions, treatment_date ON Customer_Treatments
+        WHEN {_IS_PACKAGE.format(row='OLD')} OR {_IS_PACKAGE.format(row='NEW')}
+        BEGIN
+            {_recompute('OLD')}
+            {_recompute('NEW')}
+        END''',
+    # 療程改為（或不再是）套裝時，重建該療程的所有餘額
+    'trg_package_flag_update': '''
+        CREATE TRIGGER trg_package_flag_update AFTER UPDATE OF has_remaining_sessions ON Treatments
+        WHEN IFNULL(OLD.has_remaining_sessions, 0) != IFNULL(NEW.has_remaining_sessions, 0)
+        BEGIN
+            DELETE FROM Package_Balances WHERE treatment_id = NEW.treatment_id;
+            INSERT INTO Package_Balances (customer_id, treatment_id, package_id, remaining_sessions, session_count, last_date, last_treatment_id)
+            SELECT customer_id, treatment_id, package_id, remaining_sessions, session_count, last_date, last_treatment_id
+            FROM (
+                SELECT customer_id, treatment_id, IFNULL(package_id, 0) as package_id, IFNULL(remaining_sessions, 0) as remaining_sessions,
+                       COUNT(*) OVER (PARTITION BY customer_id, IFNULL(package_id, 0)) as session_count,
+                       treatment_date as last_date, customer_treatment_id as last_treatment_id,
+                       ROW_NUMBER() OVER (PARTITION BY customer_id, IFNULL(package_id, 0)
+                                          ORDER BY treatment_date DESC, customer_treatment_id DESC) as rank
+                FROM Customer_Treatments
+                WHERE treatment_id = NEW.treatment_id
+            )
+            WHERE rank = 1 AND NEW.has_remaining_sessions = 1;
+        END''',
+}
+
+REBUILD_QUERY = '''
+    SELECT customer_id, treatment_id, package_id, remaining_sessions, session_count, last_date, last_treatment_id
+    FROM (
+        SELECT ct.customer_id, ct.treatment_id, IFNULL(ct.package_id, 0) as package_id,
+               IFNULL(ct.remaining_sessions, 0) as remaining_sessions,
+               COUNT(*) OVER (PARTITION BY ct.customer_id, ct.treatment_id, IFNULL(ct.package_id, 0)) as session_count,
+               ct.treatment_date as last_date, ct.customer_treatment_id as last_treatment_id,
+               ROW_NUMBER() OVER (PARTITION BY ct.customer_id, ct.treatment_id, IFNULL(ct.package_id, 0)
+                                  ORDER BY ct.treatment_date DESC, ct.customer_treatment_id DESC) as rank
+        FROM Customer_Treatments ct
+        JOIN Treatments t ON t.treatment_id = ct.treatment_id
+        WHERE t.has_remaining_sessions = 1
+    )
+    WHERE rank = 1
+'''
+
+OPEN_PACKAGES = '''
+    SELECT b.customer_id, c.name, c.contact_method, t.name as treatment_name, b.package_id,
+           b.remaining_sessions, b.session_count, b.last_date
+    FROM Package_Balances b
+    JOIN Customers c ON c.customer_id = b.customer_id
+    JOIN Treatments t ON t.treatment_id = b.treatment_id
+    WHERE b.remaining_sessions > 0
+    ORDER BY b.last_date
+'''
+
+
+class PackageBalances:
+    @staticmethod
+    def install(cursor):
+        """建立餘額表、索引及觸發器，並由現有記錄回填"""
+        cursor.execute(PACKAGE_BALANCES_TABLE)
+        cursor.execute(OPEN_PACKAGES_INDEX)
+        for name, script in PACKAGE_TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(script)
+        PackageBalances._rebuild_with(cursor)
+
+    @staticmethod
+    def _rebuild_with(cursor):
+        cursor.execute('DELETE FROM Package_Balances')
+        cursor.execute(f'INSERT INTO Package_Balances {REBUILD_QUERY}')
+
+    @staticmethod
+    def rebuild():
+        DatabaseExecutor.submit_transaction(PackageBalances._rebuild_with, ('Package_Balances',)).result()
+        logging.info("套裝餘額重建完成")
+
+    @staticmethod
+    def balance(customer_id, treatment_id, package_id=None):
+        """以主鍵查詢單一套裝的餘額；沒有記錄時返回 None"""
+        rows = Database.execute('''
+            SELECT package_id, remaining_sessions, session_count, last_date FROM Package_Balances
+            WHERE customer_id = ? AND treatment_id = ? AND package_id = ?
+        ''', (customer_id, treatment_id, package_id or 0), fetch=True)
+        return rows[0] if rows else None
+
+    @staticmethod
+    def latest(customer_id, treatment_id):
+        """客戶此套裝療程最近使用的套裝餘額；沒有記錄時返回 None"""
+        rows = Database.execute('''
+            SELECT package_id, remaining_sessions, session_count, last_date FROM Package_Balances
+            WHERE customer_id = ? AND treatment_id = ?
+            ORDER BY last_date DESC, last_treatment_id DESC LIMIT 1
+        ''', (customer_id, treatment_id), fetch=True)
+        return rows[0] if rows else None
+
+    @staticmethod
+    def open_packages():
+        """所有尚有剩餘次數的套裝（依最後使用日期）"""
+        return Database.execute(OPEN_PACKAGES, fetch=True)
+
+    @staticmethod
+    def verify():
+        """比對餘額表與原始記錄，返回不一致的鍵列表"""
+        expected = {tuple(row.values()) for row in Database.execute(REBUILD_QUERY, fetch=True)}
+        actual = {tuple(row.values()) for row in Database.execute(
+            'SELECT customer_id, treatment_id, package_id, remaining_sessions, session_count, last_date, last_treatment_id FROM Package_Balances',
+            fetch=True)}
+        return sorted(row[:3] for row in expected ^ actual)
+
+
+def main(argv):
+    """命令列：python package_balances.py [open|rebuild|verify]"""
+    command = argv[1] if len(argv) > 1 else 'open'
+    Database.initialize_database()
+    try:
+        if command == 'rebuild':
+            PackageBalances.rebuild()
+            print("套裝餘額重建完成")
+            return 0
+        if command == 'verify':
+            problems = PackageBalances.verify()
+            print("套裝餘額一致" if not problems else f"{len(problems)} 個套裝不一致：{problems}")
+            return 0 if not problems else 1
+        rows = PackageBalances.open_packages()
+        for row in rows:
+            print(f"{row['last_date']}\t{row['name']}\t{row['contact_method'] or ''}\t{row['treatment_name']}\t剩餘 {row['remaining_sessions']} 次")
+        print(f"共 {len(rows)} 個未用完的套裝")
+        return 0
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,121 @@
+from database import DatabaseExecutor
+from constants import logging
+
+
+class PagedTreeview:
+    """
+    Treeview 的分頁（keyset）載入：只保留可視範圍附近最多 max_pages 頁，
+    捲動接近底部時載入下一頁並移除最上方的舊頁，捲回頂部時再向前載入。
+    排序與篩選都由 fetch_page 的 SQL 處理。
+    """
+
+    def __init__(self, master, tree, scrollbar, fetch_page, row_to_item, page_size=200, max_pages=3, on_loaded=None):
+        self.master = master
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page  # fetch_page(after_key, before_key, limit) -> Future（結果依顯示順序）
+        self.row_to_item = row_to_item  # row_to_item(row) -> (iid, values, key)
+        self.page_size = page_size
+        self.max_rows = page_size * max_pages
+        self.on_loaded = on_loaded  # 每次重新載入的第一頁完成後呼叫 on_loaded(rows)
+        self.descending = False  # 排序鍵的顯示順序，供 place() 決定插入位置
+        self.keys = []
+        self.at_start = True
+        self.at_end = True
+        self.loading = False
+        self.generation = 0
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    def reset(self):
+        """清除並從第一頁重新載入（排序或篩選條件改變時呼叫）"""
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.keys = []
+        self.at_start, self.at_end = True, False
+        self.loading = False
+        self._load(forward=True)
+
+    def remove(self, iid):
+        """移除已載入的單列（不存在時略過）"""
+        if self.tree.exists(iid):
+            del self.keys[self.tree.index(iid)]
+            self.tree.delete(iid)
+
+    def place(self, row):
+        """
+        新增或更新單列並放到排序位置；位置落在目前已載入範圍之外時只移除舊列，
+        待捲動載入該頁時再顯示。返回是否已顯示。
+        """
+        iid, values, key = self.row_to_item(row)
+        self.remove(iid)
+        low, high = 0, len(self.keys)
+        while low < high:
+            middle = (low + high) // 2
+            if (self.keys[middle] > key) if self.descending else (self.keys[middle] < key):
+                low = middle + 1
+            else:
+                high = middle
+        if (low == 0 and not self.at_start) or (low == len(self.keys) and not self.at_end):
+            return False
+        self.tree.insert("", low, iid=iid, values=values)
+        self.keys.insert(low, key)
+        return True
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.loading:
+            return
+        if float(last) >= 0.9 and not self.at_end:
+            self._load(forward=True)
+        elif float(first) <= 0.1 and not self.at_start:
+            self._load(forward=False)
+
+    def _load(self, forward):
+        self.loading = True
+        generation = self.generation
+        if forward:
+            future = self.fetch_page(self.keys[-1] if self.keys else None, None, self.page_size)
+        else:
+            future = self.fetch_page(None, self.keys[0], self.page_size)
+        DatabaseExecutor.deliver(self.master, future, lambda rows: self._apply(generation, forward, rows),
+                                 lambda e: self._failed(generation, e))
+
+    def _failed(self, generation, error):
+        if generation == self.generation:
+            self.loading = False
+        logging.error(f"分頁載入失敗：{str(error)}")
+
+    def _apply(self, generation, forward, rows):
+        if generation != self.generation:
+            return  # 已重新載入，丟棄過期結果
+        self.loading = False
+        first_page = not self.keys
+        items = [self.row_to_item(row) for row in rows]
+        if forward:
+            for iid, values, key in items:
+                if self.tree.exists(iid):
+                    continue
+                self.tree.insert("", "end", iid=iid, values=values)
+                self.keys.append(key)
+            self.at_end = len(rows) < self.page_size
+            excess = len(self.keys) - self.max_rows
+            if excess > 0:
+                self.tree.delete(*self.tree.get_children()[:excess])
+                del self.keys[:excess]
+                self.tree.yview_scroll(-excess, 'units')  # 保持目前看到的列不動
+                self.at_start = False
+        else:
+            for iid, values, key in reversed(items):
+                if self.tree.exists(iid):
+                    continue
+                self.tree.insert("", 0, iid=iid, values=values)
+                self.keys.insert(0, key)
+            self.tree.yview_scroll(len(items), 'units')
+            self.at_start = len(rows) < self.page_size
+            excess = len(self.keys) - self.max_rows
+            if excess > 0:
+                self.tree.delete(*self.tree.get_children()[-excess:])
+                del self.keys[-excess:]
+                self.at_end = False
+        if first_page and forward and self.on_loaded:
+            self.on_loaded(rows)
@@ -0,0 +1,130 @@
+import json
+import logging as _logging
+import re
+import threading
+from collections import deque
+from constants import logging
+
+SLOW_QUERY_LOG = 'slow_queries.log'
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryStats:
+    """
+    依查詢指紋（常數及 IN 清單正規化後的 SQL）累計次數、總耗時、p50／p95／最大耗時及返回筆數。
+    超過 slow_threshold_ms 的查詢寫入 SLOW_QUERY_LOG，每個指紋附一次 EXPLAIN QUERY PLAN。
+    """
+    slow_threshold_ms = 200
+    sample_size = 500  # 每個指紋保留最近的耗時樣本數，用於計算百分位數
+    enabled = True
+
+    _lock = threading.Lock()
+    _stats = {}
+    _fingerprints = {}  # 原始 SQL -> 指紋，避免每次重新正規化
+    _slow_logger = None
+
+    @classmethod
+    def fingerprint(cls, query):
+        cached = cls._fingerprints.get(query)
+        if cached is not None:
+            return cached
+        text = _STRING_LITERAL.sub('?', query)
+        text = _NUMBER_LITERAL.sub('?', text)
+        text = _PLACEHOLDER_LIST.sub('(...)', text)
+        text = _WHITESPACE.sub(' ', text).strip()
+        if len(cls._fingerprints) < 10000:
+            cls._fingerprints[query] = text
+        return text
+
+    @classmethod
+    def record(cls, query, elapsed_ms, rows, conn=None, params=()):
+        """記錄一次查詢；慢查詢時寫入慢查詢日誌（conn 用於取得查詢計畫）"""
+        if not cls.enabled:
+            return
+        fingerprint = cls.fingerprint(query)
+        with cls._lock:
+            entry = cls._stats.get(fingerprint)
+            if entry is None:
+                entry = cls._stats[fingerprint] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'slow': 0,
+                                                   'samples': deque(maxlen=cls.sample_size), 'plan': None}
+            entry['count'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['rows'] += max(rows, 0)
+            entry['samples'].append(elapsed_ms)
+            slow = elapsed_ms >= cls.slow_threshold_ms
+            if slow:
+                entry['slow'] += 1
+                need_plan = entry['plan'] is None
+        if slow:
+            plan = cls._explain(conn, query, params) if need_plan else None
+            if plan is not None:
+                with cls._lock:
+                    entry['plan'] = plan
+            cls._log_slow(fingerprint, elapsed_ms, rows, plan)
+
+    @staticmethod
+    def _explain(conn, query, params):
+        if conn is None or not query.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return None
+        try:
+            return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()]
+        except Exception as e:
+            return [f'無法取得查詢計畫：{str(e)}']
+
+    @classmethod
+    def _log_slow(cls, fingerprint, elapsed_ms, rows, plan):
+        if cls._slow_logger is None:
+            logger = _logging.getLogger('slow_queries')
+            handler = _logging.FileHandler(SLOW_QUERY_LOG, encoding='utf-8')
+            handler.setFormatter(_logging.Formatter('%(asctime)s - %(message)s'))
+            logger.addHandler(handler)
+            logger.propagate = False
+            cls._slow_logger = logger
+        message = f"{elapsed_ms:.1f}ms，{rows} 筆：{fingerprint}"
+        if plan:
+            message += '\n    ' + '\n    '.join(plan)
+        cls._slow_logger.warning(message)
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+    @classmethod
+    def snapshot(cls):
+        """返回各指紋的統計（依總耗時由大到小排序）"""
+        with cls._lock:
+            items = [(fingerprint, dict(entry, samples=sorted(entry['samples']))) for fingerprint, entry in cls._stats.items()]
+        result = []
+        for fingerprint, entry in items:
+            samples = entry.pop('samples')
+            result.append({
+                'query': fingerprint,
+                'count': entry['count'],
+                'total_ms': round(entry['total_ms'], 3),
+                'p50_ms': round(cls._percentile(samples, 0.5), 3),
+                'p95_ms': round(cls._percentile(samples, 0.95), 3),
+                'max_ms': round(entry['max_ms'], 3),
+                'rows': entry['rows'],
+                'slow': entry['slow'],
+                'plan': entry['plan'],
+            })
+        result.sort(key=lambda item: item['total_ms'], reverse=True)
+        return result
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._stats = {}
+        logging.info("查詢統計已重設")
+
+    @classmethod
+    def dump(cls, path):
+        """將目前統計寫入 JSON 檔"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(cls.snapshot(), f, ensure_ascii=False, indent=2)
+        logging.info(f"查詢統計已匯出至 {path}")
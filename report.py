@@ -0,0 +1,36 @@
+import argparse
+import sys
+from database import Database, ConnectionManager, DatabaseExecutor
+from report_engine import ReportEngine
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='不開啟 GUI 批次產生多月份報表（損益、客戶排行、療程分布、支出分類）')
+    parser.add_argument('first_month', nargs='?', help='起始月份 YYYY-MM')
+    parser.add_argument('last_month', nargs='?', help='結束月份 YYYY-MM（含），預設同起始月份')
+    parser.add_argument('--year', help='整年報表，例如 2024（取代起始／結束月份）')
+    parser.add_argument('-o', '--output', required=True, help='輸出檔：.xlsx、.json 或 .csv（每個區段一個 CSV）')
+    parser.add_argument('--workers', type=int, help='工作程序數，預設為 CPU 核心數')
+    parser.add_argument('--db', help='資料庫檔案，預設為 DB_NAME')
+    args = parser.parse_args(argv[1:])
+    if args.year:
+        first, last = f'{args.year}-01', f'{args.year}-12'
+    elif args.first_month:
+        first, last = args.first_month, args.last_month or args.first_month
+    else:
+        parser.error('請指定起始月份或 --year')
+
+    if args.db:
+        ConnectionManager.configure(args.db)
+    Database.initialize_database()  # 確保彙總表已建立
+    DatabaseExecutor.shutdown()
+    result = ReportEngine(ConnectionManager.db_path, first, last, args.workers).run()
+    for path in ReportEngine.write(result, args.output):
+        print(f"已輸出 {path}")
+    totals = result['totals']
+    print(f"{first} 至 {last}：收入 ${round(totals['income'])}，支出 ${round(totals['expense'])}，淨收入 ${round(totals['net_income'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
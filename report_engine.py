@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from report_queries import ReportQueries
+from date_ranges import DateRange
+from constants import logging
+
+# 各報表區段：(工作表名稱, 欄位, 標題)
+SECTIONS = {
+    'pl': ('損益', ('month', 'income', 'expense', 'net_income', 'visit_count', 'expense_count'),
+           ('月份', '收入', '支出', '淨收入', '療程次數', '支出筆數')),
+    'top_customers': ('客戶排行', ('month', 'rank', 'name', 'contact_method', 'count', 'total'),
+                      ('月份', '排名', '姓名', '聯絡方式', '消費次數', '總金額')),
+    'treatment_mix': ('療程分布', ('month', 'name', 'count'), ('月份', '療程', '次數')),
+    'expense_breakdown': ('支出分類', ('month', 'category', 'count', 'total'), ('月份', '類別', '筆數', '金額')),
+}
+
+_worker_conn = None  # 工作程序內的唯讀連線
+
+
+def _open_readonly(db_path):
+    conn = sqlite3.connect(f'file:{os.path.abspath(db_path)}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_worker(db_path):
+    global _worker_conn
+    _worker_conn = _open_readonly(db_path)
+
+
+def _month_report(month, conn=None):
+    """計算單月報表；在工作程序中使用該程序的唯讀連線"""
+    conn = conn or _worker_conn
+
+    def query(sql, params):
+        return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    pl = query(ReportQueries.MONTHLY_PL, (month,))
+    return {
+        'month': month,
+        'pl': pl[0] if pl else {'month': month, 'income': 0, 'expense': 0, 'net_income': 0, 'visit_count': 0, 'expense_count': 0},
+        'top_customers': [dict(row, month=month, rank=i) for i, row in enumerate(query(ReportQueries.TOP_CUSTOMERS, (month,)), 1)],
+        'treatment_mix': [dict(row, month=month) for row in query(ReportQueries.TREATMENT_MIX, (month,))],
+        'expense_breakdown': [dict(row, month=month) for row in query(ReportQueries.EXPENSE_BREAKDOWN, DateRange.month(month))],
+    }
+
+
+class ReportEngine:
+    """
+    不需 GUI 的多月份報表：每月的損益、客戶排行、療程分布及支出分類。
+    月份數多時以程序池平行計算，每個工作程序各開一條唯讀連線；
+    每月查詢都只讀彙總表，月份少時程序啟動成本高於查詢本身，直接在本程序執行。
+    """
+    parallel_threshold = 12  # 月份數達此值才使用程序池
+
+    def __init__(self, db_path, first_month, last_month=None, workers=None):
+        self.db_path = db_path
+        self.months = DateRange.month_list(first_month, last_month or first_month)
+        self.workers = workers if workers is not None else min(os.cpu_count() or 1, len(self.months))
+
+    def run(self):
+        """返回 {'start', 'end', 'generated', 'months': [...], 'totals': {...}}"""
+        started = datetime.now()
+        if self.workers > 1 and len(self.months) >= self.parallel_threshold:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.db_path,)) as pool:
+                reports = list(pool.map(_month_report, self.months, chunksize=max(1, len(self.months) // (self.workers * 4))))
+        else:
+            conn = _open_readonly(self.db_path)
+            try:
+                reports = [_month_report(month, conn) for month in self.months]
+            finally:
+                conn.close()
+        totals = {key: sum(report['pl'][key] or 0 for report in reports)
+                  for key in ('income', 'expense', 'net_income', 'visit_count', 'expense_count')}
+        logging.info(f"產生 {self.months[0]} 至 {self.months[-1]} 共 {len(self.months)} 個月的報表，"
+                     f"耗時 {(datetime.now() - started).total_seconds():.2f} 秒")
+        return {'start': self.months[0], 'end': self.months[-1], 'generated': started.isoformat(timespec='seconds'),
+                'months': reports, 'totals': totals}
+
+    @staticmethod
+    def section_rows(result, section):
+        """將報表結果展開為指定區段的列（依 SECTIONS 的欄位順序）"""
+        _, columns, _ = SECTIONS[section]
+        rows = []
+        for report in result['months']:
+            items = [report['pl']] if section == 'pl' else report[section]
+            rows.extend(tuple(item.get(c) for c in columns) for item in items)
+        return rows
+
+    @staticmethod
+    def write(result, path):
+        """依副檔名輸出 JSON、xlsx（每區段一個工作表）或 CSV（每區段一個檔案）；返回寫出的檔案列表"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.json':
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            return [path]
+        if extension == '.xlsx':
+            from openpyxl import Workbook  # 只有輸出 xlsx 時才需要
+            workbook = Workbook(write_only=True)
+            for section, (title, _, headers) in SECTIONS.items():
+                sheet = workbook.create_sheet(title)
+                sheet.append(headers)
+                for row in ReportEngine.section_rows(result, section):
+                    sheet.append(row)
+            workbook.save(path)
+            return [path]
+        stem = os.path.splitext(path)[0]
+        paths = []
+        for section, (_, _, headers) in SECTIONS.items():
+            section_path = f'{stem}_{section}.csv'
+            with open(section_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f)
+                writer.writerow(headers)
+                writer.writerows(ReportEngine.section_rows(result, section))
+            paths.append(section_path)
+        return paths
@@ -0,0 +1,142 @@
+import re
+import sys
+from database import Database
+from aggregates import SUMMARY_TABLES
+from ledger import Ledger
+from package_balances import OPEN_PACKAGES
+from date_ranges import DateRange
+from constants import logging
+
+
+class ReportQueries:
+    """報表查詢集中於此；所有月份／期間篩選都使用半開日期區間或彙總表主鍵"""
+
+    MONTHLY_INCOME = '''
+        SELECT month, income as total_income
+        FROM Monthly_Summary
+        WHERE visit_count > 0
+        ORDER BY month
+    '''
+    MONTHLY_EXPENSE = '''
+        SELECT month, expense as total_expense
+        FROM Monthly_Summary
+        WHERE expense_count > 0
+        ORDER BY month
+    '''
+    TOP_CUSTOMERS = '''
+        SELECT c.name, c.contact_method, s.visit_count as count, s.income as total
+        FROM Monthly_Customer_Summary s JOIN Customers c ON c.customer_id = s.customer_id
+        WHERE s.month = ?
+        ORDER BY total DESC LIMIT 10
+    '''
+    TREATMENT_MIX = '''
+        SELECT t.name, s.visit_count as count
+        FROM Monthly_Treatment_Summary s JOIN Treatments t ON t.treatment_id = s.treatment_id
+        WHERE s.month = ?
+        ORDER BY count DESC
+    '''
+    MONTHLY_PL = '''
+        SELECT month, income, expense, income - expense as net_income, visit_count, expense_count
+        FROM Monthly_Summary
+        WHERE month = ?
+    '''
+    AVAILABLE_MONTHS = '''
+        SELECT month FROM Monthly_Summary
+        ORDER BY month DESC
+    '''
+    TREATMENTS_IN_RANGE = f'''
+        SELECT ct.customer_treatment_id, ct.treatment_date, c.name as customer_name, t.name as treatment_name,
+               ct.is_peak, ct.neck_treatment, ct.price
+        FROM Customer_Treatments ct
+        LEFT JOIN Customers c ON c.customer_id = ct.customer_id
+        LEFT JOIN Treatments t ON t.treatment_id = ct.treatment_id
+        WHERE {DateRange.condition('ct.treatment_date')}
+        ORDER BY ct.treatment_date
+    '''
+    EXPENSES_IN_RANGE = f'''
+        SELECT expense_id, expense_date, category, amount, description
+        FROM Expenses
+        WHERE {DateRange.condition('expense_date')}
+        ORDER BY expense_date
+    '''
+    EXPENSE_BREAKDOWN = f'''
+        SELECT category, COUNT(*) as count, SUM(amount) as total
+        FROM Expenses
+        WHERE {DateRange.condition('expense_date')}
+        GROUP BY category
+        ORDER BY total DESC
+    '''
+    DAILY_LEDGER = f'''
+        SELECT day, income, expense, income - expense as net_income
+        FROM Daily_Summary
+        WHERE {DateRange.condition('day')}
+        ORDER BY day
+    '''
+
+    @staticmethod
+    def registry():
+        """所有報表查詢與檢查執行計畫用的範例參數"""
+        month = ('2024-01',)
+        period = DateRange.month('2024-01')
+        return {
+            'monthly_income': (ReportQueries.MONTHLY_INCOME, ()),
+            'monthly_expense': (ReportQueries.MONTHLY_EXPENSE, ()),
+            'top_customers': (ReportQueries.TOP_CUSTOMERS, month),
+            'treatment_mix': (ReportQueries.TREATMENT_MIX, month),
+            'monthly_pl': (ReportQueries.MONTHLY_PL, month),
+            'available_months': (ReportQueries.AVAILABLE_MONTHS, ()),
+            'treatments_in_range': (ReportQueries.TREATMENTS_IN_RANGE, period),
+            'expenses_in_range': (ReportQueries.EXPENSES_IN_RANGE, period),
+            'expense_breakdown': (ReportQueries.EXPENSE_BREAKDOWN, period),
+            'daily_ledger': (ReportQueries.DAILY_LEDGER, period),
+            'expenses_with_net_income': (Ledger.EXPENSES_WITH_NET_INCOME, ()),
+            'expense_page_first': Ledger.expense_page_query(),
+            'expense_page_next': Ledger.expense_page_query(after=('2024-01-31', 1)),
+            'expense_page_previous': Ledger.expense_page_query(before=('2024-01-31', 1)),
+            'expense_page_amount': Ledger.expense_page_query('amount', after=(100, 1)),
+            'expense_page_category': Ledger.expense_page_query('category', False, after=('房租', '2024-01-31', 1)),
+            'expense_page_filtered': Ledger.expense_page_query(after=('2024-01-31', 1), category='房租'),
+            'expenses_by_ids': Ledger.expenses_by_ids_query((1, 2, 3)),
+            'net_income_for_days': Ledger.net_income_for_days_query(('2024-01-30', '2024-01-31')),
+            'open_packages': (OPEN_PACKAGES, ()),
+        }
+
+    @staticmethod
+    def explain(query, params=()):
+        """返回查詢的 EXPLAIN QUERY PLAN 明細"""
+        return [row['detail'] for row in Database.execute(f'EXPLAIN QUERY PLAN {query}', params, fetch=True)]
+
+    @staticmethod
+    def check_plans():
+        """
+        檢查每個報表查詢都使用索引。返回 {查詢名稱: 違規計畫列表}，空字典表示全部通過。
+        彙總表為 WITHOUT ROWID（依主鍵叢集存放），依鍵順序掃描即為索引走訪，因此允許。
+        """
+        violations = {}
+        for name, (query, params) in ReportQueries.registry().items():
+            bad = [line for line in ReportQueries.explain(query, params) if ReportQueries._is_full_scan(line)]
+            if bad:
+                violations[name] = bad
+        return violations
+
+    @staticmethod
+    def _is_full_scan(line):
+        match = re.match(r'SCAN (\w+)', line)
+        if not match or 'USING INDEX' in line or 'USING COVERING INDEX' in line:
+            return False
+        return match.group(1) not in SUMMARY_TABLES
+
+
+def main():
+    """命令列：python report_queries.py，檢查所有報表查詢的執行計畫"""
+    Database.initialize_database()
+    violations = ReportQueries.check_plans()
+    for name, lines in violations.items():
+        print(f"{name}: {'; '.join(lines)}")
+        logging.warning(f"報表查詢未使用索引：{name} {lines}")
+    print("所有報表查詢皆使用索引" if not violations else f"{len(violations)} 個查詢未使用索引")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
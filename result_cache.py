@@ -0,0 +1,140 @@
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from database import Database, ConnectionManager, DatabaseExecutor
+from constants import logging
+
+
+def _estimate_size(rows):
+    """粗估查詢結果（list of dict）佔用的記憶體位元組數"""
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+    return size
+
+
+class ResultCache:
+    """
+    查詢結果快取：以 (查詢, 參數) 為鍵，LRU 淘汰並限制總記憶體用量。
+    資料版本為 Database 的寫入計數加上專用連線的 PRAGMA data_version（可偵測其他程序的寫入）；
+    版本改變時整個快取失效。返回的結果為共用物件，呼叫端不可修改。
+    """
+    max_bytes = 16 * 1024 * 1024
+    max_entry_fraction = 0.25  # 單一結果超過上限的此比例時不快取
+
+    _lock = threading.Lock()
+    _entries = OrderedDict()  # (query, params) -> (rows, size)
+    _bytes = 0
+    _version = None
+    _version_conn = None
+    _version_path = None
+    _stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'uncacheable': 0}
+
+    @classmethod
+    def data_version(cls):
+        """目前的資料版本；任何已提交的寫入（含其他程序）都會使其改變"""
+        with cls._lock:
+            if cls._version_conn is None or cls._version_path != ConnectionManager.db_path:
+                if cls._version_conn is not None:
+                    cls._version_conn.close()
+                cls._version_conn = sqlite3.connect(ConnectionManager.db_path, check_same_thread=False)
+                cls._version_path = ConnectionManager.db_path
+            data_version = cls._version_conn.execute('PRAGMA data_version').fetchone()[0]
+            return cls._version_path, Database.write_count, data_version
+
+    @classmethod
+    def _current_version(cls):
+        """檢查資料版本，改變時清空快取；返回目前版本"""
+        version = cls.data_version()
+        with cls._lock:
+            if version != cls._version:
+                if cls._entries:
+                    cls._stats['invalidations'] += 1
+                cls._entries.clear()
+                cls._bytes = 0
+                cls._version = version
+        return version
+
+    @classmethod
+    def get(cls, query, params=()):
+        """返回 (是否命中, 結果)"""
+        cls._current_version()
+        return cls._lookup(query, params)
+
+    @classmethod
+    def _lookup(cls, query, params):
+        key = (query, tuple(params))
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                cls._stats['misses'] += 1
+                return False, None
+            cls._entries.move_to_end(key)
+            cls._stats['hits'] += 1
+            return True, entry[0]
+
+    @classmethod
+    def put(cls, query, params, rows, version):
+        """存入結果；version 為查詢前取得的資料版本，之後若資料已變則不存入"""
+        size = _estimate_size(rows)
+        with cls._lock:
+            if version != cls._version:
+                return
+            if size > cls.max_bytes * cls.max_entry_fraction:
+                cls._stats['uncacheable'] += 1
+                return
+            key = (query, tuple(params))
+            old = cls._entries.pop(key, None)
+            if old is not None:
+                cls._bytes -= old[1]
+            cls._entries[key] = (rows, size)
+            cls._bytes += size
+            while cls._bytes > cls.max_bytes:
+                _, (_, evicted) = cls._entries.popitem(last=False)
+                cls._bytes -= evicted
+                cls._stats['evictions'] += 1
+
+    @classmethod
+    def execute(cls, query, params=()):
+        """同步查詢（經過快取）"""
+        version = cls._current_version()
+        hit, rows = cls._lookup(query, params)
+        if hit:
+            return rows
+        rows = Database.execute(query, params, fetch=True)
+        cls.put(query, params, rows, version)
+        return rows
+
+    @classmethod
+    def submit_read(cls, query, params=()):
+        """同 DatabaseExecutor.submit_read，命中時直接返回已完成的 Future"""
+        version = cls._current_version()
+        hit, rows = cls._lookup(query, params)
+        if hit:
+            future = Future()
+            future.set_result(rows)
+            return future
+        future = DatabaseExecutor.submit_read(query, params)
+
+        def store(f):
+            if f.exception() is None:
+                cls.put(query, params, f.result(), version)
+        future.add_done_callback(store)
+        return future
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._entries.clear()
+            cls._bytes = 0
+        logging.info("查詢結果快取已清空")
+
+    @classmethod
+    def stats(cls):
+        """返回命中／未命中等統計及目前的項目數與記憶體用量"""
+        with cls._lock:
+            lookups = cls._stats['hits'] + cls._stats['misses']
+            return dict(cls._stats, entries=len(cls._entries), bytes=cls._bytes,
+                        hit_rate=round(cls._stats['hits'] / lookups, 3) if lookups else None)
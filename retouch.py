@@ -0,0 +1,111 @@
+import sys
+from datetime import datetime, timedelta
+from database import Database
+from treatment_catalog import TreatmentCatalog
+from date_ranges import DateRange
+from constants import RETOUCH_ELIGIBLE_TREATMENTS, RETOUCH_WINDOW_DAYS
+
+# 尚未使用補脫的首次療程：以 idx_retouch_parent 做 NOT EXISTS 檢查，一次查詢完成
+_UNUSED_PARENT = '''
+    ct.treatment_id IN ({ids})
+    AND ct.price > 0
+    AND NOT EXISTS (SELECT 1 FROM Customer_Treatments r WHERE r.retouch_parent_id = ct.customer_treatment_id)
+'''
+
+
+class RetouchEligibility:
+    """補脫資格引擎：以集合查詢判斷，不再逐筆檢查"""
+    chunk_size = 500  # 批次查詢時每次 IN 清單的客戶數
+
+    @staticmethod
+    def _window(treatment_date):
+        """treatment_date 當日可用來補脫的首次療程日期區間 [cutoff, treatment_date)"""
+        current = datetime.strptime(treatment_date, '%Y-%m-%d')
+        return (current - timedelta(days=RETOUCH_WINDOW_DAYS)).strftime('%Y-%m-%d'), current.strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _eligible_ids():
+        return TreatmentCatalog.ids_for_names(RETOUCH_ELIGIBLE_TREATMENTS)
+
+    @staticmethod
+    def first_eligible(customer_id, treatment_date):
+        """返回客戶在 treatment_date 可用來補脫的最早首次療程 id，沒有則返回 None"""
+        ids = RetouchEligibility._eligible_ids()
+        if not ids:
+            return None
+        rows = Database.execute(f'''
+            SELECT ct.customer_treatment_id
+            FROM Customer_Treatments ct
+            WHERE ct.customer_id = ?
+            AND {_UNUSED_PARENT.format(ids=','.join('?' * len(ids)))}
+            AND ct.treatment_date >= ? AND ct.treatment_date < ?
+            ORDER BY ct.treatment_date, ct.customer_treatment_id
+            LIMIT 1
+        ''', (customer_id, *ids, *RetouchEligibility._window(treatment_date)), fetch=True)
+        return rows[0]['customer_treatment_id'] if rows else None
+
+    @staticmethod
+    def eligible_for_customers(customer_ids, treatment_date):
+        """批次判斷多位客戶，返回 {customer_id: customer_treatment_id}（僅含符合資格者）"""
+        ids = RetouchEligibility._eligible_ids()
+        customer_ids = list(customer_ids)
+        if not ids or not customer_ids:
+            return {}
+        window = RetouchEligibility._window(treatment_date)
+        result = {}
+        for i in range(0, len(customer_ids), RetouchEligibility.chunk_size):
+            chunk = customer_ids[i:i + RetouchEligibility.chunk_size]
+            rows = Database.execute(f'''
+                SELECT customer_id, customer_treatment_id FROM (
+                    SELECT ct.customer_id, ct.customer_treatment_id,
+                           ROW_NUMBER() OVER (PARTITION BY ct.customer_id ORDER BY ct.treatment_date, ct.customer_treatment_id) as rank
+                    FROM Customer_Treatments ct
+                    WHERE ct.customer_id IN ({','.join('?' * len(chunk))})
+                    AND {_UNUSED_PARENT.format(ids=','.join('?' * len(ids)))}
+                    AND ct.treatment_date >= ? AND ct.treatment_date < ?
+                ) WHERE rank = 1
+            ''', (*chunk, *ids, *window), fetch=True)
+            result.update((row['customer_id'], row['customer_treatment_id']) for row in rows)
+        return result
+
+    @staticmethod
+    def expiring_between(start_date, end_date):
+        """
+        列出免費補脫資格在 [start_date, end_date) 之間到期、且尚未使用的首次療程，
+        含客戶資料及到期日（首次療程日 + RETOUCH_WINDOW_DAYS）。
+        """
+        ids = RetouchEligibility._eligible_ids()
+        if not ids:
+            return []
+        shift = timedelta(days=RETOUCH_WINDOW_DAYS)
+        start = (datetime.strptime(start_date, '%Y-%m-%d') - shift).strftime('%Y-%m-%d')
+        end = (datetime.strptime(end_date, '%Y-%m-%d') - shift).strftime('%Y-%m-%d')
+        return Database.execute(f'''
+            SELECT c.customer_id, c.name, c.contact_method, ct.customer_treatment_id, ct.treatment_date,
+                   date(ct.treatment_date, '+{RETOUCH_WINDOW_DAYS} days') as expires_on
+            FROM Customer_Treatments ct
+            JOIN Customers c ON c.customer_id = ct.customer_id
+            WHERE ct.treatment_date >= ? AND ct.treatment_date < ?
+            AND {_UNUSED_PARENT.format(ids=','.join('?' * len(ids)))}
+            ORDER BY expires_on, c.name
+        ''', (start, end, *ids), fetch=True)
+
+    @staticmethod
+    def expiring_in_month(month):
+        """列出指定月份（YYYY-MM）內到期的未使用補脫資格"""
+        return RetouchEligibility.expiring_between(*DateRange.month(month))
+
+
+def main(argv):
+    """命令列：python retouch.py [YYYY-MM]，列出該月到期的未使用免費補脫（預設本月）"""
+    month = argv[1] if len(argv) > 1 else datetime.now().strftime('%Y-%m')
+    Database.initialize_database()
+    rows = RetouchEligibility.expiring_in_month(month)
+    for row in rows:
+        print(f"{row['expires_on']}\t{row['name']}\t{row['contact_method'] or ''}\t首次療程 {row['treatment_date']}")
+    print(f"{month} 共 {len(rows)} 位客戶的免費補脫即將到期")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
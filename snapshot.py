@@ -0,0 +1,321 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+from database import ConnectionManager, DatabaseExecutor
+from constants import logging
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+FORMAT_VERSION = 1
+
+# 欄位檔：每欄一個原始二進位檔 <欄位>.<世代>.bin（小端序），依 customer_treatment_id 遞增排列
+# 日期為自 1970-01-01 起的天數，金額為以分為單位的定點整數；客戶缺少時 customer_id 為 -1
+# 日期無法解析（例如 '2024/01/06'）時 day 為 INVALID_DAY，使用端須排除；筆數記於 meta 的 invalid_dates
+INVALID_DAY = -2147483648
+COLUMNS = (
+    ('customer_treatment_id', '<i4'),
+    ('customer_id', '<i4'),
+    ('treatment_id', '<i4'),
+    ('day', '<i4'),
+    ('price_cents', '<i8'),
+    ('is_peak', 'i1'),
+    ('neck_treatment', 'i1'),
+    ('is_retouch', 'i1'),
+    ('is_combo', 'i1'),
+)
+
+EXPORT_QUERY = '''
+    SELECT ct.customer_treatment_id,
+           IFNULL(ct.customer_id, -1),
+           IFNULL(ct.treatment_id, -1),
+           IFNULL(CAST(julianday(ct.treatment_date) - 2440587.5 AS INTEGER), {INVALID_DAY}),
+           CAST(ROUND(IFNULL(ct.price, 0) * 100) AS INTEGER),
+           IFNULL(ct.is_peak, 0),
+           IFNULL(ct.neck_treatment, 0),
+           ct.retouch_parent_id IS NOT NULL,
+           IFNULL(t.is_combo, 0)
+    FROM Customer_Treatments ct
+    LEFT JOIN Treatments t ON t.treatment_id = ct.treatment_id
+    WHERE ct.customer_treatment_id > ?
+    ORDER BY ct.customer_treatment_id
+'''.format(INVALID_DAY=INVALID_DAY)
+
+# 快照只追加新記錄；修改或刪除既有記錄（或療程資料）的快照欄位時由觸發器遞增計數，下次更新時整個重建
+SNAPSHOT_CONTROL_TABLE = '''CREATE TABLE IF NOT EXISTS Snapshot_Control (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    modifications INTEGER NOT NULL DEFAULT 0
+)'''
+
+SNAPSHOT_TRIGGERS = {
+    'trg_snapshot_ct_update': '''
+        CREATE TRIGGER trg_snapshot_ct_update
+        AFTER UPDATE OF customer_treatment_id, customer_id, treatment_id, treatment_date, price, is_peak, neck_treatment, retouch_parent_id
+        ON Customer_Treatments
+        BEGIN
+            UPDATE Snapshot_Control SET modifications = modifications + 1 WHERE id = 1;
+        END''',
+    'trg_snapshot_ct_delete': '''
+        CREATE TRIGGER trg_snapshot_ct_delete AFTER DELETE ON Customer_Treatments
+        BEGIN
+            UPDATE Snapshot_Control SET modifications = modifications + 1 WHERE id = 1;
+        END''',
+    'trg_snapshot_treatment_update': '''
+        CREATE TRIGGER trg_snapshot_treatment_update AFTER UPDATE OF treatment_id, is_combo ON Treatments
+        BEGIN
+            UPDATE Snapshot_Control SET modifications = modifications + 1 WHERE id = 1;
+        END''',
+}
+
+
+@contextmanager
+def _directory_lock(directory, timeout):
+    """快照目錄的跨程序鎖（snapshot.lock 檔案鎖）；程序異常結束時由作業系統釋放，不會留下失效的鎖"""
+    f = open(os.path.join(directory, 'snapshot.lock'), 'a+b')
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                if msvcrt is not None:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"等待快照鎖逾時（{timeout} 秒）：{directory}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    finally:
+        f.close()
+
+
+class SnapshotView:
+    """已開啟的快照：各欄位為唯讀 np.memmap（長度以 meta.json 的 rows 為準），多個程序可共用同一份頁面快取"""
+    __slots__ = ('meta', 'columns')
+
+    def __init__(self, meta, columns):
+        self.meta = meta
+        self.columns = columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.meta['rows']
+
+    @property
+    def treatment_names(self):
+        """{treatment_id: 名稱}"""
+        return {int(key): name for key, name in self.meta['treatments'].items()}
+
+    def prices(self):
+        """金額（元）"""
+        return self.columns['price_cents'] / 100
+
+
+class TreatmentSnapshot:
+    """
+    Customer_Treatments（併入 Treatments 欄位）的欄式快照，存放於資料庫旁的 <資料庫名稱>_snapshot 目錄。
+    refresh() 只匯出上次水位（customer_treatment_id）之後的新記錄並追加到各欄位檔，
+    資料檔寫入並同步後才以 os.replace 更新 meta.json，中斷的追加會在下次更新時截斷。
+    重建時寫入新世代的檔案而非截斷舊檔（Windows 上無法截斷仍被映射的檔案），舊世代檔案盡量刪除。
+    更新與捨棄快照時持有目錄中的檔案鎖，程式與命令列同時更新時依序進行。
+    """
+    chunk_size = 50000
+    lock_timeout = 120  # 等待其他程序完成更新的秒數
+    _lock = threading.Lock()  # 同一程序內的執行緒；跨程序由 _directory_lock 負責
+
+    @staticmethod
+    def install(cursor):
+        """建立修改計數表及觸發器"""
+        cursor.execute(SNAPSHOT_CONTROL_TABLE)
+        cursor.execute('INSERT OR IGNORE INTO Snapshot_Control (id, modifications) VALUES (1, 0)')
+        for name, script in SNAPSHOT_TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(script)
+
+    @staticmethod
+    def directory(db_path=None):
+        return f'{os.path.splitext(db_path or ConnectionManager.db_path)[0]}_snapshot'
+
+    @staticmethod
+    def _read_meta(directory):
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_meta(directory, meta):
+        path = os.path.join(directory, 'meta.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f'{path}.tmp', path)
+
+    @staticmethod
+    def _column_path(directory, name, generation):
+        return os.path.join(directory, f'{name}.{generation}.bin')
+
+    @classmethod
+    def refresh(cls, rebuild=False):
+        """將新記錄追加到目前資料庫的快照（需要時整個重建），返回 meta；應在讀取執行緒或命令列中呼叫"""
+        directory = cls.directory()
+        os.makedirs(directory, exist_ok=True)
+        with cls._lock, _directory_lock(directory, cls.lock_timeout):
+            meta = cls._read_meta(directory)
+            cursor = ConnectionManager.get_connection().cursor()
+            cursor.row_factory = None  # 直接取得 tuple
+            cursor.execute('BEGIN')  # 修改計數、新記錄及療程名稱取自同一個讀取交易
+            try:
+                modifications = cursor.execute('SELECT modifications FROM Snapshot_Control WHERE id = 1').fetchone()[0]
+                rebuild = rebuild or not (meta is not None and meta.get('format_version') == FORMAT_VERSION
+                                          and meta.get('columns') == [list(c) for c in COLUMNS]
+                                          and meta.get('modifications') == modifications)
+                if rebuild:
+                    previous = meta.get('generation') if meta else None
+                    meta = {'format_version': FORMAT_VERSION, 'columns': [list(c) for c in COLUMNS],
+                            'generation': (previous or 0) + 1, 'rows': 0, 'watermark': 0, 'invalid_dates': 0}
+                cls._truncate(directory, meta['generation'], meta['rows'])
+                count, meta['watermark'], invalid = cls._append(directory, meta['generation'], cursor, meta['watermark'])
+                meta['rows'] += count
+                meta['invalid_dates'] = meta.get('invalid_dates', 0) + invalid
+                treatments = cursor.execute('SELECT treatment_id, name FROM Treatments').fetchall()
+            finally:
+                cursor.execute('COMMIT')
+            meta.update(modifications=modifications, treatments={str(k): v for k, v in treatments},
+                        updated=datetime.now().isoformat(timespec='seconds'))
+            cls._write_meta(directory, meta)
+            if rebuild:
+                cls._remove_old_generations(directory, meta['generation'])
+        logging.info(f"療程快照{'重建' if rebuild else '更新'}：新增 {count} 筆，共 {meta['rows']} 筆")
+        if invalid:
+            logging.warning(f"療程快照：{invalid} 筆記錄的日期無法解析，分析時略過")
+        return meta
+
+    @classmethod
+    def _truncate(cls, directory, generation, rows):
+        """欄位檔截斷（或建立）為 rows 筆，捨棄未記錄到 meta.json 的追加"""
+        for name, dtype in COLUMNS:
+            path = cls._column_path(directory, name, generation)
+            size = rows * np.dtype(dtype).itemsize
+            with open(path, 'ab') as f:
+                if f.tell() != size:
+                    f.truncate(size)
+
+    @staticmethod
+    def _remove_old_generations(directory, generation):
+        current = f'.{generation}.bin'
+        for filename in os.listdir(directory):
+            if filename.endswith('.bin') and not filename.endswith(current):
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except OSError:
+                    pass  # 仍被其他程序映射，下次重建時再刪除
+
+    @classmethod
+    def _append(cls, directory, generation, cursor, watermark):
+        """追加水位之後的記錄，返回 (新增筆數, 新水位, 日期無法解析的筆數)"""
+        dtype = np.dtype(list(COLUMNS))
+        cursor.execute(EXPORT_QUERY, (watermark,))
+        files = {name: open(cls._column_path(directory, name, generation), 'ab') for name, _ in COLUMNS}
+        count, last, invalid = 0, watermark, 0
+        try:
+            while True:
+                rows = cursor.fetchmany(cls.chunk_size)
+                if not rows:
+                    break
+                chunk = np.array(rows, dtype=dtype)
+                for name, f in files.items():
+                    chunk[name].tofile(f)
+                count += len(chunk)
+                invalid += int((chunk['day'] == INVALID_DAY).sum())
+                last = int(chunk['customer_treatment_id'][-1])
+            for f in files.values():
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            for f in files.values():
+                f.close()
+        return count, last, invalid
+
+    @classmethod
+    def open(cls, db_path=None):
+        """以唯讀記憶體映射開啟快照；快照不存在時返回 None"""
+        directory = cls.directory(db_path)
+        meta = cls._read_meta(directory)
+        if meta is None or meta.get('format_version') != FORMAT_VERSION:
+            return None
+        rows = meta['rows']
+        columns = {}
+        for name, dtype in COLUMNS:
+            if rows:
+                columns[name] = np.memmap(cls._column_path(directory, name, meta['generation']), dtype=dtype, mode='r', shape=(rows,))
+            else:
+                columns[name] = np.zeros(0, dtype=dtype)
+        return SnapshotView(meta, columns)
+
+    @classmethod
+    def invalidate(cls, db_path=None):
+        """捨棄快照（例如資料庫由備份還原後），下次 refresh() 時整個重建"""
+        directory = cls.directory(db_path)
+        if not os.path.isdir(directory):
+            return
+        with cls._lock, _directory_lock(directory, cls.lock_timeout):
+            try:
+                os.remove(os.path.join(directory, 'meta.json'))
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def load(cls):
+        """更新目前資料庫的快照後開啟，供分析程式使用"""
+        cls.refresh()
+        return cls.open()
+
+
+def main(argv):
+    """命令列：python snapshot.py [refresh|rebuild|info] [資料庫檔案]"""
+    command = argv[1] if len(argv) > 1 else 'refresh'
+    if len(argv) > 2:
+        ConnectionManager.configure(argv[2])
+    try:
+        if command in ('refresh', 'rebuild'):
+            from database import Database
+            Database.initialize_database()
+            started = datetime.now()
+            meta = TreatmentSnapshot.refresh(rebuild=command == 'rebuild')
+            print(f"快照共 {meta['rows']} 筆（水位 {meta['watermark']}），耗時 {(datetime.now() - started).total_seconds():.2f} 秒")
+        view = TreatmentSnapshot.open()
+        if view is None:
+            print("尚未建立快照")
+            return 1
+        print(f"{TreatmentSnapshot.directory()}：{len(view)} 筆，水位 {view.meta['watermark']}，更新於 {view.meta['updated']}")
+        if view.meta.get('invalid_dates'):
+            print(f"其中 {view.meta['invalid_dates']} 筆日期無法解析")
+        return 0
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
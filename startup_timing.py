@@ -0,0 +1,38 @@
+import json
+import time
+from datetime import datetime
+from constants import logging
+
+STARTUP_TIMING_FILE = 'startup_timing.jsonl'  # 每次啟動追加一行，方便比較各版本的開窗時間
+
+
+class StartupTimer:
+    """記錄啟動各階段耗時（自本模組匯入起算），首次顯示視窗後寫入日誌及 STARTUP_TIMING_FILE"""
+    start = time.perf_counter()
+    marks = []
+    reported = False
+
+    @classmethod
+    def mark(cls, label):
+        cls.marks.append((label, time.perf_counter() - cls.start))
+
+    @classmethod
+    def watch_first_window(cls, root):
+        """視窗第一次顯示（<Map>）時記錄 first_window 並輸出報告"""
+        def on_map(event):
+            if event.widget is root and not cls.reported:
+                cls.mark('first_window')
+                cls.report()
+        root.bind('<Map>', on_map, add='+')
+
+    @classmethod
+    def report(cls):
+        cls.reported = True
+        timings = {label: round(seconds * 1000, 1) for label, seconds in cls.marks}
+        logging.info(f"啟動耗時（毫秒）：{timings}")
+        try:
+            with open(STARTUP_TIMING_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'time': datetime.now().isoformat(timespec='seconds'), 'ms': timings}, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logging.warning(f"無法寫入啟動耗時記錄：{str(e)}")
+        return timings
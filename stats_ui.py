@@ -1,152 +1,48 @@
-import sqlite3
 from tkinter import *
 from tkinter import ttk, messagebox
-from database import Database
+from database import DatabaseExecutor
 from business_logic import BusinessLogic
+from report_queries import ReportQueries
+from result_cache import ResultCache
+from chart_renderer import TrendChart, PieChart
+from task_scheduler import TaskScheduler, BACKGROUND
 from constants import logging
-import pandas as pd
-from matplotlib import font_manager
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import threading
 
-# 設置 Matplotlib 支援中文
-font_manager.fontManager.addfont('C:/Windows/Fonts/msjh.ttc')  # 微軟正黑體
-plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
-plt.rcParams['axes.unicode_minus'] = False
+# matplotlib 匯入成本高，第一次需要圖表時才由 load_chart_libraries() 載入
+Figure = FigureCanvasTkAgg = None
+
+def load_chart_libraries():
+    """載入圖表相關模組並設置 Matplotlib 支援中文（只執行一次）"""
+    global Figure, FigureCanvasTkAgg
+    if Figure is not None:
+        return
+    import matplotlib
+    from matplotlib import font_manager
+    from matplotlib.figure import Figure as _Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg as _FigureCanvasTkAgg
+    font_manager.fontManager.addfont('C:/Windows/Fonts/msjh.ttc')  # 微軟正黑體
+    matplotlib.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    Figure, FigureCanvasTkAgg = _Figure, _FigureCanvasTkAgg
 
 class StatsUI:
+    overdue_limit = 50  # 分析面板列出的逾期客戶數
     def __init__(self, notebook, app):
         self.app = app  # 接收主 Application 實例
         self.master = app.master
         self.status_var = app.status_var
         self.tab = ttk.Frame(notebook)
         notebook.add(self.tab, text="統計分析")
-        self.db_lock = threading.Lock()
-        self.setup_stats_tab()
+        self.built = False  # 第一次切換到此標籤頁時才由 build() 建立內容
 
-    def setup_stats_tab(self):
-        """設置統計分析標籤頁"""
-        stats_container = ttk.Frame(self.tab)
-        stats_container.pack(expand=True, fill=BOTH, padx=10, pady=10)
-
-        filter_frame = ttk.Frame(stats_container)
-        filter_frame.pack(fill=X, pady=5)
-        ttk.Label(filter_frame, text="選擇月份：").pack(side=LEFT, padx=10)
-        self.month_combo = ttk.Combobox(filter_frame, width=15, font=('微軟正黑體', 12))
-        self.month_combo.pack(side=LEFT, padx=10)
-        self.month_combo['values'] = BusinessLogic.get_available_months()
-        if self.month_combo['values']:
-            self.month_combo.set(self.month_combo['values'][0])
-        self.month_combo.bind("<<ComboboxSelected>>", lambda e: self.update_stats())
-
-        trend_frame = ttk.LabelFrame(stats_container, text="收入與支出趨勢", padding=10)
-        trend_frame.pack(fill=BOTH, expand=True, pady=10)
-        self.trend_fig = Figure(figsize=(10, 3), dpi=100)
-        self.trend_canvas = FigureCanvasTkAgg(self.trend_fig, master=trend_frame)
-        self.trend_canvas.get_tk_widget().pack(fill=BOTH, expand=True)
-
-        customer_frame = ttk.LabelFrame(stats_container, text="客戶排行", padding=10)
-        customer_frame.pack(fill=X, pady=10)
-        self.top_customers_tree = ttk.Treeview(customer_frame, columns=("排名", "姓名", "聯絡方式", "消費次數", "總金額"), show="headings", height=5)
-        for col, width in [("排名", 80), ("姓名", 200), ("聯絡方式", 150), ("消費次數", 120), ("總金額", 150)]:
-            self.top_customers_tree.heading(col, text=col)
-            self.top_customers_tree.column(col, width=width, anchor='center')
-        self.top_customers_tree.pack(fill=X, expand=True)
-
-        treatment_frame = ttk.LabelFrame(stats_container, text="療程分布", padding=10)
-        treatment_frame.pack(fill=BOTH, expand=True, pady=10)
-        self.pie_fig = Figure(figsize=(6, 3), dpi=100)
-        self.pie_canvas = FigureCanvasTkAgg(self.pie_fig, master=treatment_frame)
-        self.pie_canvas.get_tk_widget().pack(fill=BOTH, expand=True)
-
-        self.update_stats()
-
-    def update_stats(self):
-        """更新統計數據，異步實現"""
-        def load_in_background():
-            month = self.month_combo.get()
-            with self.db_lock:
-                income_data = Database.execute('''
-                    SELECT strftime('%Y-%m', treatment_date) as month, SUM(price) as total_income
-                    FROM Customer_Treatments
-                    GROUP BY month
-                    ORDER BY month
-                ''', fetch=True)
-                expense_data = Database.execute('''
-                    SELECT strftime('%Y-%m', expense_date) as month, SUM(amount) as total_expense
-                    FROM Expenses
-                    GROUP BY month
-                    ORDER BY month
-                ''', fetch=True)
-                customer_data = Database.execute('''
-                    SELECT c.name, c.contact_method, COUNT(ct.customer_treatment_id) as count, SUM(ct.price) as total
-                    FROM Customers c JOIN Customer_Treatments ct ON c.customer_id = ct.customer_id
-                    WHERE strftime('%Y-%m', ct.treatment_date) = ?
-                    GROUP BY c.customer_id, c.name, c.contact_method
-                    ORDER BY total DESC LIMIT 10
-                ''', (month,), fetch=True)
-                treatment_data = Database.execute('''
-                    SELECT t.name, COUNT(ct.customer_treatment_id) as count
-                    FROM Treatments t JOIN Customer_Treatments ct ON t.treatment_id = ct.treatment_id
-                    WHERE strftime('%Y-%m', ct.treatment_date) = ?
-                    GROUP BY t.treatment_id, t.name
-                    ORDER BY count DESC
-                ''', (month,), fetch=True)
-
-            income_df = pd.DataFrame(income_data)
-            expense_df = pd.DataFrame(expense_data)
-            self.master.after(0, lambda: self.update_charts(income_df, expense_df, customer_data, treatment_data))
-
-        threading.Thread(target=load_in_background, daemon=True).start()
-
-    def update_charts(self, income_df, expense_df, customer_data, treatment_data):
-        """更新圖表和排行榜"""
-        # 趨勢圖
-        self.trend_fig.clear()
-        ax = self.trend_fig.add_subplot(111)
-        if not income_df.empty:
-            ax.plot(income_df['month'], income_df['total_income'], label='收入', marker='o')
-        if not expense_df.empty:
-            ax.plot(expense_df['month'], expense_df['total_expense'], label='支出', marker='o')
-        ax.set_title("收入與支出趨勢")
-        ax.set_xlabel("月份")
-        ax.set_ylabel("金額 ($)")
-        ax.legend()
-        ax.tick_params(axis='x', rotation=45)
-        self.trend_fig.tight_layout()
-        self.trend_canvas.draw()
-import sqlite3
-from tkinter import *
-from tkinter import ttk, messagebox
-from database import Database
-from business_logic import BusinessLogic
-from constants import logging
-import pandas as pd
-from matplotlib import font_manager
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import threading
-
-# 設置 Matplotlib 支援中文
-font_manager.fontManager.addfont('C:/Windows/Fonts/msjh.ttc')  # 微軟正黑體
-plt.rcParams['font.sans-serif'] = ['Microsoft JhengHei']
-plt.rcParams['axes.unicode_minus'] = False
-
-class StatsUI:
-    def __init__(self, notebook, app):
-        self.app = app  # 接收主 Application 實例
-        self.master = app.master
-        self.status_var = app.status_var
-        self.tab = ttk.Frame(notebook)
-        notebook.add(self.tab, text="統計分析")
-        self.db_lock = threading.Lock()
-        self.setup_stats_tab()
+    def build(self):
+        if not self.built:
+            self.built = True
+            self.setup_stats_tab()
 
     def setup_stats_tab(self):
         """設置統計分析標籤頁"""
+        load_chart_libraries()
         stats_container = ttk.Frame(self.tab)
         stats_container.pack(expand=True, fill=BOTH, padx=10, pady=10)
 
@@ -165,6 +61,7 @@ class StatsUI:
         self.trend_fig = Figure(figsize=(10, 3), dpi=100)
         self.trend_canvas = FigureCanvasTkAgg(self.trend_fig, master=trend_frame)
         self.trend_canvas.get_tk_widget().pack(fill=BOTH, expand=True)
+        self.trend_chart = TrendChart(self.trend_fig, self.trend_canvas)
 
         customer_frame = ttk.LabelFrame(stats_container, text="客戶排行", padding=10)
         customer_frame.pack(fill=X, pady=10)
@@ -179,63 +76,52 @@ class StatsUI:
         self.pie_fig = Figure(figsize=(6, 3), dpi=100)
         self.pie_canvas = FigureCanvasTkAgg(self.pie_fig, master=treatment_frame)
         self.pie_canvas.get_tk_widget().pack(fill=BOTH, expand=True)
+        self.pie_chart = PieChart(self.pie_fig, self.pie_canvas)
+
+        analytics_frame = ttk.LabelFrame(stats_container, text="客戶分析（全部歷史）", padding=10)
+        analytics_frame.pack(fill=X, pady=10)
+        analytics_bar = ttk.Frame(analytics_frame)
+        analytics_bar.pack(fill=X)
+        self.analytics_var = StringVar(value="客戶分析計算中...")
+        ttk.Label(analytics_bar, textvariable=self.analytics_var).pack(side=LEFT)
+        ttk.Button(analytics_bar, text="重新計算", command=self.update_analytics).pack(side=RIGHT)
+        self.segment_tree = ttk.Treeview(analytics_frame, columns=("分群", "客戶數", "總消費", "平均終身價值", "逾期未回訪"), show="headings", height=6)
+        for col, width in [("分群", 120), ("客戶數", 100), ("總消費", 150), ("平均終身價值", 150), ("逾期未回訪", 120)]:
+            self.segment_tree.heading(col, text=col)
+            self.segment_tree.column(col, width=width, anchor='center')
+        self.segment_tree.pack(fill=X, expand=True, pady=5)
+        overdue_columns = [("姓名", 150), ("聯絡方式", 120), ("分群", 100), ("距上次到訪(天)", 120), ("平均間隔(天)", 110), ("消費次數", 90), ("預估終身價值", 130)]
+        self.overdue_tree = ttk.Treeview(analytics_frame, columns=[col for col, _ in overdue_columns], show="headings", height=8)
+        for col, width in overdue_columns:
+            self.overdue_tree.heading(col, text=col)
+            self.overdue_tree.column(col, width=width, anchor='center')
+        self.overdue_tree.pack(fill=X, expand=True)
 
         self.update_stats()
+        self.update_analytics()
 
     def update_stats(self):
         """更新統計數據，異步實現"""
-        def load_in_background():
-            month = self.month_combo.get()
-            with self.db_lock:
-                income_data = Database.execute('''
-                    SELECT strftime('%Y-%m', treatment_date) as month, SUM(price) as total_income
-                    FROM Customer_Treatments
-                    GROUP BY month
-                    ORDER BY month
-                ''', fetch=True)
-                expense_data = Database.execute('''
-                    SELECT strftime('%Y-%m', expense_date) as month, SUM(amount) as total_expense
-                    FROM Expenses
-                    GROUP BY month
-                    ORDER BY month
-                ''', fetch=True)
-                customer_data = Database.execute('''
-                    SELECT c.name, c.contact_method, COUNT(ct.customer_treatment_id) as count, SUM(ct.price) as total
-                    FROM Customers c JOIN Customer_Treatments ct ON c.customer_id = ct.customer_id
-                    WHERE strftime('%Y-%m', ct.treatment_date) = ?
-                    GROUP BY c.customer_id, c.name, c.contact_method
-                    ORDER BY total DESC LIMIT 10
-                ''', (month,), fetch=True)
-                treatment_data = Database.execute('''
-                    SELECT t.name, COUNT(ct.customer_treatment_id) as count
-                    FROM Treatments t JOIN Customer_Treatments ct ON t.treatment_id = ct.treatment_id
-                    WHERE strftime('%Y-%m', ct.treatment_date) = ?
-                    GROUP BY t.treatment_id, t.name
-                    ORDER BY count DESC
-                ''', (month,), fetch=True)
-
-            income_df = pd.DataFrame(income_data)
-            expense_df = pd.DataFrame(expense_data)
-            self.master.after(0, lambda: self.update_charts(income_df, expense_df, customer_data, treatment_data))
-
-        threading.Thread(target=load_in_background, daemon=True).start()
-
-    def update_charts(self, income_df, expense_df, customer_data, treatment_data):
+        month = self.month_combo.get()
+        futures = [
+            ResultCache.submit_read(ReportQueries.MONTHLY_INCOME),
+            ResultCache.submit_read(ReportQueries.MONTHLY_EXPENSE),
+            ResultCache.submit_read(ReportQueries.TOP_CUSTOMERS, (month,)),
+            ResultCache.submit_read(ReportQueries.TREATMENT_MIX, (month,)),
+        ]
+
+        def on_loaded(results):
+            income_data, expense_data, customer_data, treatment_data = results
+            self.update_charts(income_data, expense_data, customer_data, treatment_data)
+
+        # 快速切換月份時只交付最後一次請求的結果
+        DatabaseExecutor.deliver(self.master, DatabaseExecutor.gather(futures), on_loaded,
+                                 lambda e: self.status_var.set(f"統計數據載入失敗：{str(e)}"), key='stats.update')
+
+    def update_charts(self, income_data, expense_data, customer_data, treatment_data):
         """更新圖表和排行榜"""
-        # 趨勢圖
-        self.trend_fig.clear()
-        ax = self.trend_fig.add_subplot(111)
-        if not income_df.empty:
-            ax.plot(income_df['month'], income_df['total_income'], label='收入', marker='o')
-        if not expense_df.empty:
-            ax.plot(expense_df['month'], expense_df['total_expense'], label='支出', marker='o')
-        ax.set_title("收入與支出趨勢")
-        ax.set_xlabel("月份")
-        ax.set_ylabel("金額 ($)")
-        ax.legend()
-        ax.tick_params(axis='x', rotation=45)
-        self.trend_fig.tight_layout()
-        self.trend_canvas.draw()
+        # 趨勢圖（資料未變時不重繪）
+        self.trend_chart.update(income_data, expense_data)
 
         # 客戶排行
         self.top_customers_tree.delete(*self.top_customers_tree.get_children())
@@ -245,17 +131,27 @@ class StatsUI:
         else:
             self.top_customers_tree.insert("", "end", values=("", "無數據", "", "", ""))
 
-        # 療程分布（餅圖）
-        self.pie_fig.clear()
-        ax = self.pie_fig.add_subplot(111)
-        if treatment_data:
-            df = pd.DataFrame(treatment_data)
-            ax.pie(df['count'], labels=df['name'], autopct='%1.1f%%', startangle=90)
-            ax.axis('equal')
-            ax.set_title(f"{self.month_combo.get()} 療程分布")
-        else:
-            ax.text(0.5, 0.5, '無數據', horizontalalignment='center', verticalalignment='center')
-        self.pie_fig.tight_layout()
-        self.pie_canvas.draw()
-
-        self.status_var.set(f"統計數據已更新 ({self.month_combo.get()})")
\ No newline at end of file
+        # 療程分布（餅圖，各月份繪製一次後由快取還原）
+        self.pie_chart.show(f"{self.month_combo.get()} 療程分布", treatment_data)
+
+        self.status_var.set(f"統計數據已更新 ({self.month_combo.get()})")
+
+    def update_analytics(self):
+        """在背景計算客戶分析（pandas 只在此時才載入），完成後更新分析面板"""
+        from customer_analytics import CustomerAnalytics  # 匯入 pandas 成本高，延後到第一次使用
+        self.analytics_var.set("客戶分析計算中...")
+        TaskScheduler.submit(CustomerAnalytics.current, key='stats.analytics', priority=BACKGROUND,
+                             on_success=self.show_analytics,
+                             on_error=lambda e: self.analytics_var.set(f"客戶分析失敗：{str(e)}"))
+
+    def show_analytics(self, result):
+        from customer_analytics import CustomerAnalytics
+        self.segment_tree.delete(*self.segment_tree.get_children())
+        for segment, row in CustomerAnalytics.segment_summary(result).iterrows():
+            self.segment_tree.insert("", "end", values=(segment, int(row['customers']), f"${round(row['monetary'])}",
+                                                        f"${round(row['lifetime_value'])}", int(row['overdue'])))
+        self.overdue_tree.delete(*self.overdue_tree.get_children())
+        for _, c in CustomerAnalytics.overdue_customers(result, self.overdue_limit).iterrows():
+            self.overdue_tree.insert("", "end", values=(c['name'], c['contact_method'], c['segment'], int(c['recency_days']),
+                                                        round(c['avg_interval_days']), int(c['frequency']), f"${round(c['lifetime_value'])}"))
+        self.analytics_var.set(f"共 {len(result)} 位客戶，{int(result['overdue'].sum())} 位逾期未回訪（依預估終身價值列出前 {self.overdue_limit} 位）")
\ No newline at end of file
@@ -0,0 +1,441 @@
+import json
+import sqlite3
+import sys
+from datetime import datetime
+from database import ConnectionManager, DatabaseExecutor
+from change_events import ChangeEvents, INSERT, UPDATE, DELETE
+from constants import DEFAULT_TREATMENTS, logging
+
+FORMAT_VERSION = 1
+
+# 同步的資料表：(主鍵, 同步欄位, 外鍵欄位 -> 參照的資料表)。外鍵在交換時以對方資料列的 sync_uid 表示。
+# 依套用順序排列（被參照者在前），刪除時反向。Customer_Treatments.import_id 為本地匯入記錄，不同步。
+SYNCED_TABLES = {
+    'Treatments': ('treatment_id', ('name', 'peak_price', 'non_peak_price', 'is_combo', 'can_add_neck', 'has_remaining_sessions'), {}),
+    'Customers': ('customer_id', ('name', 'contact_method', 'unique_mark'), {}),
+    'Customer_Treatments': ('customer_treatment_id',
+                            ('customer_id', 'treatment_id', 'treatment_date', 'is_peak', 'neck_treatment', 'package_id',
+                             'remaining_sessions', 'price', 'retouch_parent_id', 'remaining_retouch_count'),
+                            {'customer_id': 'Customers', 'treatment_id': 'Treatments', 'retouch_parent_id': 'Customer_Treatments'}),
+    'Expenses': ('expense_id', ('expense_date', 'category', 'amount', 'description'), {}),
+}
+
+SYNC_TABLES = [
+    '''CREATE TABLE IF NOT EXISTS Sync_State (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        origin TEXT NOT NULL,
+        applying INTEGER NOT NULL DEFAULT 0,
+        suspended INTEGER NOT NULL DEFAULT 0
+    )''',
+    # 每列資料只保留最後一次變更（INSERT OR REPLACE 會取得新的 seq），刪除留下 deleted = 1 的墓碑
+    '''CREATE TABLE IF NOT EXISTS Change_Log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        sync_uid TEXT NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        changed_at TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        UNIQUE (table_name, sync_uid)
+    )''',
+    # received_seq：已套用對方 Change_Log 的水位；sent_seq：已匯出給對方的本地水位
+    '''CREATE TABLE IF NOT EXISTS Sync_Peers (
+        origin TEXT PRIMARY KEY,
+        received_seq INTEGER NOT NULL DEFAULT 0,
+        sent_seq INTEGER NOT NULL DEFAULT 0,
+        last_sync TEXT
+    )''',
+    # 無法自動套用的變更（例如參照的資料列不存在、療程名稱重複），保留內容供人工處理
+    '''CREATE TABLE IF NOT EXISTS Sync_Conflicts (
+        conflict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        sync_uid TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        change TEXT NOT NULL,
+        recorded_at TEXT NOT NULL
+    )''',
+]
+
+_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+# applying：套用遠端變更（由套用程式自行記錄）；suspended：整批寫入（寫完後以 log_rows 一次記錄）
+_ACTIVE = '(SELECT applying + suspended FROM Sync_State WHERE id = 1) = 0'
+_ORIGIN = '(SELECT origin FROM Sync_State WHERE id = 1)'
+# 新資料列的 sync_uid：毫秒時間前綴加上隨機值，同批新增的資料列集中在索引尾端，整批寫入時不必隨機更新整個索引
+NEW_UID = "printf('%012x', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)) || lower(hex(randomblob(8)))"
+
+
+def _log(table, row, deleted):
+    return f'''INSERT OR REPLACE INTO Change_Log (table_name, sync_uid, deleted, changed_at, origin)
+               VALUES ('{table}', {row}.sync_uid, {deleted}, {_NOW}, {_ORIGIN});'''
+
+
+def _triggers(table, pk):
+    return {
+        # 新增時未指定 sync_uid 則補上；此 UPDATE 會由下面的更新觸發器記錄
+        f'trg_sync_{table.lower()}_uid': f'''
+            CREATE TRIGGER trg_sync_{table.lower()}_uid AFTER INSERT ON {table}
+            WHEN NEW.sync_uid IS NULL AND (SELECT suspended FROM Sync_State WHERE id = 1) = 0
+            BEGIN UPDATE {table} SET sync_uid = {NEW_UID} WHERE {pk} = NEW.{pk}; END''',
+        f'trg_sync_{table.lower()}_insert': f'''
+            CREATE TRIGGER trg_sync_{table.lower()}_insert AFTER INSERT ON {table}
+            WHEN NEW.sync_uid IS NOT NULL AND {_ACTIVE}
+            BEGIN {_log(table, 'NEW', 0)} END''',
+        f'trg_sync_{table.lower()}_update': f'''
+            CREATE TRIGGER trg_sync_{table.lower()}_update AFTER UPDATE ON {table}
+            WHEN NEW.sync_uid IS NOT NULL AND {_ACTIVE}
+            BEGIN {_log(table, 'NEW', 0)} END''',
+        f'trg_sync_{table.lower()}_delete': f'''
+            CREATE TRIGGER trg_sync_{table.lower()}_delete AFTER DELETE ON {table}
+            WHEN OLD.sync_uid IS NOT NULL AND {_ACTIVE}
+            BEGIN {_log(table, 'OLD', 1)} END''',
+    }
+
+
+class Sync:
+    """
+    多分店資料同步：觸發器將 Customers、Customer_Treatments、Expenses、Treatments 的每次變更記錄於 Change_Log，
+    同步時只交換對方水位之後的變更（成本與變更數成正比，與資料庫大小無關）。
+    衝突以 (changed_at, origin) 較大者為準（最後寫入者勝），各分店得到相同結果；changed_at 為 UTC 時間，需各分店時鐘大致正確。
+    """
+    chunk_size = 500
+
+    @staticmethod
+    def install(cursor):
+        """
+        建立同步資料表、sync_uid 欄位及觸發器，並將現有資料列記入 Change_Log。
+        預設療程（DEFAULT_TREATMENTS）的 sync_uid 由名稱產生，各分店各自建立的預設療程視為同一筆；
+        其餘資料列及之後新增的資料列（包括療程，改名後可再建立同名療程）使用隨機值。
+        """
+        for script in SYNC_TABLES:
+            cursor.execute(script)
+        cursor.execute("INSERT OR IGNORE INTO Sync_State (id, origin) VALUES (1, lower(hex(randomblob(8))))")
+        for table, (pk, _, _) in SYNCED_TABLES.items():
+            columns = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()}
+            if 'sync_uid' not in columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN sync_uid TEXT')
+            if table == 'Treatments':
+                names = list(DEFAULT_TREATMENTS)
+                cursor.execute(f"UPDATE Treatments SET sync_uid = 'T-' || lower(hex(name)) "
+                               f"WHERE sync_uid IS NULL AND name IN ({','.join('?' * len(names))})", names)
+            cursor.execute(f"UPDATE {table} SET sync_uid = {NEW_UID} WHERE sync_uid IS NULL")
+            cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table.lower()}_sync_uid ON {table}(sync_uid)')
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO Change_Log (table_name, sync_uid, deleted, changed_at, origin)
+                SELECT '{table}', sync_uid, 0, {_NOW}, {_ORIGIN} FROM {table} ORDER BY {pk}
+            ''')
+            for name, script in _triggers(table, pk).items():
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(script)
+
+    @staticmethod
+    def suspend(conn):
+        """暫停逐列的 sync_uid 補值及 Change_Log 記錄；只可在寫入執行緒的交易內使用，且須以 resume 恢復"""
+        conn.execute('UPDATE Sync_State SET suspended = 1 WHERE id = 1')
+
+    @staticmethod
+    def resume(conn):
+        conn.execute('UPDATE Sync_State SET suspended = 0 WHERE id = 1')
+
+    @staticmethod
+    def log_rows(conn, table, condition, params=(), deleted=False):
+        """
+        暫停期間以一個 UPDATE 補上 sync_uid，再以一個 INSERT ... SELECT 將 condition 選取的資料列記入 Change_Log。
+        deleted=True 時記錄刪除，須在刪除前呼叫。應在 suspend 與 resume 之間呼叫，補值的 UPDATE 才不會逐列記錄。
+        """
+        if not deleted:
+            conn.execute(f'UPDATE {table} SET sync_uid = {NEW_UID} WHERE sync_uid IS NULL AND ({condition})', params)
+        conn.execute(f'''
+            INSERT OR REPLACE INTO Change_Log (table_name, sync_uid, deleted, changed_at, origin)
+            SELECT '{table}', sync_uid, {int(deleted)}, {_NOW}, {_ORIGIN} FROM {table}
+            WHERE sync_uid IS NOT NULL AND ({condition})
+        ''', params)
+
+    @staticmethod
+    def origin(conn):
+        return conn.execute('SELECT origin FROM Sync_State WHERE id = 1').fetchone()[0]
+
+    @staticmethod
+    def peer(conn, origin):
+        """返回 (received_seq, sent_seq)"""
+        row = conn.execute('SELECT received_seq, sent_seq FROM Sync_Peers WHERE origin = ?', (origin,)).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    @staticmethod
+    def _uid_map(conn, table, column, values):
+        """{值: 另一欄} 的批次查詢，例如 sync_uid -> 主鍵或主鍵 -> sync_uid"""
+        pk = SYNCED_TABLES[table][0]
+        other = pk if column == 'sync_uid' else 'sync_uid'
+        values = [v for v in set(values) if v is not None]
+        found = {}
+        for start in range(0, len(values), Sync.chunk_size):
+            chunk = values[start:start + Sync.chunk_size]
+            found.update(conn.execute(f'SELECT {column}, {other} FROM {table} WHERE {column} IN ({",".join("?" * len(chunk))})',
+                                      chunk).fetchall())
+        return found
+
+    @classmethod
+    def export_changes(cls, conn, since=0, exclude_origin=None):
+        """
+        匯出 seq > since 的變更，返回可序列化為 JSON 的變更包。
+        exclude_origin 為接收方的 origin：最後由接收方自己寫入的變更不必送回。
+        """
+        entries = conn.execute('''
+            SELECT seq, table_name, sync_uid, deleted, changed_at, origin FROM Change_Log
+            WHERE seq > ? ORDER BY seq
+        ''', (since,)).fetchall()
+        until = entries[-1][0] if entries else since
+        entries = [e for e in entries if e[5] != exclude_origin]
+        rows = {}
+        for table, (pk, columns, references) in SYNCED_TABLES.items():
+            uids = [e[2] for e in entries if e[1] == table and not e[3]]
+            for start in range(0, len(uids), cls.chunk_size):
+                chunk = uids[start:start + cls.chunk_size]
+                for values in conn.execute(f'SELECT sync_uid, {", ".join(columns)} FROM {table} WHERE sync_uid IN ({",".join("?" * len(chunk))})',
+                                           chunk).fetchall():
+                    rows[(table, values[0])] = dict(zip(columns, values[1:]))
+            # 外鍵改為參照資料列的 sync_uid
+            for column, target in references.items():
+                table_rows = [row for (t, _), row in rows.items() if t == table]
+                uid_of = cls._uid_map(conn, target, SYNCED_TABLES[target][0], [row[column] for row in table_rows])
+                for row in table_rows:
+                    row[column] = uid_of.get(row[column])
+        changes = [[table, uid, deleted, changed_at, origin, rows.get((table, uid)) if not deleted else None]
+                   for _, table, uid, deleted, changed_at, origin in entries
+                   if deleted or (table, uid) in rows]
+        return {'format': FORMAT_VERSION, 'origin': cls.origin(conn), 'since': since, 'until': until, 'changes': changes}
+
+    @classmethod
+    def apply_changes(cls, conn, package, events=None):
+        """
+        在目前交易中套用變更包，返回 {'applied', 'skipped', 'conflicts'}。
+        只套用比本地最後變更新的版本，並以遠端的 changed_at／origin 記入本地 Change_Log（以便轉送給其他分店）。
+        events 為列表時加入支出的 (資料表, 動作, 主鍵)，供寫入佇列發布變更事件。
+        """
+        if package.get('format') != FORMAT_VERSION:
+            raise ValueError(f"不支援的同步格式：{package.get('format')}")
+        local_origin = cls.origin(conn)
+        if package['origin'] == local_origin:
+            raise ValueError("變更包來自相同的分店識別碼；複製資料庫建立新分店後請先執行 python sync.py init-branch")
+        stats = {'applied': 0, 'skipped': 0, 'conflicts': 0}
+        order = list(SYNCED_TABLES)
+        changes = sorted(package['changes'], key=lambda c: order.index(c[0]) if not c[2] else len(order) * 2 - order.index(c[0]))
+        now = datetime.now().isoformat(timespec='seconds')
+        conn.execute('UPDATE Sync_State SET applying = 1 WHERE id = 1')
+        pending_parents = []  # (本地 customer_treatment_id, 補脫來源 sync_uid)
+        try:
+            for change in changes:
+                table, uid, deleted, changed_at, origin, row = change
+                local = conn.execute('SELECT changed_at, origin FROM Change_Log WHERE table_name = ? AND sync_uid = ?',
+                                     (table, uid)).fetchone()
+                if local is not None and (local[0], local[1]) >= (changed_at, origin):
+                    stats['skipped'] += 1
+                    continue
+                reason = cls._delete(conn, table, uid, events) if deleted else cls._upsert(conn, table, uid, row, pending_parents, events)
+                if reason is not None:
+                    conn.execute('INSERT INTO Sync_Conflicts (table_name, sync_uid, reason, change, recorded_at) VALUES (?, ?, ?, ?, ?)',
+                                 (table, uid, reason, json.dumps(change, ensure_ascii=False), now))
+                    stats['conflicts'] += 1
+                    continue
+                conn.execute('INSERT OR REPLACE INTO Change_Log (table_name, sync_uid, deleted, changed_at, origin) VALUES (?, ?, ?, ?, ?)',
+                             (table, uid, deleted, changed_at, origin))
+                stats['applied'] += 1
+            parent_ids = cls._uid_map(conn, 'Customer_Treatments', 'sync_uid', [uid for _, uid in pending_parents])
+            conn.executemany('UPDATE Customer_Treatments SET retouch_parent_id = ? WHERE customer_treatment_id = ?',
+                             [(parent_ids.get(uid), local_id) for local_id, uid in pending_parents])
+        finally:
+            conn.execute('UPDATE Sync_State SET applying = 0 WHERE id = 1')
+        conn.execute('''
+            INSERT INTO Sync_Peers (origin, received_seq, last_sync) VALUES (?, ?, ?)
+            ON CONFLICT (origin) DO UPDATE SET received_seq = MAX(received_seq, excluded.received_seq), last_sync = excluded.last_sync
+        ''', (package['origin'], package['until'], now))
+        return stats
+
+    @staticmethod
+    def _delete(conn, table, uid, events):
+        pk = SYNCED_TABLES[table][0]
+        row = conn.execute(f'SELECT {pk} FROM {table} WHERE sync_uid = ?', (uid,)).fetchone()
+        if row is not None:
+            conn.execute(f'DELETE FROM {table} WHERE {pk} = ?', (row[0],))
+            if table == 'Expenses' and events is not None:
+                events.append((table, DELETE, row[0]))
+        return None
+
+    @classmethod
+    def _upsert(cls, conn, table, uid, row, pending_parents, events):
+        """更新或新增一列；返回衝突原因，成功時返回 None"""
+        pk, columns, references = SYNCED_TABLES[table]
+        values = dict(row)
+        for column, target in references.items():
+            if column == 'retouch_parent_id':
+                continue  # 補脫來源可能在同一批稍後才新增，全部套用後再設定
+            if values[column] is not None:
+                local_id = cls._uid_map(conn, target, 'sync_uid', [values[column]]).get(values[column])
+                if local_id is None:
+                    return f"參照的 {target} 資料列不存在：{values[column]}"
+                values[column] = local_id
+        parent_uid = values.pop('retouch_parent_id', None)
+        assignments = [c for c in columns if c != 'retouch_parent_id']
+        params = [values[c] for c in assignments]
+        existing = conn.execute(f'SELECT {pk} FROM {table} WHERE sync_uid = ?', (uid,)).fetchone()
+        try:
+            if existing is not None:
+                local_id = existing[0]
+                conn.execute(f'UPDATE {table} SET {", ".join(f"{c} = ?" for c in assignments)} WHERE {pk} = ?', params + [local_id])
+            else:
+                cursor = conn.execute(f'INSERT INTO {table} ({", ".join(assignments)}, sync_uid) VALUES ({", ".join("?" * len(assignments))}, ?)',
+                                      params + [uid])
+                local_id = cursor.lastrowid
+        except sqlite3.IntegrityError as e:
+            return f"違反資料限制：{str(e)}"
+        if table == 'Customer_Treatments':
+            pending_parents.append((local_id, parent_uid))
+        elif table == 'Expenses' and events is not None:
+            events.append((table, UPDATE if existing is not None else INSERT, local_id))
+        return None
+
+    @classmethod
+    def pull(cls, target, source):
+        """target 取得 source 在水位之後的變更並套用（單一交易），返回統計"""
+        source_origin = cls.origin(source)
+        received, _ = cls.peer(target, source_origin)
+        package = cls.export_changes(source, received, exclude_origin=cls.origin(target))
+        target.execute('BEGIN IMMEDIATE')
+        try:
+            stats = cls.apply_changes(target, package)
+            target.execute('COMMIT')
+        except BaseException:
+            target.execute('ROLLBACK')
+            raise
+        return dict(stats, received=len(package['changes']))
+
+    @staticmethod
+    def open(db_path):
+        """開啟（並遷移）另一個資料庫檔案，供本機兩檔同步使用"""
+        from migrations import Migrations
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        Migrations.migrate(conn)
+        return conn
+
+    @classmethod
+    def sync_files(cls, path_a, path_b):
+        """同步兩個本機資料庫檔案（雙向），返回 (A 的統計, B 的統計)"""
+        a, b = cls.open(path_a), cls.open(path_b)
+        try:
+            a_stats = cls.pull(a, b)
+            b_stats = cls.pull(b, a)
+        finally:
+            a.close()
+            b.close()
+        logging.info(f"同步 {path_a} ⇄ {path_b}：{a_stats}／{b_stats}")
+        return a_stats, b_stats
+
+    @classmethod
+    def export_file(cls, path, peer=None, since=None):
+        """
+        將變更包寫入 JSON 檔（經由檔案與其他分店交換），返回變更數。
+        指定 peer（對方的 origin）時預設由上次匯出給對方的水位開始，並於寫出後更新該水位。
+        """
+        conn = ConnectionManager.get_connection()
+        if since is None:
+            since = cls.peer(conn, peer)[1] if peer else 0
+        package = cls.export_changes(conn, since, exclude_origin=peer)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(package, f, ensure_ascii=False)
+        if peer:
+            DatabaseExecutor.submit_transaction(lambda c: c.execute('''
+                INSERT INTO Sync_Peers (origin, sent_seq) VALUES (?, ?)
+                ON CONFLICT (origin) DO UPDATE SET sent_seq = MAX(sent_seq, excluded.sent_seq)
+            ''', (peer, package['until']))).result()
+        logging.info(f"已匯出 {len(package['changes'])} 筆同步變更至 {path}（seq {since} 至 {package['until']}）")
+        return len(package['changes'])
+
+    @classmethod
+    def import_file(cls, path):
+        """由 JSON 檔套用其他分店的變更（經由寫入佇列，提交後通知各快取），返回統計"""
+        with open(path, encoding='utf-8') as f:
+            package = json.load(f)
+
+        def work(conn):
+            events = []
+            stats = cls.apply_changes(conn, package, events)
+            for event in events:
+                ChangeEvents.record(*event)
+            return stats
+
+        stats = DatabaseExecutor.submit_transaction(work, tuple(SYNCED_TABLES)).result()
+        logging.info(f"已由 {path} 套用同步變更：{stats}")
+        return stats
+
+    @staticmethod
+    def reset_origin(conn):
+        """
+        資料庫回到較早的時間點（由備份還原）後執行，返回新 origin。
+        Change_Log 的 seq 已倒退，其他分店對舊 origin 記錄的水位不再適用，因此改用新的 origin，
+        其他分店下次同步時由頭取得本分店的變更（已存在的版本會略過）；已送出的水位一併歸零。
+        已接收其他分店的水位仍與還原後的資料一致，予以保留：還原後遺失、但已同步出去的變更會在下次同步時取回。
+        """
+        conn.execute('UPDATE Sync_State SET origin = lower(hex(randomblob(8))) WHERE id = 1')
+        conn.execute('UPDATE Sync_Peers SET sent_seq = 0')
+        return Sync.origin(conn)
+
+    @staticmethod
+    def init_branch(conn):
+        """
+        複製資料庫檔案建立新分店後執行：產生新的 origin，並將來源分店記為已同步到目前的水位，
+        第一次同步便不必重送複製時已有的資料。返回 (舊 origin, 新 origin)。
+        """
+        old = Sync.origin(conn)
+        until = conn.execute('SELECT IFNULL(MAX(seq), 0) FROM Change_Log').fetchone()[0]
+        conn.execute('UPDATE Sync_State SET origin = lower(hex(randomblob(8))) WHERE id = 1')
+        conn.execute('DELETE FROM Sync_Peers')
+        conn.execute('INSERT INTO Sync_Peers (origin, received_seq, sent_seq, last_sync) VALUES (?, ?, ?, ?)',
+                     (old, until, until, datetime.now().isoformat(timespec='seconds')))
+        return old, Sync.origin(conn)
+
+
+def main(argv):
+    """
+    命令列：
+      python sync.py status
+      python sync.py export 檔案 [對方 origin | --since N]
+      python sync.py import 檔案
+      python sync.py local 資料庫A 資料庫B     （同步本機兩個資料庫檔案）
+      python sync.py init-branch              （複製資料庫建立新分店後執行一次）
+    """
+    args = argv[1:]
+    command = args[0] if args else 'status'
+    if command == 'local' and len(args) == 3:
+        a_stats, b_stats = Sync.sync_files(args[1], args[2])
+        print(f"{args[1]}：{a_stats}\n{args[2]}：{b_stats}")
+        return 0
+    from database import Database
+    Database.initialize_database()
+    try:
+        conn = ConnectionManager.get_connection()
+        if command == 'status':
+            print(f"本分店 origin：{Sync.origin(conn)}")
+            print(f"Change_Log：{conn.execute('SELECT COUNT(*), IFNULL(MAX(seq), 0) FROM Change_Log').fetchone()[:]}")
+            for row in conn.execute('SELECT origin, received_seq, sent_seq, last_sync FROM Sync_Peers ORDER BY origin'):
+                print(f"分店 {row[0]}：已接收至 {row[1]}，已送出至 {row[2]}，上次同步 {row[3]}")
+            conflicts = conn.execute('SELECT COUNT(*) FROM Sync_Conflicts').fetchone()[0]
+            if conflicts:
+                print(f"{conflicts} 筆變更無法自動套用，請查看 Sync_Conflicts")
+        elif command == 'export' and len(args) >= 2:
+            since = int(args[3]) if len(args) > 3 and args[2] == '--since' else None
+            peer = args[2] if len(args) > 2 and args[2] != '--since' else None
+            print(f"已匯出 {Sync.export_file(args[1], peer, since)} 筆變更")
+        elif command == 'import' and len(args) == 2:
+            print(Sync.import_file(args[1]))
+        elif command == 'init-branch':
+            old, new = DatabaseExecutor.submit_transaction(Sync.init_branch).result()
+            print(f"已建立新分店 origin {new}（來源分店 {old}）")
+        else:
+            print(main.__doc__)
+            return 2
+        return 0
+    finally:
+        DatabaseExecutor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,144 @@
+import random
+import sys
+from datetime import date, timedelta
+from database import Database, ConnectionManager, DatabaseExecutor
+from treatment_catalog import TreatmentCatalog
+from aggregates import Aggregates, SUMMARY_TABLES
+from sync import Sync, SYNCED_TABLES
+from constants import DEFAULT_CATEGORIES, NECK_SURCHARGE, RETOUCH_ELIGIBLE_TREATMENTS, RETOUCH_WINDOW_DAYS, logging
+
+SURNAMES = '陳林黃張李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周徐蘇葉莊呂江何蕭羅高潘簡朱鍾彭游詹胡施沈余趙盧梁顏柯翁魏孫戴'
+GIVEN_NAMES = '怡君雅婷佳穎欣怡淑芬美玲志明家豪俊傑宜蓁詩涵心怡筱雯惠如秀英麗華建宏冠宇子晴品妤'
+CONTACT_METHODS = ('WhatsApp', 'WhatsApp', 'WhatsApp', '電話', 'Instagram', 'Facebook', '')
+START_DATE = date(2020, 1, 1)  # 固定起始日，確保同一 seed 產生相同資料
+
+
+class SyntheticData:
+    """
+    以固定 seed 產生可重現的測試資料：使用正式的資料庫結構（遷移）及 DEFAULT_TREATMENTS、DEFAULT_CATEGORIES，
+    客戶、療程記錄（含補脫及頸部加價）與支出依比例產生，整批寫入後一次重建彙總表。
+    """
+    chunk_size = 20000
+    visits_per_customer = 8  # 平均每位客戶的療程次數
+    expenses_per_day = 2
+
+    def __init__(self, seed=42):
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def open(db_path):
+        """切換至 db_path 並建立／遷移資料庫結構"""
+        DatabaseExecutor.shutdown()
+        ConnectionManager.configure(db_path)
+        Database.initialize_database()
+        TreatmentCatalog.invalidate()
+
+    def generate(self, db_path, treatments=10000, customers=None, days=None):
+        """產生 treatments 筆療程記錄；返回各資料表筆數"""
+        self.open(db_path)
+        customers = customers or max(1, treatments // self.visits_per_customer)
+        days = days or max(30, min(3650, treatments // 20))
+        counts = {
+            'Customers': self._write('Customers', self._customers(customers)),
+            'Customer_Treatments': self._write('Customer_Treatments', self._treatments(treatments, customers, days)),
+            'Expenses': self._write('Expenses', self._expenses(days)),
+        }
+        DatabaseExecutor.submit_transaction(Aggregates._rebuild_with, tuple(SUMMARY_TABLES)).result()
+        logging.info(f"已產生測試資料 {db_path}：{counts}")
+        return counts
+
+    _INSERTS = {
+        'Customers': 'INSERT INTO Customers (name, contact_method, unique_mark) VALUES (?, ?, ?)',
+        'Customer_Treatments': '''INSERT INTO Customer_Treatments
+            (customer_treatment_id, customer_id, treatment_id, treatment_date, is_peak, neck_treatment, price, retouch_parent_id, remaining_retouch_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        'Expenses': 'INSERT INTO Expenses (expense_date, category, amount, description) VALUES (?, ?, ?, ?)',
+    }
+
+    def _write(self, table, rows):
+        """每 chunk_size 筆一個交易；寫入期間暫停彙總觸發器（最後統一重建）及逐列同步記錄（每批一次記錄）"""
+        pk = SYNCED_TABLES[table][0]
+
+        def work(conn, chunk):
+            last_id = conn.execute(f'SELECT COALESCE(MAX({pk}), 0) FROM {table}').fetchone()[0]
+            Aggregates.suspend(conn)
+            Sync.suspend(conn)
+            try:
+                conn.executemany(self._INSERTS[table], chunk)
+                Sync.log_rows(conn, table, f'{pk} > ?', (last_id,))
+            finally:
+                Sync.resume(conn)
+                Aggregates.resume(conn)
+        total = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                DatabaseExecutor.submit_transaction(lambda conn, c=chunk: work(conn, c), (table,)).result()
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            DatabaseExecutor.submit_transaction(lambda conn: work(conn, chunk), (table,)).result()
+            total += len(chunk)
+        return total
+
+    def _customers(self, count):
+        rnd = self.random
+        for _ in range(count):
+            name = rnd.choice(SURNAMES) + ''.join(rnd.choice(GIVEN_NAMES) for _ in range(rnd.choice((1, 2))))
+            yield name, rnd.choice(CONTACT_METHODS), rnd.choice(('', '', '', 'A', 'B'))
+
+    def _treatments(self, count, customers, days):
+        """療程記錄依日期遞增產生；約一成可享補脫的療程（RETOUCH_ELIGIBLE_TREATMENTS）會在期限內接一筆免費補脫"""
+        rnd = self.random
+        entries = [e for e in TreatmentCatalog.entries() if e.name != '補脫療程']
+        weights = [1 if e.is_combo else 4 for e in entries]
+        retouch = TreatmentCatalog.by_name('補脫療程')
+        eligible = set(TreatmentCatalog.ids_for_names(RETOUCH_ELIGIBLE_TREATMENTS))
+        next_id = Database.execute('SELECT COALESCE(MAX(customer_treatment_id), 0) as id FROM Customer_Treatments', fetch=True)[0]['id'] + 1
+        first_customer = Database.execute('SELECT COALESCE(MAX(customer_id), 0) as id FROM Customers', fetch=True)[0]['id'] - customers + 1
+        written = 0
+        for i in range(count):
+            if written >= count:
+                break  # 補脫記錄也計入筆數
+            day = (START_DATE + timedelta(days=i * days // count)).isoformat()
+            customer_id = first_customer + int(customers * rnd.random() ** 2)  # 偏向較小的 id：少數常客佔多數消費
+            entry = rnd.choices(entries, weights)[0]
+            is_peak = 1 if rnd.random() < 0.6 else 0
+            neck = 1 if entry.can_add_neck and rnd.random() < 0.3 else 0
+            price = (entry.peak_price if is_peak else entry.non_peak_price) + (NECK_SURCHARGE if neck else 0)
+            yield next_id, customer_id, entry.treatment_id, day, is_peak, neck, price, None, 1
+            parent_id = next_id
+            next_id += 1
+            written += 1
+            if retouch and entry.treatment_id in eligible and rnd.random() < 0.1 and written < count:
+                later = (date.fromisoformat(day) + timedelta(days=rnd.randint(7, RETOUCH_WINDOW_DAYS))).isoformat()
+                yield next_id, customer_id, retouch.treatment_id, later, 0, 0, 0, parent_id, 0
+                next_id += 1
+                written += 1
+
+    def _expenses(self, days):
+        rnd = self.random
+        for offset in range(days):
+            day = (START_DATE + timedelta(days=offset)).isoformat()
+            for _ in range(rnd.randint(0, self.expenses_per_day * 2)):
+                category = rnd.choice(DEFAULT_CATEGORIES)
+                yield day, category, round(rnd.lognormvariate(6.5, 1.0), 2), rnd.choice(('', '', f'{category}單據'))
+
+
+def main(argv):
+    """命令列：python synthetic_data.py <輸出.db> [療程筆數] [seed]"""
+    if len(argv) < 2:
+        print(main.__doc__)
+        return 2
+    treatments = int(argv[2]) if len(argv) > 2 else 10000
+    seed = int(argv[3]) if len(argv) > 3 else 42
+    try:
+        print(SyntheticData(seed).generate(argv[1], treatments))
+    finally:
+        DatabaseExecutor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,258 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from constants import logging
+
+INTERACTIVE = 'interactive'  # 使用者正在等待的查詢與畫面更新
+BACKGROUND = 'background'    # 匯出、分析等耗時工作
+
+
+class TaskRejected(RuntimeError):
+    """排程佇列已滿"""
+
+
+class Task:
+    """排程中的工作；future 在背景執行緒完成，回呼在 Tk 主執行緒執行"""
+    __slots__ = ('fn', 'args', 'key', 'priority', 'on_success', 'on_error', 'future', 'cancelled', 'submitted')
+
+    def __init__(self, fn, args, key, priority, on_success, on_error):
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.priority = priority
+        self.on_success = on_success
+        self.on_error = on_error
+        self.future = Future()
+        self.cancelled = threading.Event()  # 長時間工作可自行檢查以提早結束
+        self.submitted = time.perf_counter()
+
+    def cancel(self):
+        """取消工作：尚未開始者不再執行，已開始者的結果不會交給回呼；deliver() 的 Future 屬於呼叫端，不取消"""
+        self.cancelled.set()
+        if self.fn is not None:
+            self.future.cancel()
+
+
+class TaskScheduler:
+    """
+    共用背景工作排程器：
+    - 有界的工作執行緒池及等待佇列，佇列已滿時拒絕新工作；
+    - 以 key 標記的工作，同 key 的新工作會取消尚未交付的舊工作（例如快速切換月份時只保留最後一次更新）；
+    - 互動工作優先於背景工作，背景工作最多佔用 worker_count - 1 條執行緒；
+    - 所有回呼經由單一佇列，由 Tk 主執行緒以一個 after 迴圈取出執行，背景執行緒不直接呼叫 Tk。
+    """
+    worker_count = 3
+    max_queued = 200
+    poll_ms = 20
+
+    _lock = threading.Lock()
+    _available = threading.Condition(_lock)
+    _queues = {INTERACTIVE: deque(), BACKGROUND: deque()}
+    _latest = {}  # key -> 最新的 Task
+    _workers = []
+    _running = {INTERACTIVE: 0, BACKGROUND: 0}
+    _stopping = False
+    _handoff = queue.SimpleQueue()  # (task 或 None, callback, 參數)
+    _master = None
+    _stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'superseded': 0, 'dropped': 0, 'rejected': 0,
+              'peak_queued': 0, 'max_wait_ms': 0.0}
+
+    @classmethod
+    def install(cls, master):
+        """在 Tk 主執行緒呼叫一次，開始輪詢回呼佇列（重複呼叫無副作用）"""
+        if cls._master is master:
+            return
+        cls._master = master
+        master.after(cls.poll_ms, cls._drain)
+
+    @classmethod
+    def _start_workers(cls):
+        """呼叫端須持有 _lock"""
+        cls._stopping = False
+        cls._workers = [t for t in cls._workers if t.is_alive()]
+        while len(cls._workers) < cls.worker_count:
+            worker = threading.Thread(target=cls._worker_loop, name=f'task-worker-{len(cls._workers)}', daemon=True)
+            cls._workers.append(worker)
+            worker.start()
+
+    @classmethod
+    def _supersede(cls, key, task):
+        """呼叫端須持有 _lock；取消同 key 的舊工作"""
+        previous = cls._latest.get(key)
+        if previous is not None and not previous.cancelled.is_set():
+            previous.cancel()
+            cls._stats['superseded'] += 1
+        cls._latest[key] = task
+
+    @classmethod
+    def submit(cls, fn, *args, key=None, priority=INTERACTIVE, on_success=None, on_error=None):
+        """
+        在工作執行緒執行 fn(*args)，完成後在 Tk 主執行緒呼叫 on_success(結果) 或 on_error(例外)。
+        返回 Task；佇列已滿時 future 以 TaskRejected 完成並呼叫 on_error。
+        """
+        task = Task(fn, args, key, priority, on_success, on_error)
+        with cls._lock:
+            cls._stats['submitted'] += 1
+            queued = sum(len(q) for q in cls._queues.values())
+            if queued >= cls.max_queued:
+                cls._stats['rejected'] += 1
+                rejected = True
+            else:
+                rejected = False
+                if key is not None:
+                    cls._supersede(key, task)
+                cls._queues[priority].append(task)
+                cls._stats['peak_queued'] = max(cls._stats['peak_queued'], queued + 1)
+                cls._start_workers()
+                cls._available.notify()
+        if rejected:
+            logging.warning(f"背景工作佇列已滿（{cls.max_queued}），拒絕工作 {key or getattr(fn, '__name__', fn)}")
+            task.future.set_exception(TaskRejected("背景工作過多，請稍後再試"))
+            cls._post_result(task)
+        return task
+
+    @classmethod
+    def deliver(cls, future, on_success, on_error=None, key=None):
+        """既有 Future 完成後，經由回呼佇列在 Tk 主執行緒呼叫 on_success／on_error；同 key 的舊結果會被捨棄"""
+        task = Task(None, (), key, INTERACTIVE, on_success, on_error)
+        task.future = future
+        if key is not None:
+            with cls._lock:
+                cls._supersede(key, task)
+        future.add_done_callback(lambda f: cls._post_result(task))
+        return task
+
+    @classmethod
+    def post(cls, callback, *args, key=None):
+        """從任何執行緒要求在 Tk 主執行緒呼叫 callback(*args)；同 key 尚未執行的呼叫只保留最後一次"""
+        task = None
+        if key is not None:
+            task = Task(None, (), key, INTERACTIVE, None, None)
+            with cls._lock:
+                cls._supersede(key, task)
+        cls._enqueue(task, callback, args)
+
+    @classmethod
+    def _post_result(cls, task):
+        future = task.future
+        if future.cancelled():
+            cls._enqueue(task, None, ())
+            return
+        error = future.exception()
+        if error is None:
+            cls._enqueue(task, task.on_success, (future.result(),))
+        elif task.on_error is not None:
+            cls._enqueue(task, task.on_error, (error,))
+        else:
+            logging.error(f"背景工作失敗：{str(error)}")
+            cls._enqueue(task, None, ())
+
+    @classmethod
+    def _enqueue(cls, task, callback, args):
+        if cls._master is None:
+            # 沒有 Tk 主迴圈（命令列或測試）時直接在目前執行緒呼叫
+            cls._run_callback(task, callback, args)
+        else:
+            cls._handoff.put((task, callback, args))
+
+    @classmethod
+    def _run_callback(cls, task, callback, args):
+        if task is not None:
+            with cls._lock:
+                stale = task.cancelled.is_set()
+                if stale:
+                    cls._stats['dropped'] += 1
+                if task.key is not None and cls._latest.get(task.key) is task:
+                    del cls._latest[task.key]
+            if stale:
+                return
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            logging.error(f"背景工作回呼失敗：{str(e)}")
+
+    @classmethod
+    def _drain(cls):
+        """Tk 主執行緒：執行所有已完成工作的回呼，再排定下一次輪詢"""
+        try:
+            while True:
+                try:
+                    task, callback, args = cls._handoff.get_nowait()
+                except queue.Empty:
+                    break
+                cls._run_callback(task, callback, args)
+        finally:
+            if cls._master is not None:
+                try:
+                    cls._master.after(cls.poll_ms, cls._drain)
+                except Exception:
+                    cls._master = None  # 視窗已關閉
+
+    @classmethod
+    def _next_task(cls):
+        """呼叫端須持有 _lock；互動工作優先，背景工作須保留至少一條執行緒給互動工作"""
+        if cls._queues[INTERACTIVE]:
+            return cls._queues[INTERACTIVE].popleft()
+        if cls._queues[BACKGROUND] and cls._running[BACKGROUND] < max(1, cls.worker_count - 1):
+            return cls._queues[BACKGROUND].popleft()
+        return None
+
+    @classmethod
+    def _worker_loop(cls):
+        while True:
+            with cls._lock:
+                task = cls._next_task()
+                while task is None:
+                    if cls._stopping:
+                        return
+                    cls._available.wait()
+                    task = cls._next_task()
+                cls._running[task.priority] += 1
+                wait_ms = (time.perf_counter() - task.submitted) * 1000
+                cls._stats['max_wait_ms'] = max(cls._stats['max_wait_ms'], wait_ms)
+            try:
+                if task.future.set_running_or_notify_cancel():
+                    try:
+                        task.future.set_result(task.fn(*task.args))
+                        cls._count('completed')
+                    except BaseException as e:
+                        task.future.set_exception(e)
+                        cls._count('failed')
+                cls._post_result(task)
+            finally:
+                with cls._lock:
+                    cls._running[task.priority] -= 1
+                    cls._available.notify()
+
+    @classmethod
+    def _count(cls, name):
+        with cls._lock:
+            cls._stats[name] += 1
+
+    @classmethod
+    def shutdown(cls, wait=True):
+        """取消尚未開始的工作，並等待執行中的工作結束"""
+        with cls._lock:
+            cls._stopping = True
+            for pending in cls._queues.values():
+                while pending:
+                    pending.popleft().cancel()
+            workers, cls._workers = cls._workers, []
+            cls._available.notify_all()
+        if wait:
+            for worker in workers:
+                worker.join()
+        cls._master = None
+
+    @classmethod
+    def stats(cls):
+        """佇列深度、執行中工作數及累計統計"""
+        with cls._lock:
+            return dict(cls._stats, queued_interactive=len(cls._queues[INTERACTIVE]),
+                        queued_background=len(cls._queues[BACKGROUND]),
+                        running=cls._running[INTERACTIVE] + cls._running[BACKGROUND],
+                        pending_callbacks=cls._handoff.qsize(), max_wait_ms=round(cls._stats['max_wait_ms'], 1))
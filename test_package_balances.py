@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+from database import Database, ConnectionManager, DatabaseExecutor
+from package_balances import PackageBalances
+
+PACKAGE_TREATMENT = '組合療程：Einxel Plus膠原修復針 6次包套'
+
+
+class PackageBalancesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        ConnectionManager.configure(os.path.join(self.directory.name, 'test.db'))
+        Database.initialize_database()
+        self.treatment_id = Database.execute('SELECT treatment_id FROM Treatments WHERE name = ?',
+                                             (PACKAGE_TREATMENT,), fetch=True)[0]['treatment_id']
+        self.customer_id = Database.execute("INSERT INTO Customers (name, contact_method) VALUES ('測試', '')")
+
+    def tearDown(self):
+        DatabaseExecutor.shutdown()
+        ConnectionManager.close_all()
+        self.directory.cleanup()
+
+    def add_session(self, treatment_date, remaining_sessions):
+        return Database.execute('''
+            INSERT INTO Customer_Treatments (customer_id, treatment_id, treatment_date, price, remaining_sessions)
+            VALUES (?, ?, ?, 0, ?)
+        ''', (self.customer_id, self.treatment_id, treatment_date, remaining_sessions))
+
+    def test_delete_newest_session_after_null_remaining_sessions(self):
+        self.add_session('2024-01-01', None)
+        newest = self.add_session('2024-02-01', 4)
+        Database.execute('DELETE FROM Customer_Treatments WHERE customer_treatment_id = ?', (newest,))
+        balance = PackageBalances.latest(self.customer_id, self.treatment_id)
+        self.assertEqual(balance['remaining_sessions'], 0)
+        self.assertEqual(balance['session_count'], 1)
+        self.assertEqual(PackageBalances.verify(), [])
+
+    def test_edit_session_with_null_remaining_sessions(self):
+        session = self.add_session('2024-01-01', 3)
+        Database.execute('UPDATE Customer_Treatments SET remaining_sessions = NULL WHERE customer_treatment_id = ?', (session,))
+        self.assertEqual(PackageBalances.latest(self.customer_id, self.treatment_id)['remaining_sessions'], 0)
+        self.assertEqual(PackageBalances.verify(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
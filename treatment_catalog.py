@@ -0,0 +1,98 @@
+import threading
+from database import Database
+from constants import NECK_SURCHARGE
+
+
+class TreatmentEntry:
+    """單一療程的唯讀資料"""
+    __slots__ = ('treatment_id', 'name', 'peak_price', 'non_peak_price', 'is_combo', 'can_add_neck', 'has_remaining_sessions')
+
+    def __init__(self, row):
+        for field in self.__slots__:
+            setattr(self, field, row[field])
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class TreatmentCatalog:
+    """
+    療程目錄的記憶體快取：依 id、名稱及所有可能的價格建立索引，
+    價格包含 Peak、非 Peak，以及 can_add_neck 療程加頸部後的價格。
+    Treatments 資料表有寫入時自動失效，下次查詢時重新載入。
+    """
+    _lock = threading.Lock()
+    _loaded = False
+    _version = 0  # 每次失效遞增，避免載入期間的寫入被舊資料覆蓋
+    _by_id = {}
+    _by_name = {}
+    _by_price = {}  # price -> [(entry, neck_price), ...]
+
+    @classmethod
+    def load(cls):
+        version = cls._version
+        rows = Database.execute('''
+            SELECT treatment_id, name, peak_price, non_peak_price, is_combo, can_add_neck, has_remaining_sessions
+            FROM Treatments ORDER BY treatment_id
+        ''', fetch=True)
+        by_id, by_name, by_price = {}, {}, {}
+        for row in rows:
+            entry = TreatmentEntry(row)
+            by_id[entry.treatment_id] = entry
+            by_name[entry.name] = entry
+            prices = {(entry.peak_price, False), (entry.non_peak_price, False)}
+            if entry.can_add_neck:
+                prices |= {(entry.peak_price + NECK_SURCHARGE, True), (entry.non_peak_price + NECK_SURCHARGE, True)}
+            for price, neck_price in sorted(prices):
+                matches = by_price.setdefault(price, [])
+                if all(existing is not entry for existing, _ in matches):
+                    matches.append((entry, neck_price))
+        with cls._lock:
+            cls._by_id, cls._by_name, cls._by_price = by_id, by_name, by_price
+            cls._loaded = version == cls._version
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._loaded = False
+            cls._version += 1
+
+    @classmethod
+    def _ensure_loaded(cls):
+        if not cls._loaded:
+            cls.load()
+
+    @classmethod
+    def get(cls, treatment_id):
+        cls._ensure_loaded()
+        return cls._by_id.get(treatment_id)
+
+    @classmethod
+    def by_name(cls, name):
+        cls._ensure_loaded()
+        return cls._by_name.get(name)
+
+    @classmethod
+    def ids_for_names(cls, names):
+        """將療程名稱轉為 treatment_id 列表（忽略不存在的名稱）"""
+        cls._ensure_loaded()
+        return [cls._by_name[name].treatment_id for name in names if name in cls._by_name]
+
+    @classmethod
+    def match_price(cls, price):
+        """返回價格相符的療程 dict 列表（含 neck_price 旗標），依 treatment_id 排序"""
+        try:
+            price = float(price)  # 與 SQLite 比較 REAL 欄位時相同，接受數字字串
+        except (TypeError, ValueError):
+            return []
+        cls._ensure_loaded()
+        matches = cls._by_price.get(price, ())
+        return [dict(entry.as_dict(), neck_price=neck_price) for entry, neck_price in matches]
+
+    @classmethod
+    def entries(cls):
+        cls._ensure_loaded()
+        return list(cls._by_id.values())
+
+
+Database.add_write_listener(lambda tables: TreatmentCatalog.invalidate() if 'Treatments' in tables else None)
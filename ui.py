@@ -2,21 +2,30 @@ from tkinter import Tk, ttk, StringVar, messagebox
 from client_ui import ClientUI
 from finance_ui import FinanceUI
 from stats_ui import StatsUI
+from diagnostics_ui import DiagnosticsWindow
 from database import Database
+from startup_timing import StartupTimer
+from task_scheduler import TaskScheduler, BACKGROUND
+from backup import Backup
 from constants import logging
 
 class Application:
+    backup_delay_ms = 60 * 1000  # 啟動後多久第一次檢查是否需要備份
+    backup_check_ms = 60 * 60 * 1000
+
     def __init__(self, master):
         self.master = master
         self.master.title("美容工作室管理系統")
         self.master.geometry("1400x800")
         self.master.configure(bg="#E8ECEF")
         self.status_var = StringVar(value="歡迎使用美容工作室管理系統")
+        TaskScheduler.install(self.master)  # 背景工作的回呼都經由此輪詢交回主執行緒
 
         try:
             # 初始化資料庫
             Database.initialize_database()
             self.status_var.set("資料庫初始化完成")
+            StartupTimer.mark('database')
         except Exception as e:
             logging.error(f"資料庫初始化失敗: {str(e)}")
             messagebox.showerror("錯誤", f"應用程式啟動失敗：{str(e)}")
@@ -28,6 +37,10 @@ class Application:
         self.finance_ui = FinanceUI(self.notebook, self)
         self.stats_ui = StatsUI(self.notebook, self)
         self.notebook.pack(expand=True, fill="both", padx=10, pady=10)
+        # 標籤頁延遲建立：只建立目前顯示的標籤頁，其餘在第一次切換時建立
+        self.tabs = {str(ui.tab): ui for ui in (self.client_ui, self.finance_ui, self.stats_ui)}
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self.build_selected_tab())
+        self.build_selected_tab()
 
         # 狀態列
         status_bar = ttk.Label(self.master, textvariable=self.status_var, relief="sunken", anchor="w", font=('微軟正黑體', 12))
@@ -36,6 +49,24 @@ class Application:
         # 綁定快捷鍵
         self.master.bind("<Control-s>", lambda e: self.client_ui.add_record())
         self.master.bind("<Control-d>", lambda e: self.client_ui.delete_customer())
+        self.master.bind("<F12>", lambda e: DiagnosticsWindow.show(self.master))  # 隱藏的診斷視窗
+        StartupTimer.mark('widgets')
+        self.master.after(self.backup_delay_ms, self.backup_if_due)
+
+    def backup_if_due(self):
+        """在背景建立每日備份（未到期時不做任何事），之後定期再檢查"""
+        def on_done(path):
+            if path:
+                self.status_var.set(f"已自動備份資料庫：{path}")
+        TaskScheduler.submit(Backup.create_if_due, key='backup', priority=BACKGROUND, on_success=on_done,
+                             on_error=lambda e: logging.error(f"自動備份失敗：{str(e)}"))
+        self.master.after(self.backup_check_ms, self.backup_if_due)
+
+    def build_selected_tab(self):
+        ui = self.tabs.get(self.notebook.select())
+        if ui is not None and not getattr(ui, 'built', True):
+            ui.build()
+            StartupTimer.mark(f'build {type(ui).__name__}')
 
 if __name__ == "__main__":
     root = Tk()